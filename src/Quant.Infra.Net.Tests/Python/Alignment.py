@@ -0,0 +1,191 @@
+from enum import Enum
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+NAT = np.iinfo(np.int64).min
+
+
+class AlignmentPolicy(Enum):
+    Strict = "strict"  # 两条序列的时间必须逐个相同, 否则报错
+    Inner = "inner"  # 只保留两边都有的时间
+    OuterForwardFill = "outer_ffill"  # 时间取并集, 缺失的一边用之前最近的值填充
+    AsOf = "asof"  # 以 symbol1 的时间为准, symbol2 取不晚于该时间的最近值
+
+
+class AlignmentReport:
+    """
+    对齐结果的统计: 每边的输入行数、无效行 (NaN 价格或 NaT 时间)、重复时间、只在一边出现的时间和填充的行数。
+    """
+
+    def __init__(self, policy: AlignmentPolicy, input_rows1: int = 0, input_rows2: int = 0):
+        self.policy = policy
+        self.input_rows1 = input_rows1
+        self.input_rows2 = input_rows2
+        self.invalid_rows1 = 0
+        self.invalid_rows2 = 0
+        self.duplicate_rows1 = 0
+        self.duplicate_rows2 = 0
+        self.matched = 0
+        self.only_in_first = 0
+        self.only_in_second = 0
+        self.filled_rows1 = 0
+        self.filled_rows2 = 0
+        self.rows = 0
+
+    @property
+    def misaligned(self) -> int:
+        """
+        只在一边出现的时间数。
+        """
+        return self.only_in_first + self.only_in_second
+
+    def __str__(self):
+        return (f"AlignmentReport({self.policy.name}): {self.rows} rows from {self.input_rows1}/{self.input_rows2}, "
+                f"{self.matched} matched, {self.only_in_first}/{self.only_in_second} only in first/second, "
+                f"{self.filled_rows1}/{self.filled_rows2} filled, {self.invalid_rows1}/{self.invalid_rows2} invalid, "
+                f"{self.duplicate_rows1}/{self.duplicate_rows2} duplicate")
+
+
+def _clean(date_times: np.ndarray, values: np.ndarray):
+    """
+    去掉 NaN/NaT 行, 按时间排序 (已有序时不排序), 重复的时间保留最后一个。
+    :return: (date_times, values, invalid_rows, duplicate_rows)
+    """
+    valid = (date_times != NAT) & ~np.isnan(values)
+    invalid = len(values) - int(valid.sum())
+    if invalid:
+        date_times, values = date_times[valid], values[valid]
+    if len(date_times) > 1 and (date_times[1:] < date_times[:-1]).any():
+        order = np.argsort(date_times, kind="stable")
+        date_times, values = date_times[order], values[order]
+    duplicate = date_times[1:] == date_times[:-1]
+    duplicates = int(duplicate.sum())
+    if duplicates:
+        keep = np.append(~duplicate, True)
+        date_times, values = date_times[keep], values[keep]
+    return date_times, values, invalid, duplicates
+
+
+def _union(date_times1: np.ndarray, date_times2: np.ndarray):
+    """
+    合并两个有序且无重复的时间数组。
+    Both inputs are sorted, so date_times2 is located in date_times1 with one vectorized binary search and
+    the unmatched values are inserted in order; no full sort is needed.
+    This is O(n log m) rather than a linear two-pointer merge: a Python-level merge loop is far slower than
+    numpy's searchsorted, and argsort-based merges measured no faster on 10M-row inputs.
+    :return: (union, index1, index2); index1[k] is the position of union[k] in date_times1, or -1
+    """
+    count1 = len(date_times1)
+    positions = np.searchsorted(date_times1, date_times2)
+    matched = positions < count1
+    matched[matched] = date_times1[positions[matched]] == date_times2[matched]
+    inserted = positions[~matched]
+
+    # date_times1 的第 i 个元素前面插入了多少个 date_times2 独有的元素
+    union_position1 = np.arange(count1) + np.cumsum(np.bincount(inserted, minlength=count1 + 1))[:count1]
+    union_position2 = np.empty(len(date_times2), dtype=np.int64)
+    union_position2[matched] = union_position1[positions[matched]]
+    union_position2[~matched] = inserted + np.arange(len(inserted))
+
+    union = np.empty(count1 + len(inserted), dtype=np.int64)
+    union[union_position1] = date_times1
+    union[union_position2] = date_times2
+    index1 = np.full(len(union), -1, dtype=np.int64)
+    index2 = np.full(len(union), -1, dtype=np.int64)
+    index1[union_position1] = np.arange(count1)
+    index2[union_position2] = np.arange(len(date_times2))
+    return union, index1, index2
+
+
+def _last_at_or_before(union: np.ndarray, index: np.ndarray, date_times: np.ndarray, tolerance_ns: Optional[int]):
+    """
+    union 中每个时间对应的不晚于它的最近一行; 索引随时间递增, 所以累计最大值就是向前填充。
+    :return: (filled index, usable mask)
+    """
+    filled = np.maximum.accumulate(index) if len(index) else index
+    usable = filled >= 0
+    if tolerance_ns is not None:
+        usable &= (union - date_times[np.maximum(filled, 0)]) <= tolerance_ns
+    return filled, usable
+
+
+def _drop_invalid_rows(date_times: np.ndarray, values1: np.ndarray, values2: np.ndarray, report: AlignmentReport):
+    """
+    两条序列时间相同时, 去掉任意一边价格为 NaN 或时间为 NaT 的行, 保持输入顺序。
+    """
+    invalid1 = np.isnan(values1)
+    invalid2 = np.isnan(values2)
+    invalid_time = date_times == NAT
+    valid = ~(invalid1 | invalid2 | invalid_time)
+    report.invalid_rows1 = int((invalid1 | invalid_time).sum())
+    report.invalid_rows2 = int((invalid2 | invalid_time).sum())
+    report.only_in_first = int((invalid2 & ~invalid1 & ~invalid_time).sum())
+    report.only_in_second = int((invalid1 & ~invalid2 & ~invalid_time).sum())
+    report.matched = report.rows = int(valid.sum())
+    if not valid.all():
+        date_times, values1, values2 = date_times[valid], values1[valid], values2[valid]
+    return date_times, values1, values2, report
+
+
+def align_arrays(date_times1: np.ndarray, values1: np.ndarray, date_times2: np.ndarray, values2: np.ndarray,
+                 policy: AlignmentPolicy = AlignmentPolicy.Inner, tolerance=None):
+    """
+    按时间对齐两条序列, 直接操作 int64 时间数组, 不创建 DataFrame。
+    Rows with NaN prices or NaT timestamps are dropped first. Strict keeps the input order and requires
+    identical timestamps; the other policies return rows sorted by time, and when both inputs already
+    share the same sorted timestamps the input arrays are returned without copying.
+    :param date_times1: symbol1 的时间 (int64 ns, NaT 为 int64 最小值)
+    :param values1: symbol1 的价格
+    :param date_times2: symbol2 的时间
+    :param values2: symbol2 的价格
+    :param policy: AlignmentPolicy
+    :param tolerance: AsOf/OuterForwardFill 时允许使用的最旧数据, 例如 pd.Timedelta('5min'); None 表示不限制
+    :return: (date_times, values1, values2, AlignmentReport)
+    """
+    date_times1 = np.asarray(date_times1, dtype=np.int64)
+    date_times2 = np.asarray(date_times2, dtype=np.int64)
+    values1 = np.asarray(values1, dtype=np.float64)
+    values2 = np.asarray(values2, dtype=np.float64)
+    report = AlignmentReport(policy, len(values1), len(values2))
+
+    same_times = len(date_times1) == len(date_times2) and np.array_equal(date_times1, date_times2)
+    if policy == AlignmentPolicy.Strict and not same_times:
+        if len(date_times1) != len(date_times2):
+            raise ValueError("time_series1 and time_series2 must have the same number of elements.")
+        mismatch = np.flatnonzero(date_times1 != date_times2)
+        raise ValueError(f"Element {mismatch[0]} of time_series1 and time_series2 have different DateTime values.")
+
+    if policy == AlignmentPolicy.Strict:
+        return _drop_invalid_rows(date_times1, values1, values2, report)
+    if same_times and (len(date_times1) < 2 or bool((date_times1[1:] > date_times1[:-1]).all())):
+        # 时间已经相同且有序: 只有两边同时无效的行才需要去掉, 没有无效行时不复制
+        if not (np.isnan(values1) != np.isnan(values2)).any():
+            return _drop_invalid_rows(date_times1, values1, values2, report)
+
+    date_times1, values1, report.invalid_rows1, report.duplicate_rows1 = _clean(date_times1, values1)
+    date_times2, values2, report.invalid_rows2, report.duplicate_rows2 = _clean(date_times2, values2)
+    union, index1, index2 = _union(date_times1, date_times2)
+    present1 = index1 >= 0
+    present2 = index2 >= 0
+    report.matched = int((present1 & present2).sum())
+    report.only_in_first = int((present1 & ~present2).sum())
+    report.only_in_second = int((present2 & ~present1).sum())
+
+    tolerance_ns = pd.Timedelta(tolerance).value if tolerance is not None else None
+    if policy == AlignmentPolicy.Inner:
+        rows = present1 & present2
+    elif policy == AlignmentPolicy.OuterForwardFill:
+        index1, usable1 = _last_at_or_before(union, index1, date_times1, tolerance_ns)
+        index2, usable2 = _last_at_or_before(union, index2, date_times2, tolerance_ns)
+        rows = usable1 & usable2
+    elif policy == AlignmentPolicy.AsOf:
+        index2, usable2 = _last_at_or_before(union, index2, date_times2, tolerance_ns)
+        rows = present1 & usable2
+    else:
+        raise ValueError(f"Unsupported alignment policy: {policy}")
+
+    report.filled_rows1 = int((rows & ~present1).sum())
+    report.filled_rows2 = int((rows & ~present2).sum())
+    report.rows = int(rows.sum())
+    return union[rows], values1[index1[rows]], values2[index2[rows]], report
@@ -0,0 +1,294 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from RollingOls import rolling_ols
+from SpreadCalculator import ResolutionLevel
+
+
+class SharedPanel:
+    """
+    放在共享内存中的价格面板 (time × symbols, float64), 子进程按名字挂载, 不复制数据。
+    Owner side: SharedPanel.create(values); worker side: SharedPanel.attach(name, shape).
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, shape: Tuple[int, int], owner: bool):
+        self.memory = memory
+        self.shape = shape
+        self.owner = owner
+        self.values = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+
+    @classmethod
+    def create(cls, values: np.ndarray):
+        """
+        分配共享内存并复制面板数据。
+        :param values: 2-D float array (time × symbols)
+        :return: SharedPanel
+        """
+        values = np.asarray(values, dtype=np.float64)
+        memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        panel = cls(memory, values.shape, owner=True)
+        panel.values[...] = values
+        return panel
+
+    @classmethod
+    def attach(cls, name: str, shape: Tuple[int, int]):
+        """
+        按名字挂载已存在的共享内存面板。
+        """
+        return cls(shared_memory.SharedMemory(name=name), shape, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def close(self):
+        """
+        释放映射; 创建者同时删除共享内存。
+        """
+        self.values = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PairSpreadStore:
+    """
+    紧凑的按 pair 存储的结果: pair 用 (symbol1, symbol2) 在 symbols 中的下标表示。
+    Per-pair last values are always kept; full slope/intercept/spread series (pairs × time) only when
+    requested, either in memory or as .npy files that can be memory-mapped later.
+    """
+
+    def __init__(self, symbols: Sequence[str], date_times: pd.DatetimeIndex, pair_index: np.ndarray, window: int,
+                 last_slope: np.ndarray, last_intercept: np.ndarray, last_spread: np.ndarray,
+                 slope: Optional[np.ndarray] = None, intercept: Optional[np.ndarray] = None,
+                 spread: Optional[np.ndarray] = None):
+        self.symbols = list(symbols)
+        self.date_times = date_times
+        self.pair_index = pair_index
+        self.window = window
+        self.last_slope = last_slope
+        self.last_intercept = last_intercept
+        self.last_spread = last_spread
+        self.slope = slope
+        self.intercept = intercept
+        self.spread = spread
+        self._positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def __len__(self):
+        return len(self.pair_index)
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        """
+        :return: [(symbol1, symbol2), ...] in storage order
+        """
+        return [(self.symbols[a], self.symbols[b]) for a, b in self.pair_index.tolist()]
+
+    def find(self, symbol1: str, symbol2: str) -> int:
+        """
+        :return: pair 在存储中的位置
+        """
+        a, b = self._positions[symbol1], self._positions[symbol2]
+        match = np.flatnonzero((self.pair_index[:, 0] == a) & (self.pair_index[:, 1] == b))
+        if match.size == 0:
+            raise KeyError(f"Pair ({symbol1}, {symbol2}) is not in the store.")
+        return int(match[0])
+
+    def to_dataframe(self, symbol1: str, symbol2: str) -> DataFrame:
+        """
+        取出单个 pair 的 slope, intercept, spread 列, 布局与 SpreadCalculator.df 相同。
+        """
+        if self.spread is None:
+            raise ValueError("The store was built without series; rerun with store_series=True.")
+        position = self.find(symbol1, symbol2)
+        return DataFrame({
+            "slope": np.asarray(self.slope[position], dtype=np.float64),
+            "intercept": np.asarray(self.intercept[position], dtype=np.float64),
+            "spread": np.asarray(self.spread[position], dtype=np.float64),
+        }, index=self.date_times)
+
+    def summary(self) -> DataFrame:
+        """
+        :return: 每个 pair 最新的 slope, intercept, spread
+        """
+        symbols = np.asarray(self.symbols, dtype=object)
+        return DataFrame({
+            "symbol1": symbols[self.pair_index[:, 0]],
+            "symbol2": symbols[self.pair_index[:, 1]],
+            "slope": self.last_slope,
+            "intercept": self.last_intercept,
+            "spread": self.last_spread,
+        })
+
+
+# 子进程中挂载的面板, 由进程池 initializer attach_worker_panel 设置
+_worker_panel: Optional[SharedPanel] = None
+
+
+def attach_worker_panel(name: str, shape: Tuple[int, int]):
+    """
+    进程池 initializer: 在子进程中挂载 SharedPanel, 例如
+    ProcessPoolExecutor(initializer=attach_worker_panel, initargs=(shared.name, shared.shape))。
+    """
+    global _worker_panel
+    _worker_panel = SharedPanel.attach(name, shape)
+
+
+def worker_panel_values() -> np.ndarray:
+    """
+    :return: 当前子进程中由 attach_worker_panel 挂载的面板数据 (time × symbols)
+    """
+    return _worker_panel.values
+
+
+def compute_pair_block(values: np.ndarray, pair_index: np.ndarray, window: int):
+    """
+    对一组 pair 做矩阵化的滚动 OLS: symbol1 = slope * symbol2 + intercept, 窗口为当前行之前的 window 行。
+    :param values: 价格面板 (time × symbols)
+    :param pair_index: (k, 2) 下标数组
+    :param window: 窗口长度
+    :return: (slope, intercept, spread) arrays of shape (time, k)
+    """
+    series_a = values[:, pair_index[:, 0]]
+    series_b = values[:, pair_index[:, 1]]
+    slope, intercept = rolling_ols(series_a, series_b, window)
+    spread = series_a - (slope * series_b + intercept)
+    return slope, intercept, spread
+
+
+def _run_block(start: int, stop: int, pair_index: np.ndarray, window: int, dtype, output_dir: Optional[str],
+               store_series: bool, values: Optional[np.ndarray] = None):
+    if values is None:
+        values = worker_panel_values()
+    slope, intercept, spread = compute_pair_block(values, pair_index, window)
+    series = None
+    if store_series:
+        series = tuple(np.ascontiguousarray(column.T, dtype=dtype) for column in (slope, intercept, spread))
+        if output_dir is not None:
+            # 直接写入内存映射文件, 不经过进程间传输
+            for name, block in zip(("slope", "intercept", "spread"), series):
+                output = np.load(os.path.join(output_dir, f"{name}.npy"), mmap_mode="r+")
+                output[start:stop] = block
+                output.flush()
+                del output
+            series = None
+    return start, stop, slope[-1].copy(), intercept[-1].copy(), spread[-1].copy(), series
+
+
+class BatchSpreadEngine:
+    """
+    对一组 symbol 的所有 pair 批量计算滚动对冲比率和 spread。
+    The aligned panel is placed in shared memory once; blocks of pairs are handed to a process pool and
+    each block is computed as (time × block) matrix operations.
+    """
+
+    def __init__(self, window: int, max_workers: Optional[int] = None, block_size: int = 0,
+                 store_series: bool = False, dtype=np.float32, output_dir: Optional[str] = None):
+        """
+        :param window: 回归窗口长度 (与 SpreadCalculator.FixedWindowLength 含义相同)
+        :param max_workers: 进程数; 0 或 1 表示在当前进程中计算
+        :param block_size: 每个任务的 pair 数, 0 表示按面板长度自动选择
+        :param store_series: 是否保存完整的 slope/intercept/spread 序列 (pairs × time)
+        :param dtype: 序列的存储类型
+        :param output_dir: 保存序列的目录 (slope.npy, intercept.npy, spread.npy), None 表示保存在内存中
+        """
+        if window < 2:
+            raise ValueError("window must contain at least two data points for OLS regression.")
+        self.window = window
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+        self.block_size = block_size
+        self.store_series = store_series
+        self.dtype = dtype
+        self.output_dir = output_dir
+
+    @classmethod
+    def from_calculator(cls, calculator_class, resolution: ResolutionLevel = ResolutionLevel.Daily, **kwargs):
+        """
+        使用某个 SpreadCalculator 子类在该级别下的窗口长度。
+        :param calculator_class: 例如 SpreadCalculatorSP500
+        """
+        return cls(calculator_class("", "", resolution).FixedWindowLength, **kwargs)
+
+    def run(self, panel: DataFrame, pairs: Optional[Sequence[Tuple[str, str]]] = None) -> PairSpreadStore:
+        """
+        :param panel: 对齐后的价格面板, index 为 date_time, 每列一个 symbol, 不允许 NaN
+        :param pairs: 可选, [(symbol1, symbol2), ...]; 默认是所有 i < j 的组合
+        :return: PairSpreadStore
+        """
+        values = panel.to_numpy(dtype=np.float64)
+        if np.isnan(values).any():
+            missing = panel.columns[np.isnan(values).any(axis=0)].tolist()
+            raise ValueError(f"The price panel must be aligned without NaN values; columns with NaN: {missing}")
+
+        symbols = [str(symbol) for symbol in panel.columns]
+        pair_index = self._pair_index(symbols, pairs)
+        length, pair_count = len(panel), len(pair_index)
+
+        block_size = self.block_size or max(1, (1 << 22) // max(length, 1))
+        blocks = [(start, min(start + block_size, pair_count)) for start in range(0, pair_count, block_size)]
+
+        last = np.full((3, pair_count), np.nan)
+        series = None
+        if self.store_series:
+            series = self._allocate_series(pair_count, length)
+        in_memory_series = self.store_series and self.output_dir is None
+
+        def collect(result):
+            start, stop, last_slope, last_intercept, last_spread, block_series = result
+            last[:, start:stop] = (last_slope, last_intercept, last_spread)
+            if in_memory_series:
+                for output, block in zip(series, block_series):
+                    output[start:stop] = block
+
+        if self.max_workers is None or self.max_workers <= 1 or len(blocks) <= 1:
+            for start, stop in blocks:
+                collect(_run_block(start, stop, pair_index[start:stop], self.window, self.dtype, self.output_dir,
+                                   self.store_series, values))
+        else:
+            with SharedPanel.create(values) as shared:
+                with ProcessPoolExecutor(max_workers=self.max_workers, initializer=attach_worker_panel,
+                                         initargs=(shared.name, shared.shape)) as executor:
+                    futures = [executor.submit(_run_block, start, stop, pair_index[start:stop], self.window,
+                                               self.dtype, self.output_dir, self.store_series)
+                               for start, stop in blocks]
+                    for future in futures:
+                        collect(future.result())
+
+        if self.store_series and self.output_dir is not None:
+            series = tuple(np.load(os.path.join(self.output_dir, f"{name}.npy"), mmap_mode="r")
+                           for name in ("slope", "intercept", "spread"))
+        slope, intercept, spread = series if series is not None else (None, None, None)
+        return PairSpreadStore(symbols, pd.DatetimeIndex(panel.index, name="date_time"), pair_index, self.window,
+                               last[0], last[1], last[2], slope, intercept, spread)
+
+    def _allocate_series(self, pair_count: int, length: int):
+        if self.output_dir is None:
+            return tuple(np.full((pair_count, length), np.nan, dtype=self.dtype) for _ in range(3))
+        os.makedirs(self.output_dir, exist_ok=True)
+        series = []
+        for name in ("slope", "intercept", "spread"):
+            output = np.lib.format.open_memmap(os.path.join(self.output_dir, f"{name}.npy"), mode="w+",
+                                               dtype=self.dtype, shape=(pair_count, length))
+            output.flush()
+            series.append(output)
+        return tuple(series)
+
+    @staticmethod
+    def _pair_index(symbols: List[str], pairs: Optional[Sequence[Tuple[str, str]]]) -> np.ndarray:
+        if pairs is None:
+            first, second = np.triu_indices(len(symbols), k=1)
+            return np.column_stack((first, second)).astype(np.int32)
+        positions = {symbol: i for i, symbol in enumerate(symbols)}
+        try:
+            return np.array([(positions[a], positions[b]) for a, b in pairs], dtype=np.int32).reshape(-1, 2)
+        except KeyError as error:
+            raise ValueError(f"Symbol {error.args[0]} is not a column of the price panel.") from None
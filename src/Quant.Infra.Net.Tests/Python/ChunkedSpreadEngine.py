@@ -0,0 +1,167 @@
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from PriceStore import PriceStore
+from RollingOls import RollingOlsWindow
+from SpreadCalculator import ResolutionLevel
+
+# (date_times int64 ns, values_a, values_b)
+PairChunk = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def iter_array_chunks(date_times, values_a, values_b, chunk_rows: int) -> Iterator[PairChunk]:
+    """
+    把已对齐的数组 (例如 np.load(..., mmap_mode='r') 打开的 .npy) 按 chunk_rows 切块, 不复制数据。
+    """
+    date_times = np.asarray(date_times)
+    if np.issubdtype(date_times.dtype, np.datetime64):
+        date_times = date_times.astype('datetime64[ns]').view(np.int64)
+    for start in range(0, len(date_times), chunk_rows):
+        stop = start + chunk_rows
+        yield date_times[start:stop], values_a[start:stop], values_b[start:stop]
+
+
+def align_chunks(chunks_a: Iterable[Tuple[np.ndarray, np.ndarray]],
+                 chunks_b: Iterable[Tuple[np.ndarray, np.ndarray]]) -> Iterator[PairChunk]:
+    """
+    按时间内连接两个各自有序的分块序列, 与 update_time_series 的 merge 一致, 并丢弃价格为 NaN 的行。
+    Only the rows up to the smaller of the two buffered end times are joined; the rest is carried to the
+    next step, so at most about one chunk per side is held in memory.
+    :param chunks_a: 生成 (date_times int64 ns, values) 的可迭代对象, 时间严格递增
+    :param chunks_b: 同上
+    """
+    iterators = [iter(chunks_a), iter(chunks_b)]
+    buffers = [None, None]
+    while True:
+        for side in (0, 1):
+            while buffers[side] is None or len(buffers[side][0]) == 0:
+                chunk = next(iterators[side], None)
+                if chunk is None:
+                    return
+                buffers[side] = (np.asarray(chunk[0]), np.asarray(chunk[1]))
+        (date_times_a, values_a), (date_times_b, values_b) = buffers
+        cutoff = min(date_times_a[-1], date_times_b[-1])
+        end_a = np.searchsorted(date_times_a, cutoff, side="right")
+        end_b = np.searchsorted(date_times_b, cutoff, side="right")
+        date_times, index_a, index_b = np.intersect1d(date_times_a[:end_a], date_times_b[:end_b],
+                                                      assume_unique=True, return_indices=True)
+        buffers = [(date_times_a[end_a:], values_a[end_a:]), (date_times_b[end_b:], values_b[end_b:])]
+        aligned_a = values_a[index_a].astype(np.float64, copy=False)
+        aligned_b = values_b[index_b].astype(np.float64, copy=False)
+        valid = ~(np.isnan(aligned_a) | np.isnan(aligned_b))
+        if not valid.all():
+            date_times, aligned_a, aligned_b = date_times[valid], aligned_a[valid], aligned_b[valid]
+        if len(date_times):
+            yield date_times, aligned_a, aligned_b
+
+
+def rechunk(chunks: Iterable[PairChunk], chunk_rows: int) -> Iterator[PairChunk]:
+    """
+    把大小不一的块合并/拆分为 chunk_rows 行的块 (最后一块可以更短)。
+    """
+    pending, pending_rows = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_rows += len(chunk[0])
+        if pending_rows < chunk_rows:
+            continue
+        merged = [np.concatenate(parts) for parts in zip(*pending)] if len(pending) > 1 else list(pending[0])
+        start = 0
+        while len(merged[0]) - start >= chunk_rows:
+            yield tuple(values[start:start + chunk_rows] for values in merged)
+            start += chunk_rows
+        pending = [tuple(values[start:] for values in merged)]
+        pending_rows = len(merged[0]) - start
+    if pending_rows:
+        yield tuple(np.concatenate(parts) for parts in zip(*pending))
+
+
+class PriceStoreSpreadWriter:
+    """
+    把每块的 slope, intercept, spread 追加到 PriceStore 的一个分区, 例如 output_store.load('AAPL-MSFT', '1s')。
+    """
+
+    def __init__(self, store: PriceStore, name: str, interval: str, timezone: Optional[str] = None):
+        self.store = store
+        self.name = name
+        self.interval = interval
+        self.timezone = timezone
+
+    def __call__(self, date_times: np.ndarray, slope: np.ndarray, intercept: np.ndarray, spread: np.ndarray):
+        index = pd.DatetimeIndex(date_times.view('datetime64[ns]'), name=PriceStore.DATE_TIME)
+        if self.timezone:
+            index = index.tz_localize("UTC").tz_convert(self.timezone)
+        self.store.append(self.name, self.interval,
+                          DataFrame({"slope": slope, "intercept": intercept, "spread": spread}, index=index))
+
+
+class ChunkedSpreadEngine:
+    """
+    分块 (out-of-core) 计算滚动对冲比率和 spread, 用于 Second/Minute 级别的超长历史。
+    Chunks of aligned prices are read from disk one at a time; between chunks only the boundary window
+    (the last `window` points) and its running sums are carried, in a RollingOlsWindow. Results are handed
+    to a sink chunk by chunk, so memory is bounded by chunk_rows + window instead of the history length.
+    Row i is regressed over the `window` rows before it, as in SpreadCalculator.upsert_spread_and_equation;
+    rows without a full preceding window are not written.
+    """
+
+    def __init__(self, window: int, chunk_rows: int = 1 << 20):
+        """
+        :param window: 回归窗口长度 (与 SpreadCalculator.FixedWindowLength 含义相同)
+        :param chunk_rows: 每块的行数
+        """
+        if window < 2:
+            raise ValueError("window must contain at least two data points for OLS regression.")
+        self.window = window
+        self.chunk_rows = max(int(chunk_rows), 1)
+
+    @classmethod
+    def from_calculator(cls, calculator_class, resolution: ResolutionLevel = ResolutionLevel.Daily, **kwargs):
+        """
+        使用某个 SpreadCalculator 子类在该级别下的窗口长度。
+        :param calculator_class: 例如 SpreadCalculatorCrypto
+        """
+        return cls(calculator_class("", "", resolution).FixedWindowLength, **kwargs)
+
+    def run(self, chunks: Iterable[PairChunk], sink: Callable) -> int:
+        """
+        :param chunks: 已对齐的 (date_times int64 ns, values_a, values_b) 块, 时间递增, 不含 NaN
+        :param sink: sink(date_times, slope, intercept, spread), 每块调用一次
+        :return: 写出的行数
+        """
+        window = RollingOlsWindow(self.window)
+        written = 0
+        for date_times, values_a, values_b in rechunk(chunks, self.chunk_rows):
+            values_a = np.asarray(values_a, dtype=np.float64)
+            values_b = np.asarray(values_b, dtype=np.float64)
+            slope, intercept = window.regress_chunk(values_b, values_a)
+            computed = ~np.isnan(slope)
+            if not computed.any():
+                continue
+            if not computed.all():
+                first = np.argmax(computed)
+                date_times, values_a, values_b = date_times[first:], values_a[first:], values_b[first:]
+                slope, intercept = slope[first:], intercept[first:]
+            sink(np.asarray(date_times), slope, intercept, values_a - (slope * values_b + intercept))
+            written += len(slope)
+        return written
+
+    def run_price_store(self, store: PriceStore, symbol1: str, symbol2: str, interval: str,
+                        output_store: PriceStore, column: str = "Close", start=None, end=None,
+                        name: Optional[str] = None) -> int:
+        """
+        从 PriceStore 逐块读取两个 symbol 的价格, 结果追加到 output_store 的 '{symbol1}-{symbol2}' 分区。
+        :param store: 价格库
+        :param output_store: 结果库, 可以与 store 相同
+        :param column: 价格列
+        :param name: 结果分区名称, 默认 '{symbol1}-{symbol2}'
+        :return: 写出的行数
+        """
+        chunks_a = ((date_times, values[column])
+                    for date_times, values in store.iter_chunks(symbol1, interval, start, end, [column]))
+        chunks_b = ((date_times, values[column])
+                    for date_times, values in store.iter_chunks(symbol2, interval, start, end, [column]))
+        timezone = store.read_index(symbol1, interval).get("timezone")
+        writer = PriceStoreSpreadWriter(output_store, name or f"{symbol1}-{symbol2}", interval, timezone)
+        return self.run(align_chunks(chunks_a, chunks_b), writer)
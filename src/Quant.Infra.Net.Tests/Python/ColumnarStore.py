@@ -0,0 +1,114 @@
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+class ColumnarStore:
+    """
+    预分配的列式存储: 按时间追加行, 容量不足时倍增, 追加的均摊成本为 O(1)。
+    Preallocated columnar store keyed by date_time (int64 nanoseconds, UTC when tz is set). Rows are appended
+    in place; when capacity runs out every column is reallocated at twice the size.
+    """
+
+    def __init__(self, float_columns: List[str], object_columns: List[str] = (), capacity: int = 1024,
+                 dtypes: Optional[dict] = None, tz=None):
+        """
+        :param float_columns: 数值列, 默认 float64
+        :param object_columns: 对象列 (例如 equation 字符串)
+        :param capacity: 预分配的行数
+        :param dtypes: 可选, {列名: dtype}, 例如把价格列保存为 float32
+        :param tz: 可选, 时间所属的时区; to_dataframe 把索引转换回该时区
+        """
+        dtypes = dtypes or {}
+        self.tz = tz
+        self.float_columns = list(float_columns)
+        self.object_columns = list(object_columns)
+        self.capacity = max(int(capacity), 1)
+        self.length = 0
+        self.index = np.empty(self.capacity, dtype=np.int64)
+        self.columns = {name: np.full(self.capacity, np.nan, dtype=dtypes.get(name, np.float64))
+                        for name in self.float_columns}
+        for name in self.object_columns:
+            self.columns[name] = np.full(self.capacity, np.nan, dtype=object)
+
+    def __len__(self):
+        return self.length
+
+    def last_date_time(self):
+        """
+        :return: 最后一行的时间 (int64 ns), 为空时返回 None
+        """
+        return int(self.index[self.length - 1]) if self.length else None
+
+    def append(self, date_time: int) -> int:
+        """
+        追加一行, 所有列初始化为 NaN。
+        :param date_time: 时间 (int64 ns)
+        :return: 新行的位置
+        """
+        if self.length == self.capacity:
+            self.reserve(self.capacity * 2)
+        row = self.length
+        self.index[row] = date_time
+        self.length = row + 1
+        return row
+
+    def extend(self, date_times, values: dict):
+        """
+        批量追加多行。
+        :param date_times: 时间数组 (datetime64 或 int64 ns)
+        :param values: {列名: 数组}, 缺少的列填 NaN
+        """
+        date_times = np.asarray(date_times)
+        if np.issubdtype(date_times.dtype, np.datetime64):
+            date_times = date_times.astype('datetime64[ns]').view(np.int64)
+        count = len(date_times)
+        self.reserve(self.length + count)
+        start, end = self.length, self.length + count
+        self.index[start:end] = date_times
+        for name, column in values.items():
+            self.columns[name][start:end] = column
+        self.length = end
+
+    def reserve(self, capacity: int):
+        """
+        保证容量至少为 capacity, 需要时按倍增重新分配。
+        """
+        if capacity <= self.capacity:
+            return
+        new_capacity = max(capacity, self.capacity * 2)
+        index = np.empty(new_capacity, dtype=np.int64)
+        index[:self.length] = self.index[:self.length]
+        self.index = index
+        for name, column in self.columns.items():
+            grown = np.full(new_capacity, np.nan, dtype=column.dtype)
+            grown[:self.length] = column[:self.length]
+            self.columns[name] = grown
+        self.capacity = new_capacity
+
+    def to_dataframe(self, index_name: str = "date_time") -> DataFrame:
+        """
+        复制有效行, 生成以 date_time 为索引的 DataFrame; 设置了 tz 时索引为该时区的时间。
+        """
+        index = pd.DatetimeIndex(self.index[:self.length].view('datetime64[ns]'), name=index_name)
+        if self.tz is not None:
+            index = index.tz_localize('UTC').tz_convert(self.tz)
+        return DataFrame({name: column[:self.length].copy() for name, column in self.columns.items()},
+                         index=index)
+
+    @classmethod
+    def from_dataframe(cls, df: DataFrame, float_columns: List[str], object_columns: List[str] = (),
+                       capacity: int = 0, dtypes: Optional[dict] = None):
+        """
+        从以 date_time 为索引的 DataFrame 构建存储, 不存在的列填 NaN; 带时区的索引记录其时区。
+        """
+        tz = getattr(df.index, 'tz', None)
+        store = cls(float_columns, object_columns, capacity=max(capacity, 2 * len(df), 1024), dtypes=dtypes, tz=tz)
+        values = {name: df[name].to_numpy(dtype=store.columns[name].dtype) for name in float_columns
+                  if name in df.columns}
+        for name in object_columns:
+            if name in df.columns:
+                values[name] = df[name].to_numpy(dtype=object)
+        store.extend(pd.DatetimeIndex(df.index).as_unit('ns').asi8 if len(df) else [], values)
+        return store
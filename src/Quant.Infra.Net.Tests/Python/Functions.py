@@ -2,8 +2,11 @@ import os
 import pandas as pd
 import yfinance as yf
 from bs4 import BeautifulSoup
+from PriceStore import PriceStore
+from IncrementalDownloader import IncrementalDownloader, YahooDataProvider
 
-def fetch_and_save_financial_data(folder_path, file_name, start_date, end_date, interval, symbol):
+
+def fetch_and_save_financial_data(folder_path, file_name, start_date, end_date, interval, symbol, price_store=None):
     """
     Fetch financial data from Yahoo Finance and save it to a CSV file.
     :param folder_path: Directory where the CSV file will be saved
@@ -12,7 +15,13 @@ def fetch_and_save_financial_data(folder_path, file_name, start_date, end_date,
     :param end_date: End date for the data (format: 'YYYY-MM-DD')
     :param interval: Data interval (e.g., '1d', '1h', '1m')
     :param symbol: Financial symbol (e.g., 'AAPL', 'BTC-USD')
+    :param price_store: Optional PriceStore (or its root directory); when given, only the ranges missing from the
+                        store are downloaded and appended, and folder_path/file_name are ignored
     """
+    if price_store is not None:
+        fetch_and_save_financial_data_symbols([symbol], start_date, end_date, folder_path, interval, price_store)
+        return
+
     # Ensure the folder path exists
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
@@ -33,7 +42,7 @@ def fetch_and_save_financial_data(folder_path, file_name, start_date, end_date,
     print(f"Data saved to {file_path}")
 
 
-def fetch_and_save_financial_data_symbols(symbols, start_date, end_date, folder_path, interval):
+def fetch_and_save_financial_data_symbols(symbols, start_date, end_date, folder_path, interval, price_store=None):
     """
     Fetch financial data from Yahoo Finance and save it to separate CSV files for each symbol.
     :param symbols: List of financial symbols (e.g., ['AAPL', 'BTC-USD'])
@@ -41,12 +50,21 @@ def fetch_and_save_financial_data_symbols(symbols, start_date, end_date, folder_
     :param end_date: End date for the data (format: 'YYYY-MM-DD')
     :param folder_path: Directory where the CSV files will be saved
     :param interval: Data interval (e.g., '1d', '1h', '1m')
+    :param price_store: Optional PriceStore (or its root directory); when given, only the date ranges missing from
+                        the store are downloaded (in interval-sized chunks, concurrently) and appended to it,
+                        instead of rewriting one CSV per symbol
     """
     # Ensure symbols is not None and not empty
     if symbols is None or len(symbols) == 0:
         print("Error: No symbols provided.")
         return
 
+    if price_store is not None:
+        store = price_store if isinstance(price_store, PriceStore) else PriceStore(price_store)
+        report = IncrementalDownloader(store, YahooDataProvider()).download(symbols, start_date, end_date, interval)
+        print(report)
+        return
+
     # Ensure the folder path exists
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
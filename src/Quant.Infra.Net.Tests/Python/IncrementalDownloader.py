@@ -0,0 +1,277 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from PriceStore import PriceStore
+
+# interval -> bar 间隔
+INTERVAL_STEPS = {
+    "1m": pd.Timedelta(minutes=1), "2m": pd.Timedelta(minutes=2), "5m": pd.Timedelta(minutes=5),
+    "15m": pd.Timedelta(minutes=15), "30m": pd.Timedelta(minutes=30), "60m": pd.Timedelta(hours=1),
+    "90m": pd.Timedelta(minutes=90), "1h": pd.Timedelta(hours=1), "1d": pd.Timedelta(days=1),
+    "5d": pd.Timedelta(days=5), "1wk": pd.Timedelta(weeks=1), "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+}
+
+# 下载失败的块
+_FAILED = object()
+
+# Yahoo 对分钟级数据单次请求的最大跨度; 日线及以上没有限制
+INTERVAL_MAX_SPANS = {
+    "1m": pd.Timedelta(days=7), "2m": pd.Timedelta(days=60), "5m": pd.Timedelta(days=60),
+    "15m": pd.Timedelta(days=60), "30m": pd.Timedelta(days=60), "60m": pd.Timedelta(days=730),
+    "90m": pd.Timedelta(days=60), "1h": pd.Timedelta(days=730),
+}
+
+
+def flatten_columns(data: DataFrame) -> DataFrame:
+    """
+    新版 yfinance 即使只下载一个 symbol 也返回 (Price, Ticker) 两级列名, 只保留价格字段名。
+    """
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+    return data
+
+
+def split_range(start: pd.Timestamp, end: pd.Timestamp, interval: str) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    按 interval 的单次请求上限把 [start, end) 切成若干段。
+    """
+    max_span = INTERVAL_MAX_SPANS.get(interval)
+    if max_span is None:
+        return [(start, end)]
+    chunks = []
+    while start < end:
+        stop = min(start + max_span, end)
+        chunks.append((start, stop))
+        start = stop
+    return chunks
+
+
+class DataProvider(ABC):
+    """
+    行情数据源接口: 返回 [start, end) 区间内的 bar, 索引为时间。
+    """
+
+    @abstractmethod
+    def fetch(self, symbol: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> DataFrame:
+        pass
+
+
+class YahooDataProvider(DataProvider):
+    def fetch(self, symbol: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> DataFrame:
+        import yfinance as yf
+        data = yf.download(symbol, start=start, end=end, interval=interval, progress=False)
+        return flatten_columns(data).dropna(how="all")
+
+
+class FakeDataProvider(DataProvider):
+    """
+    本地生成确定性行情的假数据源, 用于测试和基准测试。
+    Bars are generated on the interval grid, so the same timestamp always yields the same prices.
+    :param failures: 前 failures 次请求抛出 ConnectionError, 用于测试重试
+    :param latency: 每次请求的模拟延迟 (秒)
+    """
+
+    def __init__(self, failures: int = 0, latency: float = 0.0):
+        self.failures = failures
+        self.latency = latency
+        self.calls: List[Tuple[str, str, pd.Timestamp, pd.Timestamp]] = []
+        self._lock = threading.Lock()
+
+    def fetch(self, symbol: str, interval: str, start: pd.Timestamp, end: pd.Timestamp) -> DataFrame:
+        with self._lock:
+            self.calls.append((symbol, interval, start, end))
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("Simulated provider failure.")
+        if self.latency:
+            time.sleep(self.latency)
+
+        step = INTERVAL_STEPS[interval]
+        if isinstance(step, pd.Timedelta):
+            # 对齐到 bar 网格, 使不同请求得到相同的时间戳
+            date_times = pd.date_range(pd.Timestamp(start).ceil(step), end, freq=step, inclusive="left")
+        else:
+            date_times = pd.date_range(start, end, freq=pd.offsets.MonthBegin(step.months), inclusive="left")
+        seed = sum(ord(character) for character in symbol)
+        minutes = date_times.as_unit("ns").asi8 // 60_000_000_000
+        close = 100 + seed % 50 + np.sin(minutes / 997.0 + seed) * 5
+        return DataFrame({"Open": close - 0.1, "High": close + 0.2, "Low": close - 0.2, "Close": close,
+                          "Volume": np.full(len(date_times), 1000.0)}, index=date_times)
+
+
+class RateLimiter:
+    """
+    线程安全的令牌桶限速器。
+    :param rate: 每秒允许的请求数, 0 表示不限速
+    :param burst: 桶容量
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class DownloadReport:
+    """
+    下载结果: 每个 symbol 写入的行数, 发出的请求数, 失败的区间。
+    """
+
+    def __init__(self):
+        self.rows_written: Dict[str, int] = {}
+        self.requests = 0
+        self.failures: List[Tuple[str, pd.Timestamp, pd.Timestamp, str]] = []
+
+    def __str__(self):
+        return (f"DownloadReport: {sum(self.rows_written.values())} rows for {len(self.rows_written)} symbols, "
+                f"{self.requests} requests, {len(self.failures)} failed ranges")
+
+
+class IncrementalDownloader:
+    """
+    按本地已有数据计算缺失区间, 按 interval 切块后通过有界线程池并发下载, 写入 PriceStore。
+    Chunks of one symbol are merged and appended once, in time order, after all of them have returned. When a
+    chunk fails, only the successful chunks adjacent to the stored data are appended and recorded as covered,
+    so the next run requests the rest again instead of leaving a hole.
+    """
+
+    def __init__(self, store: PriceStore, provider: Optional[DataProvider] = None, max_workers: int = 4,
+                 rate_limit: float = 2.0, burst: int = 2, max_retries: int = 3, backoff: float = 1.0):
+        """
+        :param store: 本地价格库
+        :param provider: 数据源, 默认 YahooDataProvider
+        :param max_workers: 并发请求数
+        :param rate_limit: 每秒请求数上限
+        :param burst: 限速器允许的突发请求数
+        :param max_retries: 每个区间的最大重试次数
+        :param backoff: 第 n 次重试前等待 backoff * 2**n 秒
+        """
+        self.store = store
+        self.provider = provider if provider is not None else YahooDataProvider()
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(rate_limit, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+
+    def missing_ranges(self, symbol: str, interval: str, start, end) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """
+        [start, end) 中本地还没有的区间: 已下载区间之前、之间和之后的部分。
+        Coverage is the recorded request ranges plus the runs of consecutive stored bars (PriceStore.bar_ranges),
+        so a hole between two downloads is found even though it lies between the first and the last bar.
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        intervals = [(self._comparable(covered_start, start), self._comparable(covered_end, start))
+                     for covered_start, covered_end in self.store.covered_ranges(symbol, interval)]
+        step = INTERVAL_STEPS.get(interval, pd.Timedelta(0))
+        # 用实际存储的连续 bar 而不是首尾两个 bar, 中间缺失的部分也会被找到
+        max_gap = step if isinstance(step, pd.Timedelta) else pd.Timedelta(days=31 * step.months)
+        for first, last in self.store.bar_ranges(symbol, interval, max_gap):
+            # 最后一个 bar 是包含的, 下一个需要的 bar 在它之后一个间隔
+            intervals.append((self._comparable(first, start), self._comparable(last, start) + step))
+        ranges = []
+        cursor = start
+        for covered_start, covered_end in sorted(intervals):
+            if cursor >= end:
+                break
+            if covered_start > cursor:
+                ranges.append((cursor, min(covered_start, end)))
+            cursor = max(cursor, covered_end)
+        if cursor < end:
+            ranges.append((cursor, end))
+        return ranges
+
+    @staticmethod
+    def _comparable(timestamp: pd.Timestamp, reference: pd.Timestamp) -> pd.Timestamp:
+        # 请求参数不带时区时, 用本地时间比较
+        if timestamp.tzinfo is not None and reference.tzinfo is None:
+            return timestamp.tz_localize(None)
+        return timestamp
+
+    def download(self, symbols: List[str], start, end, interval: str) -> DownloadReport:
+        """
+        下载 symbols 在 [start, end) 区间内缺失的数据并追加到 PriceStore。
+        :return: DownloadReport
+        """
+        report = DownloadReport()
+        ranges = []
+        for symbol in symbols:
+            bars = self.store.date_range(symbol, interval)
+            for range_start, range_end in self.missing_ranges(symbol, interval, start, end):
+                # 在第一个 bar 之前的区间从末尾开始与已有数据相连, 其余区间从开头开始
+                keep_suffix = bars is not None and range_end <= self._comparable(bars[0], range_start)
+                ranges.append((symbol, split_range(range_start, range_end, interval), keep_suffix))
+
+        with ThreadPoolExecutor(max_workers=max(self.max_workers, 1)) as executor:
+            futures = [[executor.submit(self._fetch_with_retry, symbol, interval, chunk_start, chunk_end, report)
+                        for chunk_start, chunk_end in chunks] for symbol, chunks, _ in ranges]
+            outcomes = []
+            for (symbol, chunks, _), range_futures in zip(ranges, futures):
+                results = []
+                for (chunk_start, chunk_end), future in zip(chunks, range_futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as error:
+                        report.failures.append((symbol, chunk_start, chunk_end, str(error)))
+                        results.append(_FAILED)
+                outcomes.append(results)
+
+        frames: Dict[str, list] = {symbol: [] for symbol in symbols}
+        covered: Dict[str, list] = {symbol: [] for symbol in symbols}
+        for (symbol, chunks, keep_suffix), results in zip(ranges, outcomes):
+            # 只保留与已有数据相连、连续成功的部分, 失败的块之后的数据不写入, 以免留下永久的空洞
+            kept = []
+            for k in (reversed(range(len(chunks))) if keep_suffix else range(len(chunks))):
+                if results[k] is _FAILED:
+                    break
+                kept.append(k)
+            if not kept:
+                continue
+            kept.sort()
+            frames[symbol].extend(results[k] for k in kept if results[k] is not None and not results[k].empty)
+            covered[symbol].append((chunks[kept[0]][0], chunks[kept[-1]][1]))
+
+        for symbol in symbols:
+            written = 0
+            if frames[symbol]:
+                written = self.store.append(symbol, interval, pd.concat(frames[symbol]).sort_index())
+            report.rows_written[symbol] = written
+            for covered_start, covered_end in covered[symbol]:
+                self.store.mark_covered(symbol, interval, covered_start, covered_end)
+        return report
+
+    def _fetch_with_retry(self, symbol: str, interval: str, start: pd.Timestamp, end: pd.Timestamp,
+                          report: DownloadReport) -> DataFrame:
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            with self._lock:
+                report.requests += 1
+            try:
+                return self.provider.fetch(symbol, interval, start, end)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
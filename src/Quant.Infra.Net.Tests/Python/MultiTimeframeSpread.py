@@ -0,0 +1,259 @@
+from typing import Dict, Iterable, List, Optional, Type, Union
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from Alignment import AlignmentPolicy, AlignmentReport, align_arrays
+from SpreadCalculator import (ResolutionLevel, SpreadCalculator, SpreadCalculatorCrypto, TimeSeries,
+                              TimeSeriesElement)
+
+# 由细到粗; Tick 只能作为基础分辨率
+RESOLUTION_ORDER = [ResolutionLevel.Tick, ResolutionLevel.Second, ResolutionLevel.Minute, ResolutionLevel.Hourly,
+                    ResolutionLevel.Daily, ResolutionLevel.Weekly, ResolutionLevel.Monthly]
+
+# numpy datetime64 单位, 向下取整得到 bar 的开始时间
+_BUCKET_UNITS = {ResolutionLevel.Second: 's', ResolutionLevel.Minute: 'm', ResolutionLevel.Hourly: 'h',
+                 ResolutionLevel.Daily: 'D', ResolutionLevel.Weekly: 'W', ResolutionLevel.Monthly: 'M'}
+# numpy 的周从星期四 (1970-01-01) 开始, 平移 3 天后从星期一开始
+_WEEK_SHIFT = np.timedelta64(3, 'D').astype('m8[ns]').astype(np.int64)
+
+
+def _floor(date_times: np.ndarray, resolution: ResolutionLevel) -> np.ndarray:
+    unit = _BUCKET_UNITS.get(resolution)
+    if unit is None:
+        raise ValueError(f"Unsupported bar resolution: {resolution}")
+    shift = _WEEK_SHIFT if resolution == ResolutionLevel.Weekly else 0
+    floored = (date_times + shift).view('M8[ns]').astype(f'M8[{unit}]')
+    return floored.astype('M8[ns]').view(np.int64) - shift
+
+
+def bucket_starts(date_times: np.ndarray, resolution: ResolutionLevel, timezone=None) -> np.ndarray:
+    """
+    每个时间所属 bar 的开始时间: 秒/分钟/小时/天向下取整, 周从星期一开始, 月从 1 号开始。
+    With a timezone the bars follow that zone's wall clock (a day starts at local midnight, also across DST
+    changes) and the starts are returned as UTC instants; without one the times are bucketed as they are.
+    :param date_times: int64 ns (UTC when timezone is set)
+    :param timezone: 可选, 例如 'America/New_York'
+    :return: int64 ns
+    """
+    date_times = np.asarray(date_times, dtype=np.int64)
+    if timezone is None:
+        return _floor(date_times, resolution)
+    local = pd.DatetimeIndex(date_times.view('M8[ns]')).tz_localize('UTC').tz_convert(timezone)
+    local = local.tz_localize(None).as_unit('ns').asi8
+    floored = _floor(local, resolution)
+    if RESOLUTION_ORDER.index(resolution) < RESOLUTION_ORDER.index(ResolutionLevel.Daily):
+        # 一个小时以内的 bar 中 UTC 偏移不变, 减去每行自己的偏移即可
+        return floored - (local - date_times)
+    # 按天及以上的 bar 从当地零点开始; 只对不同的开始时间做时区转换
+    unique, inverse = np.unique(floored, return_inverse=True)
+    starts = pd.DatetimeIndex(unique.view('M8[ns]')).tz_localize(
+        timezone, ambiguous=np.ones(len(unique), dtype=bool), nonexistent='shift_forward')
+    return starts.as_unit('ns').asi8[inverse]
+
+
+class _OpenBar:
+    """
+    一个时间级别上尚未结束的 bar: 两边的 open, high, low, close。
+    """
+
+    __slots__ = ("start", "ohlc1", "ohlc2")
+
+    def __init__(self, start: int, values1: np.ndarray, values2: np.ndarray):
+        self.start = start
+        self.ohlc1 = np.array([values1[0], values1.max(), values1.min(), values1[-1]])
+        self.ohlc2 = np.array([values2[0], values2.max(), values2.min(), values2[-1]])
+
+    def merge(self, values1: np.ndarray, values2: np.ndarray):
+        for ohlc, values in ((self.ohlc1, values1), (self.ohlc2, values2)):
+            ohlc[1] = max(ohlc[1], values.max())
+            ohlc[2] = min(ohlc[2], values.min())
+            ohlc[3] = values[-1]
+
+
+class MultiTimeframeSpreadCalculator:
+    """
+    用一条基础分辨率的数据 (例如分钟 bar 或 tick) 一次计算多个时间级别的滚动 spread。
+    Each higher timeframe keeps the OHLC of its open bar and, when a base row starts a new bar, appends the
+    finished bar's closes to its own streaming calculator, whose FixedWindowLength comes from
+    calculate_window_length of that timeframe. The aligned base data is stored at most once (only when the
+    base resolution itself is requested); higher timeframes store one row per finished bar. Bars are labelled
+    with their start time, matching DataFrame.resample(...).last() with the default left label, and the
+    last bar is only appended once a later bar starts or flush is called. Bars follow the wall clock of the
+    timezone (given explicitly or taken from the first timezone-aware input) and df returns frames in that
+    timezone; naive input is bucketed as it is.
+    """
+
+    def __init__(self, symbol1: str, symbol2: str, base_resolution: ResolutionLevel,
+                 resolutions: Iterable[ResolutionLevel],
+                 calculator_class: Type[SpreadCalculator] = SpreadCalculatorCrypto, timezone=None,
+                 **calculator_kwargs):
+        """
+        :param base_resolution: 输入数据的分辨率
+        :param resolutions: 需要计算 spread 的时间级别, 不能比 base_resolution 更细
+        :param calculator_class: 每个时间级别使用的 SpreadCalculator 子类
+        :param timezone: 可选, 划分 bar 使用的时区, 例如 'America/New_York'; 设置后 naive 的输入视为 UTC 时间
+        :param calculator_kwargs: 传给每个 calculator 的其它参数 (streaming 固定为 True)
+        """
+        if base_resolution not in RESOLUTION_ORDER:
+            raise ValueError(f"Unsupported base resolution: {base_resolution}")
+        resolutions = sorted(set(resolutions), key=RESOLUTION_ORDER.index)
+        if not resolutions:
+            raise ValueError("At least one resolution is required.")
+        for resolution in resolutions:
+            if resolution not in RESOLUTION_ORDER or (
+                    RESOLUTION_ORDER.index(resolution) < RESOLUTION_ORDER.index(base_resolution)):
+                raise ValueError(f"Resolution {resolution} cannot be built from {base_resolution} data.")
+        self.symbol1 = symbol1
+        self.symbol2 = symbol2
+        self.base_resolution = base_resolution
+        self.resolutions: List[ResolutionLevel] = resolutions
+        calculator_kwargs['streaming'] = True
+        self.calculators: Dict[ResolutionLevel, SpreadCalculator] = {
+            resolution: calculator_class(symbol1, symbol2, resolution, **calculator_kwargs)
+            for resolution in resolutions}
+        self._open_bars: Dict[ResolutionLevel, Optional[_OpenBar]] = {
+            resolution: None for resolution in resolutions if resolution != base_resolution}
+        self.timezone = timezone
+        self._last_date_time: Optional[int] = None
+        # flush 之后各时间级别最后结束的 bar 的开始时间, 之后的行不能再落入这些 bar
+        self._flushed_starts: Dict[ResolutionLevel, int] = {}
+
+    def __getitem__(self, resolution: ResolutionLevel) -> SpreadCalculator:
+        return self.calculators[resolution]
+
+    def df(self, resolution: ResolutionLevel) -> DataFrame:
+        """
+        该时间级别已结束的 bar 及其 spread; 设置了 timezone 时索引为该时区的时间。
+        """
+        return self.calculators[resolution].df
+
+    def open_bar(self, resolution: ResolutionLevel) -> Optional[DataFrame]:
+        """
+        该时间级别尚未结束的 bar: 行为 symbol, 列为 open, high, low, close; 没有时返回 None。
+        """
+        bar = self._open_bars.get(resolution)
+        if bar is None:
+            return None
+        return DataFrame([bar.ohlc1, bar.ohlc2], index=[self.symbol1, self.symbol2],
+                         columns=['open', 'high', 'low', 'close'])
+
+    def update_time_series(self, time_series1: Union[TimeSeries, List[TimeSeriesElement]],
+                           time_series2: Union[TimeSeries, List[TimeSeriesElement]],
+                           alignment: AlignmentPolicy = AlignmentPolicy.Strict, tolerance=None) -> AlignmentReport:
+        """
+        对齐一次基础分辨率的数据, 然后追加到所有时间级别。
+        :return: AlignmentReport
+        """
+        date_index1, values1 = SpreadCalculator._series_arrays(time_series1)
+        date_index2, values2 = SpreadCalculator._series_arrays(time_series2)
+        if (date_index1.tz is None) != (date_index2.tz is None):
+            raise ValueError("time_series1 and time_series2 must both be timezone-aware or both be naive.")
+        date_times, values1, values2, report = align_arrays(
+            date_index1.asi8, values1, date_index2.asi8, values2, alignment, tolerance)
+        self._adopt_timezone(date_index1.tz)
+        self.update_time_series_arrays(date_times, values1, values2)
+        return report
+
+    def update_time_series_element(self, time_series_elm1: TimeSeriesElement, time_series_elm2: TimeSeriesElement):
+        """
+        追加一个基础分辨率的 bar 或 tick。
+        """
+        if time_series_elm1.date_time != time_series_elm2.date_time:
+            raise ValueError(f"DateTime mismatch: {time_series_elm1.date_time} vs {time_series_elm2.date_time}")
+        self.update_time_series_arrays(pd.DatetimeIndex([time_series_elm1.date_time]),
+                                       [time_series_elm1.value], [time_series_elm2.value])
+
+    def update_time_series_arrays(self, date_times, values1, values2) -> int:
+        """
+        追加已对齐的基础分辨率数据; 时间必须递增且晚于之前的数据, 价格为 NaN 的行被丢弃。
+        :param date_times: 时间 (datetime64 数组, DatetimeIndex 或 int64 ns; int64 和带时区的时间为 UTC)
+        :return: 追加的基础分辨率行数
+        """
+        if isinstance(date_times, np.ndarray) and np.issubdtype(date_times.dtype, np.integer):
+            date_times = date_times.astype(np.int64, copy=False)
+        else:
+            date_index = pd.DatetimeIndex(date_times)
+            self._adopt_timezone(date_index.tz)
+            date_times = date_index.as_unit('ns').asi8
+        values1 = np.asarray(values1, dtype=np.float64)
+        values2 = np.asarray(values2, dtype=np.float64)
+        if not len(date_times) == len(values1) == len(values2):
+            raise ValueError("date_times, values1 and values2 must have the same length.")
+        valid = ~(np.isnan(values1) | np.isnan(values2))
+        if not valid.all():
+            date_times, values1, values2 = date_times[valid], values1[valid], values2[valid]
+        if len(date_times) == 0:
+            return 0
+        if (np.diff(date_times) <= 0).any() or (
+                self._last_date_time is not None and date_times[0] <= self._last_date_time):
+            raise ValueError("date_times must be increasing and later than the previous rows.")
+        for resolution, flushed_start in self._flushed_starts.items():
+            # 在更新任何 calculator 之前检查, 以免只有一部分时间级别追加了这些行
+            if bucket_starts(date_times[:1], resolution, self.timezone)[0] <= flushed_start:
+                raise ValueError(f"Rows inside a flushed {resolution.name} bar cannot be appended.")
+        self._flushed_starts.clear()
+
+        if self.base_resolution in self.calculators:
+            self.calculators[self.base_resolution].update_time_series_arrays(self._labels(date_times), values1,
+                                                                              values2)
+        for resolution in self._open_bars:
+            self._update_bars(resolution, date_times, values1, values2)
+        self._last_date_time = int(date_times[-1])
+        return len(date_times)
+
+    def _labels(self, date_times: np.ndarray):
+        """
+        传给各时间级别 calculator 的时间: 设置了 timezone 时为该时区的 DatetimeIndex, 否则为 int64 ns。
+        """
+        if self.timezone is None:
+            return date_times
+        return pd.DatetimeIndex(date_times.view('M8[ns]')).tz_localize('UTC').tz_convert(self.timezone)
+
+    def _adopt_timezone(self, timezone):
+        """
+        没有指定 timezone 时使用第一批带时区数据的时区; 已经按 naive 时间划分 bar 之后不能再改变。
+        """
+        if timezone is None or self.timezone is not None:
+            return
+        if self._last_date_time is not None:
+            raise ValueError("Timezone-aware rows cannot follow naive rows.")
+        self.timezone = timezone
+
+    def _update_bars(self, resolution: ResolutionLevel, date_times: np.ndarray, values1: np.ndarray,
+                     values2: np.ndarray):
+        """
+        把一批基础数据归入 resolution 的 bar: 结束的 bar 的 close 追加到 calculator, 最后一个 bar 保持打开。
+        """
+        starts = bucket_starts(date_times, resolution, self.timezone)
+        # 每个 bar 在本批中的第一行
+        firsts = np.concatenate(([0], np.flatnonzero(starts[1:] != starts[:-1]) + 1))
+        lasts = np.append(firsts[1:], len(starts)) - 1
+
+        bar = self._open_bars[resolution]
+        labels, closes1, closes2 = starts[firsts[:-1]], values1[lasts[:-1]], values2[lasts[:-1]]
+        if bar is not None and bar.start != starts[0]:
+            # 之前打开的 bar 在本批第一行之前结束
+            labels = np.insert(labels, 0, bar.start)
+            closes1 = np.insert(closes1, 0, bar.ohlc1[3])
+            closes2 = np.insert(closes2, 0, bar.ohlc2[3])
+        if len(labels):
+            self.calculators[resolution].update_time_series_arrays(self._labels(labels), closes1, closes2)
+
+        tail = slice(firsts[-1], None)
+        if bar is not None and bar.start == starts[-1]:
+            bar.merge(values1[tail], values2[tail])
+        else:
+            self._open_bars[resolution] = _OpenBar(int(starts[-1]), values1[tail], values2[tail])
+
+    def flush(self):
+        """
+        结束所有打开的 bar (例如数据结束时), 把它们的 close 追加到 calculator。
+        Rows later than the flushed bars may still follow; rows inside them are rejected.
+        """
+        for resolution, bar in self._open_bars.items():
+            if bar is None:
+                continue
+            self.calculators[resolution].update_time_series_arrays(
+                self._labels(np.array([bar.start], dtype=np.int64)), bar.ohlc1[3:], bar.ohlc2[3:])
+            self._flushed_starts[resolution] = bar.start
+            self._open_bars[resolution] = None
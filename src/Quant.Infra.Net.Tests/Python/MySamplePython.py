@@ -1,20 +1,63 @@
-﻿import statsmodels.api as sm
+﻿import ctypes
 import numpy as np
+from RollingOls import ols_regression_batch, ols_regression_segments
 
 def ols_regression(data):
     # 提取SeriesA和SeriesB
     series_a = np.array(data.SeriesA)
     series_b = np.array(data.SeriesB)
 
-    # 在自变量中添加常数项以拟合截距
-    series_b = sm.add_constant(series_b)
-
-    # 拟合OLS模型
-    model = sm.OLS(series_a, series_b)
-    results = model.fit()
+    # 闭式最小二乘解拟合 SeriesA = a * SeriesB + constant
+    slope, intercept = ols_regression_batch(series_a, series_b)
 
     # 返回回归系数和截距
     return {
-        "a": results.params[1],  # 系数
-        "constant": results.params[0]  # 截距
+        "a": slope,  # 系数
+        "constant": intercept  # 截距
     }
+
+
+def _buffer_view(buffer, dtype, length=None, writable=False):
+    """
+    把实现了 buffer protocol 的对象 (numpy 数组, memoryview, bytearray ...) 或内存地址 (int) 看作一维数组, 不复制。
+    An int is the address of a pinned .NET array (GCHandle.AddrOfPinnedObject); its length must be given.
+    """
+    dtype = np.dtype(dtype)
+    if isinstance(buffer, int):
+        if length is None:
+            raise ValueError("length is required when a buffer is passed as an address.")
+        buffer = (ctypes.c_char * (length * dtype.itemsize)).from_address(buffer)
+    view = np.frombuffer(buffer, dtype=dtype)
+    if length is not None and len(view) < length:
+        raise ValueError(f"Buffer holds {len(view)} values, {length} required.")
+    if writable and not view.flags.writeable:
+        raise ValueError("output must be a writable buffer.")
+    return view if length is None else view[:length]
+
+
+def ols_regression_buffers(series_a, series_b, offsets, output, count=None, length=None):
+    """
+    批量回归入口: 一次调用完成多个 SeriesA = a * SeriesB + constant 的回归, 不逐元素转换, 不返回 dict。
+    All windows are packed back to back in two float64 buffers; window i is [offsets[i], offsets[i + 1]).
+    Inputs are read through the buffer protocol without copying and the results are written to output as
+    (a, constant) pairs, i.e. output[2 * i] = a and output[2 * i + 1] = constant; windows with fewer than two
+    points get NaN. Each argument may also be the address of a pinned .NET array, in which case count and
+    length give the sizes.
+    :param series_a: float64 buffer
+    :param series_b: float64 buffer, 与 series_a 等长
+    :param offsets: int64 buffer, 长度为 count + 1
+    :param output: 可写的 float64 buffer, 至少 2 * count 个元素
+    :param count: 回归个数; 默认由 offsets 的长度决定
+    :param length: series_a/series_b 的元素个数; 默认为整个 buffer
+    :return: 回归个数
+    """
+    offsets = _buffer_view(offsets, np.int64, None if count is None else count + 1)
+    count = len(offsets) - 1
+    if length is None and isinstance(series_a, int):
+        length = int(offsets[-1])
+    slopes, intercepts = ols_regression_segments(_buffer_view(series_a, np.float64, length),
+                                                 _buffer_view(series_b, np.float64, length), offsets)
+    result = _buffer_view(output, np.float64, 2 * count, writable=True).reshape(count, 2)
+    result[:, 0] = slopes
+    result[:, 1] = intercepts
+    return count
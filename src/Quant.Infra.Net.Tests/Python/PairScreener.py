@@ -0,0 +1,213 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import numpy as np
+from pandas import DataFrame
+from statsmodels.tsa.adfvalues import mackinnonp
+from BatchSpreadEngine import SharedPanel, attach_worker_panel, worker_panel_values
+from SpreadCalculator import ResolutionLevel, SpreadCalculatorSP500
+
+
+class ScreenedPair:
+    """
+    一个通过筛选的 pair: symbol1 = slope * symbol2 + intercept + residual, residual 经 Engle-Granger 检验平稳。
+    """
+
+    __slots__ = ("symbol1", "symbol2", "correlation", "slope", "intercept", "adf_statistic", "pvalue", "half_life")
+
+    def __init__(self, symbol1: str, symbol2: str, correlation: float, slope: float, intercept: float,
+                 adf_statistic: float, pvalue: float, half_life: float):
+        self.symbol1 = symbol1
+        self.symbol2 = symbol2
+        self.correlation = correlation
+        self.slope = slope
+        self.intercept = intercept
+        self.adf_statistic = adf_statistic
+        self.pvalue = pvalue
+        self.half_life = half_life
+
+    def __str__(self):
+        return (f"{self.symbol1}/{self.symbol2}: ADF {self.adf_statistic:.3f}, p={self.pvalue:.4f}, "
+                f"corr={self.correlation:.3f}, slope={self.slope:.4f}, half-life={self.half_life:.1f}")
+
+
+def correlation_candidates(values: np.ndarray, min_correlation: float, block_size: int = 256):
+    """
+    分块计算价格面板的相关系数矩阵, 只保留 i < j 且相关系数绝对值不低于 min_correlation 的 pair。
+    Strongly negatively correlated pairs are kept: they cointegrate with a negative hedge ratio.
+    Only one block × block tile of the matrix exists at a time, so memory stays O(time × symbols).
+    :param values: 价格面板 (time × symbols), 不含 NaN
+    :return: (pair_index (k, 2) int32 array, correlations (k,))
+    """
+    centered = values - values.mean(axis=0)
+    norms = np.sqrt(np.einsum('ij,ij->j', centered, centered))
+    standardized = centered / np.where(norms > 0, norms, np.inf)
+    count = values.shape[1]
+    pairs, correlations = [], []
+    for row_start in range(0, count, block_size):
+        row_stop = min(row_start + block_size, count)
+        for column_start in range(row_start, count, block_size):
+            column_stop = min(column_start + block_size, count)
+            tile = standardized[:, row_start:row_stop].T @ standardized[:, column_start:column_stop]
+            rows, columns = np.nonzero(np.abs(tile) >= min_correlation)
+            rows += row_start
+            columns += column_start
+            upper = rows < columns
+            pairs.append(np.column_stack((rows[upper], columns[upper])))
+            correlations.append(tile[rows[upper] - row_start, columns[upper] - column_start])
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int32), np.empty(0)
+    return np.concatenate(pairs).astype(np.int32), np.concatenate(correlations)
+
+
+def engle_granger_block(values: np.ndarray, pair_index: np.ndarray, lags: int = 1):
+    """
+    对一组 pair 批量做 Engle-Granger 检验: 先回归 y = slope * x + intercept, 再对残差做无常数项的 ADF 回归
+    Δe_t = γ e_{t-1} + Σ φ_l Δe_{t-l}, 所有 pair 的正规方程一次求解。
+    Matches statsmodels.tsa.stattools.coint(y, x, maxlag=lags, autolag=None).
+    :param values: 价格面板 (time × symbols)
+    :param pair_index: (k, 2) 下标数组, 第一列为 y, 第二列为 x
+    :param lags: ADF 回归中 Δe 的滞后阶数
+    :return: (slope, intercept, adf_statistic, gamma) arrays of shape (k,)
+    """
+    y = values[:, pair_index[:, 0]]
+    x = values[:, pair_index[:, 1]]
+    mean_x = x.mean(axis=0)
+    mean_y = y.mean(axis=0)
+    centered_x = x - mean_x
+    slope = np.einsum('ij,ij->j', centered_x, y - mean_y) / np.einsum('ij,ij->j', centered_x, centered_x)
+    intercept = mean_y - slope * mean_x
+    residual = y - slope * x - intercept
+
+    diff = np.diff(residual, axis=0)
+    nobs = len(diff) - lags
+    # 回归变量: e_{t-1}, Δe_{t-1}, ..., Δe_{t-lags}; 形状 (k, nobs, lags + 1)
+    regressors = np.empty((pair_index.shape[0], nobs, lags + 1))
+    regressors[:, :, 0] = residual[lags:-1].T
+    for lag in range(1, lags + 1):
+        regressors[:, :, lag] = diff[lags - lag:len(diff) - lag].T
+    target = diff[lags:].T
+    gram = np.einsum('kti,ktj->kij', regressors, regressors)
+    moment = np.einsum('kti,kt->ki', regressors, target)
+    # pinv 使退化的 pair (例如残差恒为 0) 得到 NaN 而不是让整个批次失败
+    inverse = np.linalg.pinv(gram)
+    coefficients = np.einsum('kij,kj->ki', inverse, moment)
+    errors = target - np.einsum('kti,ki->kt', regressors, coefficients)
+    variance = np.einsum('kt,kt->k', errors, errors) / (nobs - lags - 1)
+    inverse_00 = inverse[:, 0, 0]
+    gamma = coefficients[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = gamma / np.sqrt(variance * inverse_00)
+    return slope, intercept, np.where(np.isfinite(statistic), statistic, np.nan), gamma
+
+
+def _screen_block(start: int, pair_index: np.ndarray, lags: int, values: Optional[np.ndarray] = None):
+    """
+    两个方向都检验, 每个 pair 保留 ADF 统计量更小的方向。
+    :return: (start, flipped, slope, intercept, adf_statistic, gamma)
+    """
+    if values is None:
+        values = worker_panel_values()
+    forward = engle_granger_block(values, pair_index, lags)
+    backward = engle_granger_block(values, pair_index[:, ::-1], lags)
+    flipped = backward[2] < forward[2]
+    return (start, flipped) + tuple(np.where(flipped, b, f) for f, b in zip(forward, backward))
+
+
+class PairScreener:
+    """
+    从一组 symbol 中筛选协整的 pair: 先用分块相关系数矩阵预筛, 再对候选 pair 批量做 Engle-Granger 检验。
+    The aligned panel is placed in shared memory once (BatchSpreadEngine.SharedPanel) and blocks of
+    candidate pairs are tested in a process pool. Results are ranked by p-value, then ADF statistic, and
+    can be turned into SpreadCalculator instances with create_calculators.
+    """
+
+    def __init__(self, min_correlation: float = 0.8, max_pvalue: float = 0.05, lags: int = 1,
+                 max_workers: Optional[int] = None, block_size: int = 0, correlation_block_size: int = 256):
+        """
+        :param min_correlation: 预筛的最小价格相关系数 (绝对值)
+        :param max_pvalue: 保留 p 值不超过该值的 pair
+        :param lags: ADF 回归的滞后阶数 (固定, 不做 AIC 选择)
+        :param max_workers: 进程数; 0 或 1 表示在当前进程中计算
+        :param block_size: 每个任务的 pair 数, 0 表示按面板长度自动选择
+        :param correlation_block_size: 相关系数矩阵每块的 symbol 数
+        """
+        if lags < 0:
+            raise ValueError("lags must not be negative.")
+        self.min_correlation = min_correlation
+        self.max_pvalue = max_pvalue
+        self.lags = lags
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+        self.block_size = block_size
+        self.correlation_block_size = correlation_block_size
+
+    def screen(self, panel: DataFrame) -> List[ScreenedPair]:
+        """
+        :param panel: 对齐后的价格面板, index 为 date_time, 每列一个 symbol, 不允许 NaN
+        :return: 按 p 值排序的 ScreenedPair 列表
+        """
+        values = panel.to_numpy(dtype=np.float64)
+        if np.isnan(values).any():
+            missing = panel.columns[np.isnan(values).any(axis=0)].tolist()
+            raise ValueError(f"The price panel must be aligned without NaN values; columns with NaN: {missing}")
+        if len(values) < self.lags + 4:
+            raise ValueError("The price panel is too short for the Engle-Granger test.")
+
+        symbols = [str(symbol) for symbol in panel.columns]
+        pair_index, correlations = correlation_candidates(values, self.min_correlation, self.correlation_block_size)
+        pair_count = len(pair_index)
+        if pair_count == 0:
+            return []
+
+        # 每个任务的中间数组约为 pairs × time × (lags + 1)
+        block_size = self.block_size or max(1, (1 << 21) // (len(values) * (self.lags + 2)))
+        blocks = [(start, min(start + block_size, pair_count)) for start in range(0, pair_count, block_size)]
+        flipped = np.zeros(pair_count, dtype=bool)
+        results = np.full((4, pair_count), np.nan)
+
+        def collect(result):
+            start, block_flipped = result[0], result[1]
+            stop = start + len(block_flipped)
+            flipped[start:stop] = block_flipped
+            results[:, start:stop] = result[2:]
+
+        if self.max_workers is None or self.max_workers <= 1 or len(blocks) <= 1:
+            for start, stop in blocks:
+                collect(_screen_block(start, pair_index[start:stop], self.lags, values))
+        else:
+            with SharedPanel.create(values) as shared:
+                with ProcessPoolExecutor(max_workers=self.max_workers, initializer=attach_worker_panel,
+                                         initargs=(shared.name, shared.shape)) as executor:
+                    futures = [executor.submit(_screen_block, start, pair_index[start:stop], self.lags)
+                               for start, stop in blocks]
+                    for future in futures:
+                        collect(future.result())
+
+        slope, intercept, statistic, gamma = results
+        pvalue = np.array([mackinnonp(value, regression="c", N=2) if value == value else np.nan
+                           for value in statistic.tolist()])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            half_life = np.where((gamma < 0) & (gamma > -1), -np.log(2) / np.log1p(gamma), np.inf)
+
+        selected = np.flatnonzero(pvalue <= self.max_pvalue)
+        selected = selected[np.lexsort((statistic[selected], pvalue[selected]))]
+        ordered = np.where(flipped[:, None], pair_index[:, ::-1], pair_index)
+        return [ScreenedPair(symbols[ordered[k, 0]], symbols[ordered[k, 1]], float(correlations[k]),
+                             float(slope[k]), float(intercept[k]), float(statistic[k]), float(pvalue[k]),
+                             float(half_life[k]))
+                for k in selected]
+
+    @staticmethod
+    def to_dataframe(pairs: List[ScreenedPair]) -> DataFrame:
+        return DataFrame([{name: getattr(pair, name) for name in ScreenedPair.__slots__} for pair in pairs],
+                         columns=list(ScreenedPair.__slots__))
+
+    @staticmethod
+    def create_calculators(pairs: List[ScreenedPair], calculator_class=SpreadCalculatorSP500,
+                           resolution: ResolutionLevel = ResolutionLevel.Daily, **kwargs) -> list:
+        """
+        为每个筛选出的 pair 创建计算器, symbol1 为回归中的因变量。
+        :param calculator_class: 例如 SpreadCalculatorSP500
+        :param kwargs: 传给计算器的其他参数, 例如 regression_engine
+        """
+        return [calculator_class(pair.symbol1, pair.symbol2, resolution, **kwargs) for pair in pairs]
@@ -0,0 +1,94 @@
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+# 未启用统计时使用的空 context manager, 不分配对象
+NULL_STAGE = nullcontext()
+
+
+class StageStats:
+    """
+    一个阶段的累计统计: 调用次数、总耗时、最长耗时和处理的行数。
+    """
+
+    __slots__ = ("calls", "seconds", "max_seconds", "rows")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "seconds": self.seconds, "max_seconds": self.max_seconds, "rows": self.rows,
+                "mean_us": self.seconds / self.calls * 1e6 if self.calls else 0.0}
+
+
+class _StageTimer:
+    __slots__ = ("stats", "name", "rows", "start")
+
+    def __init__(self, stats, name: str, rows: int):
+        self.stats = stats
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.record(self.name, (time.perf_counter_ns() - self.start) * 1e-9, self.rows)
+        return False
+
+
+class PipelineStats:
+    """
+    spread 计算流程的分阶段计时和计数, 例如 'update_time_series.align', 'upsert.regression', 'element.write'。
+    Counters track rows processed, regressions fitted and DataFrame reallocations (concat, dropna, astype,
+    whole-column materialization). An optional callback receives (stage, seconds, rows) as each stage ends,
+    e.g. to forward to a metrics system. Pass an instance as SpreadCalculator(stats=...); without one the
+    calculator only performs a None check per stage.
+    """
+
+    def __init__(self, callback: Optional[Callable[[str, float, int], None]] = None):
+        """
+        :param callback: 可选, 每个阶段结束时调用 callback(stage, seconds, rows)
+        """
+        self.callback = callback
+        self.stages: Dict[str, StageStats] = {}
+        self.counters: Dict[str, int] = {}
+
+    def stage(self, name: str, rows: int = 0) -> _StageTimer:
+        """
+        计时一个阶段: with stats.stage('upsert.regression', rows=n): ...
+        """
+        return _StageTimer(self, name, rows)
+
+    def record(self, name: str, seconds: float, rows: int = 0):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageStats()
+        stage.calls += 1
+        stage.seconds += seconds
+        stage.rows += rows
+        if seconds > stage.max_seconds:
+            stage.max_seconds = seconds
+        if self.callback is not None:
+            self.callback(name, seconds, rows)
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        self.stages.clear()
+        self.counters.clear()
+
+    def to_dict(self) -> dict:
+        return {"stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+                "counters": dict(self.counters)}
+
+    def __str__(self):
+        lines = [f"{name}: {stage.calls} calls, {stage.seconds * 1e3:.3f} ms, {stage.rows} rows"
+                 for name, stage in sorted(self.stages.items(), key=lambda item: -item[1].seconds)]
+        lines += [f"{name}: {value}" for name, value in sorted(self.counters.items())]
+        return "PipelineStats:\n  " + "\n  ".join(lines)
@@ -0,0 +1,195 @@
+import json
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from Alignment import NAT
+from SpreadCalculator import TimeSeries
+
+# 以 UTC 偏移结尾的时间, 例如 yfinance 小时线的 '2024-01-02 09:30:00-05:00'
+_OFFSET_PATTERN = r'(?:[+-]\d\d:?\d\d|Z)$'
+
+
+def read_symbol_csv(path: str, column: str = "Close"):
+    """
+    读取一个 {symbol}.csv (fetch_and_save_financial_data_symbols 的输出, 第一列为时间) 中的一个价格列。
+    Rows with unparsable times or prices are dropped, the rows are sorted by time and duplicate times keep
+    the last row. Times with a UTC offset are converted to UTC; naive times are kept as they are.
+    :return: (int64 ns date_times, float64 values, has_offset)
+    """
+    frame = pd.read_csv(path, dtype=str)
+    if column not in frame.columns:
+        raise ValueError(f"Column {column} not found in {path}.")
+    text = frame.iloc[:, 0]
+    has_offset = bool(text.str.contains(_OFFSET_PATTERN, na=False).any())
+    date_times = pd.DatetimeIndex(pd.to_datetime(text, utc=has_offset, errors='coerce', format='mixed'))
+    date_times = date_times.as_unit('ns').asi8
+    values = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+
+    valid = (date_times != NAT) & ~np.isnan(values)
+    date_times, values = date_times[valid], values[valid]
+    order = np.argsort(date_times, kind='stable')
+    date_times, values = date_times[order], values[order]
+    # 重复的时间保留最后一行
+    last = np.append(date_times[1:] != date_times[:-1], True)
+    return date_times[last], values[last], has_offset
+
+
+class PricePanel:
+    """
+    磁盘上的内存映射价格面板 (time × symbols, float64) 与 symbol 索引。
+    Layout: {directory}/symbols.json (symbols in column order, metadata and the names of the array files),
+    {directory}/values.{version}.npy (the panel) and {directory}/date_times.{version}.npy (int64 ns); panels
+    written before versioned names use values.npy and date_times.npy. open() memory-maps the arrays, so any
+    number of calculators and worker processes can share one panel; a PricePanel passed to a process pool is
+    reopened from its directory instead of being pickled with its data.
+    """
+
+    VALUES_FILE = "values.npy"
+    DATE_TIMES_FILE = "date_times.npy"
+    SYMBOLS_FILE = "symbols.json"
+
+    def __init__(self, directory: str, values: np.ndarray, date_times: np.ndarray, symbols: List[str],
+                 metadata: dict):
+        self.directory = directory
+        self.values = values
+        self.date_times = date_times
+        self.symbols = symbols
+        self.metadata = metadata
+        self.symbol_index: Dict[str, int] = {symbol: i for i, symbol in enumerate(symbols)}
+
+    @classmethod
+    def open(cls, directory: str, mode: str = 'r'):
+        """
+        :param mode: np.load 的 mmap_mode, 'r' 只读, 'r+' 可写, 'c' 写时复制
+        """
+        with open(os.path.join(directory, cls.SYMBOLS_FILE), "r", encoding="utf-8") as file:
+            index = json.load(file)
+        values = np.load(os.path.join(directory, index.get("values_file", cls.VALUES_FILE)), mmap_mode=mode)
+        date_times = np.load(os.path.join(directory, index.get("date_times_file", cls.DATE_TIMES_FILE)),
+                             mmap_mode='r')
+        return cls(directory, values, date_times, index["symbols"], index["metadata"])
+
+    def __reduce__(self):
+        return PricePanel.open, (self.directory,)
+
+    def __len__(self):
+        return len(self.date_times)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        index = pd.DatetimeIndex(np.asarray(self.date_times).view('datetime64[ns]'), name='date_time')
+        timezone = self.metadata.get("timezone")
+        return index.tz_localize(timezone) if timezone else index
+
+    def column(self, symbol: str) -> np.ndarray:
+        """
+        :return: 一个 symbol 的价格列 (内存映射视图, 不复制), 缺失的时间为 NaN
+        """
+        return self.values[:, self.symbol_index[symbol]]
+
+    def time_series(self, symbol: str) -> TimeSeries:
+        """
+        :return: 该 symbol 有价格的行组成的 TimeSeries, 可直接传给 SpreadCalculator.update_time_series
+        """
+        values = self.column(symbol)
+        valid = ~np.isnan(values)
+        return TimeSeries(np.asarray(self.date_times)[valid].view('datetime64[ns]'), values[valid],
+                          tz=self.metadata.get("timezone"))
+
+    def to_dataframe(self, symbols: Optional[Sequence[str]] = None) -> DataFrame:
+        """
+        :return: index 为 date_time, 每列一个 symbol 的 DataFrame, 例如 BatchSpreadEngine.run 或 PairScreener.screen
+                 的输入; 不指定 symbols 时为整个面板
+        """
+        if symbols is None:
+            return DataFrame(self.values, index=self.index, columns=self.symbols, copy=False)
+        positions = [self.symbol_index[symbol] for symbol in symbols]
+        return DataFrame(self.values[:, positions], index=self.index, columns=list(symbols))
+
+
+def build_price_panel(folder_path: str, output_directory: str, symbols: Optional[Sequence[str]] = None,
+                      column: str = "Close", how: str = "outer", fill: bool = False,
+                      max_workers: Optional[int] = None) -> PricePanel:
+    """
+    并行读取 folder_path 中的 {symbol}.csv, 对齐到共同的时间轴, 写入 output_directory 中的内存映射面板。
+    Each file is parsed in a process pool (read_symbol_csv). how='outer' uses the union of all times with NaN
+    where a symbol has no row, how='inner' keeps only the times every symbol has; fill=True forward-fills the
+    gaps of the outer panel (leading gaps stay NaN). The arrays are written under new versioned file names and
+    symbols.json, which names them, is replaced last, so open() sees either the previous panel or the new one.
+    Array files of previous versions are then removed; a reader that has read the old symbols.json but not yet
+    mapped its arrays can fail to find them, and files still mapped elsewhere (on Windows) are left behind.
+    :param symbols: 可选, 只读取这些 symbol; 默认为目录中的全部 .csv 文件
+    :param column: 价格列, 例如 'Close' 或 'Adj Close'
+    :param max_workers: 进程数; 0 或 1 表示在当前进程中读取
+    :return: 以只读方式打开的 PricePanel
+    """
+    if how not in ("outer", "inner"):
+        raise ValueError("how must be 'outer' or 'inner'.")
+    if symbols is None:
+        symbols = sorted(name[:-4] for name in os.listdir(folder_path) if name.lower().endswith(".csv"))
+    symbols = list(symbols)
+    if not symbols:
+        raise ValueError(f"No symbol files found in {folder_path}.")
+    paths = [os.path.join(folder_path, f"{symbol}.csv") for symbol in symbols]
+    columns = [column] * len(paths)
+
+    max_workers = max_workers if max_workers is not None else os.cpu_count()
+    if max_workers is None or max_workers <= 1 or len(paths) <= 1:
+        parsed = list(map(read_symbol_csv, paths, columns))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parsed = list(executor.map(read_symbol_csv, paths, columns,
+                                       chunksize=max(1, len(paths) // (4 * max_workers))))
+
+    offsets = {has_offset for _, _, has_offset in parsed}
+    if len(offsets) > 1:
+        raise ValueError("Some files have UTC offsets and some do not; the times cannot be aligned.")
+    axis = np.unique(np.concatenate([date_times for date_times, _, _ in parsed]))
+    if how == "inner":
+        for date_times, _, _ in parsed:
+            axis = axis[np.isin(axis, date_times, assume_unique=True)]
+
+    os.makedirs(output_directory, exist_ok=True)
+    version = uuid.uuid4().hex
+    values_file, date_times_file = f"values.{version}.npy", f"date_times.{version}.npy"
+    values = np.lib.format.open_memmap(os.path.join(output_directory, values_file), mode='w+', dtype=np.float64,
+                                       shape=(len(axis), len(symbols)))
+    for k, (date_times, prices, _) in enumerate(parsed):
+        column_values = np.full(len(axis), np.nan)
+        positions = np.searchsorted(axis, date_times)
+        present = positions < len(axis)
+        present[present] = axis[positions[present]] == date_times[present]
+        column_values[positions[present]] = prices[present]
+        if fill:
+            column_values = pd.Series(column_values).ffill().to_numpy()
+        values[:, k] = column_values
+    values.flush()
+    del values
+
+    np.save(os.path.join(output_directory, date_times_file), axis)
+    symbols_path = os.path.join(output_directory, PricePanel.SYMBOLS_FILE)
+    metadata = {"column": column, "how": how, "fill": fill, "timezone": "UTC" if offsets == {True} else None,
+                "source": os.path.abspath(folder_path)}
+    with open(symbols_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump({"symbols": symbols, "metadata": metadata, "values_file": values_file,
+                   "date_times_file": date_times_file}, file, indent=1)
+    # 唯一的切换点: 之前的 symbols.json 仍指向旧的数组文件
+    os.replace(symbols_path + ".tmp", symbols_path)
+    _remove_old_versions(output_directory, {values_file, date_times_file})
+    return PricePanel.open(output_directory)
+
+
+def _remove_old_versions(directory: str, keep: set):
+    """
+    删除之前版本的数组文件; 仍被映射而无法删除的文件 (Windows) 留到下一次写入时再删除。
+    """
+    for name in os.listdir(directory):
+        if name.endswith(".npy") and name.startswith(("values.", "date_times.")) and name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
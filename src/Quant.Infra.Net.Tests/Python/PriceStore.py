@@ -0,0 +1,349 @@
+import json
+import os
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from SpreadCalculator import TimeSeries
+
+
+class PriceStore:
+    """
+    本地列式价格库: 按 symbol / interval 分区, 每个分区由若干个 chunk 组成, 每个 chunk 每列一个 .npy 文件。
+    Layout: {root}/{symbol}/{interval}/index.json plus {root}/{symbol}/{interval}/{chunk}/{column}.npy.
+    index.json records the date range of every chunk, so a date slice only opens the chunks it overlaps,
+    and those are memory-mapped: a slice inside one chunk is returned without copying.
+    Timestamps are stored as int64 nanoseconds (UTC for timezone-aware input).
+    """
+
+    INDEX_FILE = "index.json"
+    DATE_TIME = "date_time"
+
+    def __init__(self, root: str, chunk_rows: int = 1 << 20):
+        """
+        :param root: 存储根目录
+        :param chunk_rows: 每个 chunk 的最大行数
+        """
+        self.root = root
+        self.chunk_rows = chunk_rows
+
+    def partition_path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, symbol.replace(os.sep, "_"), interval)
+
+    def read_index(self, symbol: str, interval: str) -> Optional[dict]:
+        """
+        :return: 分区的索引 {"columns", "timezone", "chunks": [{"name", "start", "end", "rows"}]}, 不存在时返回 None
+        """
+        path = os.path.join(self.partition_path(symbol, interval), self.INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _write_index(self, symbol: str, interval: str, index: dict):
+        path = os.path.join(self.partition_path(symbol, interval), self.INDEX_FILE)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(index, file, indent=1)
+        os.replace(temp_path, path)
+
+    def symbols(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(entry for entry in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, entry)))
+
+    def date_range(self, symbol: str, interval: str):
+        """
+        :return: (first, last) pd.Timestamp of the partition, or None when it is empty
+        """
+        index = self.read_index(symbol, interval)
+        if not index or not index["chunks"]:
+            return None
+        return (self._to_timestamp(index["chunks"][0]["start"], index),
+                self._to_timestamp(index["chunks"][-1]["end"], index))
+
+    def bar_ranges(self, symbol: str, interval: str, max_gap) -> List[tuple]:
+        """
+        实际存储的 bar 组成的连续区间: 相邻两个 bar 的间隔不超过 max_gap 时属于同一段。
+        Only the date_time arrays are read (memory-mapped), one chunk at a time.
+        :param max_gap: pd.Timedelta, 通常为一个 bar 的间隔
+        :return: [(first, last) pd.Timestamp], last 为该段最后一个 bar (包含)
+        """
+        index = self.read_index(symbol, interval)
+        if not index or not index["chunks"]:
+            return []
+        max_gap = pd.Timedelta(max_gap).value
+        runs = []
+        for chunk in index["chunks"]:
+            date_times, _ = self._read_chunk(symbol, interval, chunk["name"], [])
+            if len(date_times) == 0:
+                continue
+            breaks = np.flatnonzero(np.diff(date_times) > max_gap)
+            firsts = np.concatenate(([date_times[0]], date_times[breaks + 1]))
+            lasts = np.append(date_times[breaks], date_times[-1])
+            if runs and firsts[0] - runs[-1][1] <= max_gap:
+                runs[-1][1] = int(lasts[0])
+                firsts, lasts = firsts[1:], lasts[1:]
+            runs.extend([int(first), int(last)] for first, last in zip(firsts, lasts))
+        return [(self._to_timestamp(first, index), self._to_timestamp(last, index)) for first, last in runs]
+
+    def _covered_intervals(self, index: dict) -> List[List[int]]:
+        """
+        记录的请求区间 (int64 ns), 兼容只保存一个 [start, end] 区间的旧索引。
+        """
+        covered = index.get("covered") or []
+        if covered and not isinstance(covered[0], list):
+            covered = [covered]
+        return [list(interval) for interval in covered]
+
+    def covered_ranges(self, symbol: str, interval: str) -> List[tuple]:
+        """
+        记录为已下载的请求区间, 按时间排序, 相交或相连的区间已合并; 区间之间的空隙是没有下载过的部分。
+        :return: [(start, end) pd.Timestamp], end 为请求区间的 (不含) 终点
+        """
+        index = self.read_index(symbol, interval)
+        if not index:
+            return []
+        return [(self._to_timestamp(start, index), self._to_timestamp(end, index))
+                for start, end in self._covered_intervals(index)]
+
+    def covered_range(self, symbol: str, interval: str):
+        """
+        已经下载过的时间区间: 记录的请求区间与实际 bar 区间的并集的首尾。
+        Requested ranges can extend past the first/last bar (holidays, weekends), so they are recorded
+        separately to avoid asking the data source for the same empty range again. The end is either the
+        last bar (inclusive) or the exclusive end of a recorded request. Gaps between recorded ranges are
+        listed by covered_ranges.
+        :return: (start, end) pd.Timestamp, or None when nothing has been stored
+        """
+        index = self.read_index(symbol, interval)
+        if not index:
+            return None
+        bounds = [tuple(interval) for interval in self._covered_intervals(index)]
+        if index["chunks"]:
+            bounds.append((index["chunks"][0]["start"], index["chunks"][-1]["end"]))
+        if not bounds:
+            return None
+        return (self._to_timestamp(min(start for start, _ in bounds), index),
+                self._to_timestamp(max(end for _, end in bounds), index))
+
+    def mark_covered(self, symbol: str, interval: str, start, end):
+        """
+        记录 [start, end) 已经下载过, 与相交或相连的已记录区间合并; 不相连的区间单独保存。
+        """
+        index = self.read_index(symbol, interval) or {"columns": [], "timezone": None, "chunks": []}
+        start_ns = self._to_nanoseconds(start, index, default=0)
+        end_ns = self._to_nanoseconds(end, index, default=0)
+        merged = []
+        for interval_start, interval_end in sorted(self._covered_intervals(index) + [[start_ns, end_ns]]):
+            if merged and interval_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], interval_end)
+            else:
+                merged.append([interval_start, interval_end])
+        index["covered"] = merged
+        os.makedirs(self.partition_path(symbol, interval), exist_ok=True)
+        self._write_index(symbol, interval, index)
+
+    def append(self, symbol: str, interval: str, data: DataFrame) -> int:
+        """
+        写入新的 bar: 早于第一行、晚于最后一行以及落在已有数据空隙中的行都会写入; 时间已存在的行被跳过,
+        已有的历史不会被改写。
+        Rows in a gap between two chunks become new chunks between them; rows inside the time span of a chunk
+        that the chunk does not hold yet are merged into it, as are rows after a last chunk that is not full.
+        Only the merged chunks are rewritten. If a replaced chunk cannot be removed afterwards (e.g. it is still
+        memory-mapped on Windows), OSError is raised once the new chunks and the index are written.
+        :param symbol: 例如 'AAPL'
+        :param interval: 例如 '1h'
+        :param data: 以时间为索引的 DataFrame (Open, High, Low, Close, Volume, ...)
+        :return: 写入的行数
+        """
+        if data is None or data.empty:
+            return 0
+        data = data[~data.index.duplicated(keep="last")].sort_index()
+        date_index = pd.DatetimeIndex(data.index)
+        timezone = str(date_index.tz) if date_index.tz is not None else None
+        if timezone is not None:
+            date_index = date_index.tz_convert("UTC").tz_localize(None)
+        date_times = date_index.as_unit("ns").asi8
+
+        index = self.read_index(symbol, interval)
+        if index is None or not index["columns"]:
+            index = dict(index or {}, columns=[str(column) for column in data.columns], timezone=timezone, chunks=[])
+        data = data.reindex(columns=index["columns"]).reset_index(drop=True)
+
+        os.makedirs(self.partition_path(symbol, interval), exist_ok=True)
+        chunks = index["chunks"]
+        if not chunks:
+            index["chunks"] = self._write_chunks(symbol, interval, index, date_times, data)
+            self._write_index(symbol, interval, index)
+            return len(date_times)
+
+        # 每行所在的 chunk (start <= t 的最后一个), -1 表示早于第一个 chunk
+        starts = np.array([chunk["start"] for chunk in chunks], dtype=np.int64)
+        ends = np.array([chunk["end"] for chunk in chunks], dtype=np.int64)
+        slots = np.searchsorted(starts, date_times, side="right") - 1
+        inside = (slots >= 0) & (date_times <= ends[np.maximum(slots, 0)])
+
+        written = 0
+        obsolete = []
+        before = slots < 0
+        new_chunks = self._write_chunks(symbol, interval, index, date_times[before], data[before])
+        written += int(before.sum())
+        for k, chunk in enumerate(chunks):
+            merge = inside & (slots == k)
+            gap = ~inside & (slots == k)
+            if k == len(chunks) - 1 and chunk["rows"] < self.chunk_rows:
+                # 最后一个 chunk 未满时把之后的数据也合并进去
+                merge, gap = merge | gap, np.zeros_like(gap)
+            if merge.any():
+                merged, count = self._merge_chunk(symbol, interval, index, chunk, date_times[merge], data[merge])
+                if count:
+                    new_chunks.extend(merged)
+                    obsolete.append(chunk["name"])
+                    written += count
+                else:
+                    new_chunks.append(chunk)
+            else:
+                new_chunks.append(chunk)
+            new_chunks.extend(self._write_chunks(symbol, interval, index, date_times[gap], data[gap]))
+            written += int(gap.sum())
+        index["chunks"] = new_chunks
+        # 先写新的 chunk 和索引, 再删除被替换的 chunk, 中途失败也不会丢失已有数据
+        self._write_index(symbol, interval, index)
+        failed = []
+        for name in obsolete:
+            try:
+                self._remove_chunk(symbol, interval, name)
+            except OSError as error:
+                failed.append(f"{name} ({error})")
+        if failed:
+            # 数据和索引已完整写入, 只是旧 chunk 目录残留在磁盘上
+            raise OSError(f"Appended {written} rows to {symbol} {interval}, but could not remove obsolete chunks: "
+                          + ", ".join(failed))
+        return written
+
+    def _merge_chunk(self, symbol: str, interval: str, index: dict, chunk: dict, date_times: np.ndarray,
+                     data: DataFrame):
+        """
+        把 chunk 中还没有的行与它合并, 写成新的 chunk; 时间已存在的行保留原来的值。
+        :return: (new chunks, 新增的行数); 没有新增行时不写入, 返回 ([], 0)
+        """
+        path = os.path.join(self.partition_path(symbol, interval), chunk["name"])
+        # 不使用内存映射读取, 以便随后可以删除这些文件
+        old_date_times = np.load(os.path.join(path, f"{self.DATE_TIME}.npy"))
+        new = ~np.isin(date_times, old_date_times)
+        if not new.any():
+            return [], 0
+        old = DataFrame({column: np.load(os.path.join(path, f"{column}.npy")) for column in index["columns"]})
+        merged_date_times = np.concatenate((old_date_times, date_times[new]))
+        merged = pd.concat([old, data[new].reset_index(drop=True)], ignore_index=True)
+        order = np.argsort(merged_date_times, kind="stable")
+        return (self._write_chunks(symbol, interval, index, merged_date_times[order],
+                                   merged.iloc[order].reset_index(drop=True)), int(new.sum()))
+
+    def _write_chunks(self, symbol: str, interval: str, index: dict, date_times: np.ndarray, data: DataFrame):
+        chunks = []
+        values = {name: data[name].to_numpy(dtype=np.float64) for name in index["columns"]}
+        for start in range(0, len(date_times), self.chunk_rows):
+            stop = min(start + self.chunk_rows, len(date_times))
+            name = self._next_chunk_name(symbol, interval)
+            path = os.path.join(self.partition_path(symbol, interval), name)
+            os.makedirs(path)
+            np.save(os.path.join(path, f"{self.DATE_TIME}.npy"), date_times[start:stop])
+            for column, column_values in values.items():
+                np.save(os.path.join(path, f"{column}.npy"), column_values[start:stop])
+            chunks.append({"name": name, "start": int(date_times[start]), "end": int(date_times[stop - 1]),
+                           "rows": stop - start})
+        return chunks
+
+    def _next_chunk_name(self, symbol: str, interval: str) -> str:
+        existing = [int(entry) for entry in os.listdir(self.partition_path(symbol, interval)) if entry.isdigit()]
+        return f"{max(existing, default=-1) + 1:06d}"
+
+    def _remove_chunk(self, symbol: str, interval: str, name: str):
+        path = os.path.join(self.partition_path(symbol, interval), name)
+        for entry in os.listdir(path):
+            os.remove(os.path.join(path, entry))
+        os.rmdir(path)
+
+    def _read_chunk(self, symbol: str, interval: str, name: str, columns: List[str]):
+        path = os.path.join(self.partition_path(symbol, interval), name)
+        date_times = np.load(os.path.join(path, f"{self.DATE_TIME}.npy"), mmap_mode="r")
+        return date_times, {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+                            for column in columns}
+
+    def load_arrays(self, symbol: str, interval: str, start=None, end=None, columns: Optional[List[str]] = None):
+        """
+        读取 [start, end] 区间的数据, 只打开与区间重叠的 chunk。
+        :return: (date_times int64 ns array, {column: float64 array}); memory-mapped views when the slice
+                 lies within one chunk
+        """
+        parts = list(self.iter_chunks(symbol, interval, start, end, columns))
+        if columns is None:
+            columns = self.read_index(symbol, interval)["columns"]
+        if not parts:
+            return np.empty(0, dtype=np.int64), {column: np.empty(0) for column in columns}
+        if len(parts) == 1:
+            return parts[0]
+        return (np.concatenate([date_times for date_times, _ in parts]),
+                {column: np.concatenate([values[column] for _, values in parts]) for column in columns})
+
+    def iter_chunks(self, symbol: str, interval: str, start=None, end=None, columns: Optional[List[str]] = None):
+        """
+        逐个 chunk 读取 [start, end] 区间的数据, 每次只映射一个 chunk, 用于超出内存的数据。
+        :return: 生成器, 每项为 (date_times int64 ns array, {column: memory-mapped float64 array})
+        """
+        index = self.read_index(symbol, interval)
+        if index is None:
+            raise FileNotFoundError(f"No data stored for {symbol} ({interval}) under {self.root}.")
+        columns = list(columns) if columns is not None else index["columns"]
+        missing = [column for column in columns if column not in index["columns"]]
+        if missing:
+            raise ValueError(f"Columns {missing} are not stored for {symbol} ({interval}).")
+        start_ns = self._to_nanoseconds(start, index, default=np.iinfo(np.int64).min)
+        end_ns = self._to_nanoseconds(end, index, default=np.iinfo(np.int64).max)
+        for chunk in index["chunks"]:
+            if chunk["end"] < start_ns or chunk["start"] > end_ns:
+                continue
+            date_times, values = self._read_chunk(symbol, interval, chunk["name"], columns)
+            lower = np.searchsorted(date_times, start_ns, side="left")
+            upper = np.searchsorted(date_times, end_ns, side="right")
+            if upper > lower:
+                yield date_times[lower:upper], {column: values[column][lower:upper] for column in columns}
+
+    def load(self, symbol: str, interval: str, start=None, end=None, columns: Optional[List[str]] = None) -> DataFrame:
+        """
+        读取 [start, end] 区间的数据为 DataFrame (索引为时间)。
+        """
+        index = self.read_index(symbol, interval)
+        date_times, values = self.load_arrays(symbol, interval, start, end, columns)
+        date_index = pd.DatetimeIndex(date_times.view("datetime64[ns]"), name=self.DATE_TIME, copy=False)
+        if index.get("timezone"):
+            date_index = date_index.tz_localize("UTC").tz_convert(index["timezone"])
+        return DataFrame(values, index=date_index, copy=False)
+
+    def load_time_series(self, symbol: str, interval: str, column: str = "Close", start=None, end=None) -> TimeSeries:
+        """
+        读取一列为 TimeSeries, 可直接传给 SpreadCalculator.update_time_series。
+        """
+        date_times, values = self.load_arrays(symbol, interval, start, end, [column])
+        index = self.read_index(symbol, interval)
+        return TimeSeries(date_times.view("datetime64[ns]"), values[column], tz=index.get("timezone"))
+
+    @staticmethod
+    def _to_nanoseconds(value, index: dict, default: int) -> int:
+        if value is None:
+            return default
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+        elif index.get("timezone"):
+            timestamp = timestamp.tz_localize(index["timezone"]).tz_convert("UTC").tz_localize(None)
+        return timestamp.as_unit("ns").value
+
+    @staticmethod
+    def _to_timestamp(nanoseconds: int, index: dict) -> pd.Timestamp:
+        timestamp = pd.Timestamp(nanoseconds, unit="ns")
+        if index.get("timezone"):
+            timestamp = timestamp.tz_localize("UTC").tz_convert(index["timezone"])
+        return timestamp
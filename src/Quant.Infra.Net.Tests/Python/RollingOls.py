@@ -0,0 +1,637 @@
+from typing import Optional
+import numpy as np
+
+
+def degenerate_tolerance(sum_xx, avg_x, count, mean_x):
+    """
+    判断 x 方差是否只剩舍入误差的阈值, 相对于平移前后 Σx² 中较大的一个。
+    """
+    raw_x = avg_x + mean_x
+    raw_sum_xx = sum_xx + count * (raw_x * raw_x - avg_x * avg_x)
+    return 1e-13 * np.maximum(np.abs(sum_xx), raw_sum_xx)
+
+
+def ols_from_sums(sum_x, sum_y, sum_xx, sum_xy, count, mean_x=0.0, mean_y=0.0):
+    """
+    根据窗口内的充分统计量(Σx, Σy, Σx², Σxy)计算 y = slope * x + intercept 的最小二乘解。
+    Closed-form least squares from window sufficient statistics. The sums may be taken over values
+    shifted by (mean_x, mean_y); the intercept is shifted back so the result is on the original scale.
+    A window whose x values are constant has no unique solution; like statsmodels' pinv fit, the
+    minimum-norm solution is returned for it.
+    :param sum_x: Σx (scalar or numpy array)
+    :param sum_y: Σy
+    :param sum_xx: Σx²
+    :param sum_xy: Σxy
+    :param count: 窗口长度
+    :param mean_x: x 的平移量
+    :param mean_y: y 的平移量
+    :return: (slope, intercept)
+    """
+    sum_x = np.asarray(sum_x, dtype=np.float64)
+    sum_y = np.asarray(sum_y, dtype=np.float64)
+    sum_xx = np.asarray(sum_xx, dtype=np.float64)
+    count = np.asarray(count, dtype=np.float64)
+    avg_x = sum_x / count
+    avg_y = sum_y / count
+    var_x = sum_xx - sum_x * avg_x
+    cov_xy = np.asarray(sum_xy, dtype=np.float64) - sum_x * avg_y
+
+    # x 在窗口内为常数时方差只剩舍入误差
+    degenerate = var_x <= degenerate_tolerance(sum_xx, avg_x, count, mean_x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(degenerate, 0.0, cov_xy / np.where(degenerate, 1.0, var_x))
+    intercept = avg_y - slope * avg_x
+
+    if np.any(degenerate):
+        raw_x = avg_x + mean_x
+        raw_y = avg_y + mean_y
+        scale = 1.0 + raw_x * raw_x
+        slope = np.where(degenerate, raw_y * raw_x / scale, slope)
+        intercept = np.where(degenerate, raw_y / scale - mean_y + slope * mean_x, intercept)
+
+    intercept = intercept + mean_y - slope * mean_x
+    if slope.ndim == 0:
+        return float(slope), float(intercept)
+    return slope, intercept
+
+
+def regression_from_sums(sum_x, sum_y, sum_xx, sum_xy, count, shift_x, shift_y):
+    """
+    ols_from_sums 的标量快速路径, 用于逐 bar 的回归; x 方差退化时交给 ols_from_sums。
+    :return: (slope, intercept)
+    """
+    if count < 2:
+        raise ValueError("The window must contain at least two data points for OLS regression.")
+    avg_x = sum_x / count
+    avg_y = sum_y / count
+    var_x = sum_xx - sum_x * avg_x
+    raw_x = avg_x + shift_x
+    raw_sum_xx = sum_xx + count * (raw_x * raw_x - avg_x * avg_x)
+    if var_x <= 1e-13 * max(abs(sum_xx), raw_sum_xx):
+        return ols_from_sums(sum_x, sum_y, sum_xx, sum_xy, count, mean_x=shift_x, mean_y=shift_y)
+    slope = (sum_xy - sum_x * avg_y) / var_x
+    intercept = avg_y - slope * avg_x + shift_y - slope * shift_x
+    return slope, intercept
+
+
+# rolling_ols 每块的最少输出行数; 块越短前缀和越小, 但 Python 循环次数越多
+ROLLING_OLS_BLOCK = 1024
+
+
+def rolling_ols(series_a, series_b, window: int):
+    """
+    一次遍历计算滚动窗口 OLS: seriesA = slope * seriesB + intercept。
+    Row i is regressed over rows [i - window, i), i.e. the window that precedes it, matching
+    SpreadCalculator.upsert_spread_and_equation. Rows without a full preceding window are NaN.
+    Window sums come from prefix sums over blocks of rows, each de-meaned by the mean of the data its windows
+    use, so the cancellation stays small on long drifting series.
+    Two-dimensional inputs of shape (time, k) are treated as k independent pairs, column by column.
+    :param series_a: 因变量 (symbol1)
+    :param series_b: 自变量 (symbol2)
+    :param window: 窗口长度
+    :return: (slope, intercept) numpy arrays with the same shape as the input
+    """
+    y = np.asarray(series_a, dtype=np.float64)
+    x = np.asarray(series_b, dtype=np.float64)
+    if y.shape != x.shape or y.ndim not in (1, 2):
+        raise ValueError("seriesA and seriesB must be one- or two-dimensional and have the same shape.")
+    if window < 2:
+        raise ValueError("window must contain at least two data points for OLS regression.")
+
+    n = len(y)
+    slope = np.full(y.shape, np.nan)
+    intercept = np.full(y.shape, np.nan)
+    if n <= window:
+        return slope, intercept
+
+    # 每块输出行的前缀和只跨越这一块用到的数据, 并按这段数据的均值平移
+    block = max(4 * window, ROLLING_OLS_BLOCK)
+    for begin in range(window, n, block):
+        stop = min(begin + block, n)
+        rows = stop - begin
+        # 第 i 行的窗口为 [i - window, i), 这一块用到的数据为 [begin - window, stop - 1)
+        segment_x = x[begin - window:stop - 1]
+        segment_y = y[begin - window:stop - 1]
+        mean_x = segment_x.mean(axis=0)
+        mean_y = segment_y.mean(axis=0)
+        xc = segment_x - mean_x
+        yc = segment_y - mean_y
+
+        def window_sums(values):
+            prefix = np.empty((len(values) + 1,) + values.shape[1:])
+            prefix[0] = 0.0
+            np.cumsum(values, axis=0, out=prefix[1:])
+            return prefix[window:window + rows] - prefix[:rows]
+
+        slope[begin:stop], intercept[begin:stop] = ols_from_sums(
+            window_sums(xc), window_sums(yc), window_sums(xc * xc), window_sums(xc * yc), window,
+            mean_x=mean_x, mean_y=mean_y)
+    return slope, intercept
+
+
+def time_window_starts(date_times, duration: int):
+    """
+    事件时间窗口: 第 i 行的窗口为它之前、时间晚于 t_i - duration 的行, 即 [start_i, i)。
+    A window is complete once the series reaches back to t_i - duration; rows before that are incomplete,
+    like the first `window` rows of a bar-count window.
+    :param date_times: 非递减的 int64 ns 时间
+    :param duration: 窗口长度 (ns)
+    :return: (start, complete) arrays
+    """
+    date_times = np.asarray(date_times, dtype=np.int64)
+    start = np.searchsorted(date_times, date_times - duration, side='right')
+    complete = date_times - duration >= date_times[0] if len(date_times) else np.zeros(0, dtype=bool)
+    return start, complete
+
+
+def rolling_ols_time(date_times, series_a, series_b, duration: int):
+    """
+    事件时间窗口的滚动 OLS: 第 i 行在 time_window_starts 给出的 [start_i, i) 上回归 seriesA = slope * seriesB + intercept。
+    Rows whose window is incomplete or holds fewer than two points are NaN. Window sums come from prefix sums
+    of de-meaned values, as in rolling_ols.
+    :param date_times: 非递减的 int64 ns 时间
+    :param duration: 窗口长度 (ns)
+    :return: (slope, intercept) numpy arrays
+    """
+    y = np.asarray(series_a, dtype=np.float64)
+    x = np.asarray(series_b, dtype=np.float64)
+    if y.shape != x.shape or y.ndim != 1 or len(date_times) != len(y):
+        raise ValueError("date_times, seriesA and seriesB must be one-dimensional and have the same length.")
+    n = len(y)
+    slope = np.full(n, np.nan)
+    intercept = np.full(n, np.nan)
+    if n < 3:
+        return slope, intercept
+
+    start, complete = time_window_starts(date_times, duration)
+    count = np.arange(n) - start
+    rows = np.flatnonzero(complete & (count >= 2))
+    if rows.size == 0:
+        return slope, intercept
+
+    mean_x = x.mean()
+    mean_y = y.mean()
+    xc = x - mean_x
+    yc = y - mean_y
+    prefix = np.zeros((4, n + 1))
+    for row, values in enumerate((xc, yc, xc * xc, xc * yc)):
+        np.cumsum(values, out=prefix[row, 1:])
+    sums = prefix[:, rows] - prefix[:, start[rows]]
+    slope[rows], intercept[rows] = ols_from_sums(*sums, count[rows], mean_x=mean_x, mean_y=mean_y)
+    return slope, intercept
+
+
+def ols_regression_batch(series_a, series_b):
+    """
+    批量 OLS: 对一组等长窗口分别拟合 seriesA = slope * seriesB + intercept, 使用闭式最小二乘解。
+    Each row of a 2-D input is one window; a 1-D input is a single window. The dtype is validated once
+    per array instead of per element, and the minimum-norm solution is returned for windows whose
+    seriesB is constant, like statsmodels' pinv fit.
+    :param series_a: 因变量, shape (k, n) or (n,)
+    :param series_b: 自变量, 与 series_a 形状相同
+    :return: (slopes, intercepts) numpy arrays of shape (k,), or floats for 1-D input
+    """
+    series_a = np.asarray(series_a)
+    series_b = np.asarray(series_b)
+
+    # Verify that series_a and series_b are not empty
+    if series_a.size == 0 or series_b.size == 0:
+        raise ValueError("seriesA and seriesB must not be empty.")
+
+    # Verify that series_a and series_b have the same length
+    if series_a.shape != series_b.shape or series_a.ndim not in (1, 2):
+        raise ValueError("seriesA and seriesB must have the same length.")
+
+    # Validate that all elements are numeric
+    if not np.issubdtype(series_a.dtype, np.number):
+        raise ValueError("seriesA must contain only numeric values.")
+    if not np.issubdtype(series_b.dtype, np.number):
+        raise ValueError("seriesB must contain only numeric values.")
+
+    # Verify seriesA and seriesB contain at least two data points
+    if series_a.shape[-1] < 2:
+        raise ValueError("seriesA and seriesB must contain at least two data points for OLS regression.")
+
+    y = np.atleast_2d(series_a).astype(np.float64, copy=False)
+    x = np.atleast_2d(series_b).astype(np.float64, copy=False)
+    count = x.shape[1]
+    mean_x = x.mean(axis=1)
+    mean_y = y.mean(axis=1)
+    centered_x = x - mean_x[:, None]
+    centered_y = y - mean_y[:, None]
+    sum_xx = np.einsum('ij,ij->i', centered_x, centered_x)
+    sum_xy = np.einsum('ij,ij->i', centered_x, centered_y)
+
+    slopes, intercepts = ols_from_sums(np.zeros(len(x)), np.zeros(len(x)), sum_xx, sum_xy, count,
+                                       mean_x=mean_x, mean_y=mean_y)
+    if series_a.ndim == 1:
+        return float(slopes[0]), float(intercepts[0])
+    return slopes, intercepts
+
+
+def ols_regression_segments(series_a, series_b, offsets):
+    """
+    不等长窗口的批量 OLS: 第 i 个窗口为 series[offsets[i]:offsets[i + 1]], 所有窗口首尾相接地保存在一个数组中。
+    Sums are accumulated per window with np.bincount around each window's mean, so the result matches
+    ols_regression_batch window by window. Windows with fewer than two points get NaN instead of raising,
+    so one bad request does not fail the whole batch.
+    :param series_a: 因变量, float64 1-D
+    :param series_b: 自变量, 与 series_a 等长
+    :param offsets: 递增的窗口边界, 长度为窗口数 + 1
+    :return: (slopes, intercepts) numpy arrays, 每个窗口一个
+    """
+    series_a = np.asarray(series_a, dtype=np.float64)
+    series_b = np.asarray(series_b, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if series_a.shape != series_b.shape or series_a.ndim != 1:
+        raise ValueError("seriesA and seriesB must have the same length.")
+    if offsets.ndim != 1 or len(offsets) == 0:
+        raise ValueError("offsets must be a 1-D array with one more element than the number of windows.")
+    counts = np.diff(offsets)
+    if offsets[0] < 0 or offsets[-1] > len(series_a) or (counts < 0).any():
+        raise ValueError("offsets must be increasing and within the series.")
+
+    windows = len(counts)
+    ids = np.repeat(np.arange(windows), counts)
+    y = series_a[offsets[0]:offsets[-1]]
+    x = series_b[offsets[0]:offsets[-1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = np.bincount(ids, weights=x, minlength=windows) / counts
+        mean_y = np.bincount(ids, weights=y, minlength=windows) / counts
+    centered_x = x - mean_x[ids]
+    centered_y = y - mean_y[ids]
+    sum_xx = np.bincount(ids, weights=centered_x * centered_x, minlength=windows)
+    sum_xy = np.bincount(ids, weights=centered_x * centered_y, minlength=windows)
+
+    slopes = np.full(windows, np.nan)
+    intercepts = np.full(windows, np.nan)
+    valid = counts >= 2
+    if valid.any():
+        zeros = np.zeros(int(valid.sum()))
+        slopes[valid], intercepts[valid] = ols_from_sums(zeros, zeros, sum_xx[valid], sum_xy[valid], counts[valid],
+                                                         mean_x=mean_x[valid], mean_y=mean_y[valid])
+    return slopes, intercepts
+
+
+class RollingOlsWindow:
+    """
+    固定长度的环形缓冲区, 维护窗口内的运行和 (Σx, Σy, Σx², Σxy), 每次 push 与回归均为 O(1)。
+    Fixed-size ring buffer of (x, y) pairs with running sums. Sums are kept relative to a shift close
+    to the window mean and are recomputed from the buffer once every `window` pushes, so rounding error
+    cannot accumulate while the amortized cost stays O(1) per bar.
+    """
+
+    def __init__(self, window: int):
+        if window < 2:
+            raise ValueError("window must contain at least two data points for OLS regression.")
+        self.window = window
+        self.values_x = np.zeros(window)
+        self.values_y = np.zeros(window)
+        self.position = 0  # 下一个写入位置; 缓冲区满时也是最旧元素的位置
+        self.count = 0
+        self.shift_x = 0.0
+        self.shift_y = 0.0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xx = 0.0
+        self.sum_xy = 0.0
+        self.pushes_since_refresh = 0
+
+    def __len__(self):
+        return self.count
+
+    def is_full(self) -> bool:
+        return self.count == self.window
+
+    def push(self, x: float, y: float):
+        """
+        压入一个新数据点, 缓冲区满时移出最旧的数据点。
+        :param x: 自变量 (symbol2)
+        :param y: 因变量 (symbol1)
+        """
+        if self.count == 0:
+            self.shift_x = x
+            self.shift_y = y
+        position = self.position
+        if self.count == self.window:
+            old_x = self.values_x[position] - self.shift_x
+            old_y = self.values_y[position] - self.shift_y
+            self.sum_x -= old_x
+            self.sum_y -= old_y
+            self.sum_xx -= old_x * old_x
+            self.sum_xy -= old_x * old_y
+        else:
+            self.count += 1
+
+        self.values_x[position] = x
+        self.values_y[position] = y
+        new_x = x - self.shift_x
+        new_y = y - self.shift_y
+        self.sum_x += new_x
+        self.sum_y += new_y
+        self.sum_xx += new_x * new_x
+        self.sum_xy += new_x * new_y
+
+        position += 1
+        self.position = 0 if position == self.window else position
+        self.pushes_since_refresh += 1
+        if self.pushes_since_refresh >= self.window:
+            self.refresh()
+
+    def extend(self, values_x, values_y):
+        """
+        批量压入数据点 (例如用历史数据预热), 只保留最后 window 个。
+        :param values_x: 自变量序列
+        :param values_y: 因变量序列
+        """
+        values_x = np.asarray(values_x, dtype=np.float64)[-self.window:]
+        values_y = np.asarray(values_y, dtype=np.float64)[-self.window:]
+        keep = min(self.count, self.window - len(values_x))
+        old_x, old_y = self.ordered()
+        merged_x = np.concatenate((old_x[len(old_x) - keep:], values_x))
+        merged_y = np.concatenate((old_y[len(old_y) - keep:], values_y))
+
+        self.count = len(merged_x)
+        self.values_x[:self.count] = merged_x
+        self.values_y[:self.count] = merged_y
+        self.position = 0 if self.count == self.window else self.count
+        self.refresh()
+
+    def regress_chunk(self, values_x, values_y):
+        """
+        对一段新数据逐点回归, 然后把它们全部压入缓冲区, 结果与逐点调用 regression() + push() 相同。
+        Point j is regressed over the `window` points that precede it, taken from the buffer and the chunk.
+        Window sums are the running sums plus prefix sums over the chunk minus prefix sums over the points
+        that drop out, so a chunk of m points costs O(m) plus the amortized refresh.
+        :param values_x: 自变量序列 (symbol2)
+        :param values_y: 因变量序列 (symbol1)
+        :return: (slope, intercept) arrays of len(values_x); NaN where fewer than `window` points precede
+        """
+        values_x = np.asarray(values_x, dtype=np.float64)
+        values_y = np.asarray(values_y, dtype=np.float64)
+        m = len(values_x)
+        window, count = self.window, self.count
+        slope = np.full(m, np.nan)
+        intercept = np.full(m, np.nan)
+        if m == 0:
+            return slope, intercept
+        if count == 0:
+            self.shift_x = float(values_x[0])
+            self.shift_y = float(values_y[0])
+
+        # head: 缓冲区(从旧到新)与新数据拼接后的前 m 个点, 即依次移出窗口的数据点
+        start = self.position if count == window else 0
+        taken = min(count, m)
+        head_x = np.concatenate((np.take(self.values_x, np.arange(start, start + taken), mode='wrap'),
+                                 values_x[:m - taken]))
+        head_y = np.concatenate((np.take(self.values_y, np.arange(start, start + taken), mode='wrap'),
+                                 values_y[:m - taken]))
+
+        def prefix_sums(x, y):
+            x = x - self.shift_x
+            y = y - self.shift_y
+            prefix = np.zeros((4, m + 1))
+            for row, values in enumerate((x, y, x * x, x * y)):
+                np.cumsum(values, out=prefix[row, 1:])
+            return prefix
+
+        new = prefix_sums(values_x, values_y)
+        old = prefix_sums(head_x, head_y)
+        sums = np.array([self.sum_x, self.sum_y, self.sum_xx, self.sum_xy])[:, None]
+
+        # 第 j 个点之前有 count + j 个数据点, 窗口为其中最后 window 个
+        first = max(window - count, 0)
+        if first < m:
+            rows = np.arange(first, m)
+            window_sums = sums + new[:, rows] - old[:, rows + count - window]
+            slope[first:], intercept[first:] = ols_from_sums(*window_sums, window, mean_x=self.shift_x,
+                                                             mean_y=self.shift_y)
+
+        dropped = max(count + m - window, 0)
+        self.sum_x, self.sum_y, self.sum_xx, self.sum_xy = (sums[:, 0] + new[:, m] - old[:, dropped]).tolist()
+        if m >= window:
+            self.values_x[:] = values_x[-window:]
+            self.values_y[:] = values_y[-window:]
+            self.position = 0
+        else:
+            positions = np.arange(self.position, self.position + m)
+            np.put(self.values_x, positions, values_x, mode='wrap')
+            np.put(self.values_y, positions, values_y, mode='wrap')
+            self.position = (self.position + m) % window
+        self.count = min(count + m, window)
+        self.pushes_since_refresh += m
+        if self.pushes_since_refresh >= window:
+            self.refresh()
+        return slope, intercept
+
+    def ordered(self):
+        """
+        :return: (values_x, values_y) from oldest to newest
+        """
+        if self.count < self.window:
+            return self.values_x[:self.count].copy(), self.values_y[:self.count].copy()
+        return np.roll(self.values_x, -self.position), np.roll(self.values_y, -self.position)
+
+    def refresh(self):
+        """
+        根据缓冲区重新计算运行和, 并把平移量更新为当前窗口均值。
+        """
+        self.pushes_since_refresh = 0
+        if self.count == 0:
+            return
+        values_x = self.values_x[:self.count]
+        values_y = self.values_y[:self.count]
+        self.shift_x = float(values_x.mean())
+        self.shift_y = float(values_y.mean())
+        centered_x = values_x - self.shift_x
+        centered_y = values_y - self.shift_y
+        self.sum_x = float(centered_x.sum())
+        self.sum_y = float(centered_y.sum())
+        self.sum_xx = float(centered_x @ centered_x)
+        self.sum_xy = float(centered_x @ centered_y)
+
+    def regression(self):
+        """
+        对当前窗口做 OLS: y = slope * x + intercept。
+        :return: (slope, intercept)
+        """
+        return regression_from_sums(self.sum_x, self.sum_y, self.sum_xx, self.sum_xy, self.count,
+                                    self.shift_x, self.shift_y)
+
+
+class TimeWindowOls:
+    """
+    事件时间窗口的双端队列: 新数据点从尾部进入, 早于 t - duration 的数据点从头部移出, 两者均摊 O(1)。
+    Points live in growable arrays together with running prefix sums (Σx, Σy, Σx², Σxy, relative to a shift),
+    so the sums over the live region [head, tail) are two lookups. When the arrays fill up, the live region is
+    moved to the front and its prefix sums are recomputed around the new window mean; the arrays grow so that
+    this happens at most once per live-region length of pushes, which also bounds rounding error.
+    """
+
+    def __init__(self, duration: int, capacity: int = 1024):
+        """
+        :param duration: 窗口长度 (ns)
+        :param capacity: 预分配的数据点数
+        """
+        if duration <= 0:
+            raise ValueError("duration must be positive.")
+        self.duration = int(duration)
+        self.capacity = max(int(capacity), 2)
+        self.date_times = np.empty(self.capacity, dtype=np.int64)
+        self.values_x = np.empty(self.capacity)
+        self.values_y = np.empty(self.capacity)
+        self.prefix = np.zeros((4, self.capacity + 1))
+        self.head = 0
+        self.tail = 0
+        self.shift_x = 0.0
+        self.shift_y = 0.0
+        self.first_date_time = None  # 最早压入的数据点的时间, 判断窗口是否完整
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def _reserve(self, count: int):
+        """
+        保证尾部还能写入 count 个数据点; 需要时把有效区移到开头并重新计算前缀和。
+        """
+        if self.tail + count <= self.capacity:
+            return
+        live = self.tail - self.head
+        capacity = max(self.capacity, 2 * (live + count))
+        date_times = np.empty(capacity, dtype=np.int64)
+        values_x = np.empty(capacity)
+        values_y = np.empty(capacity)
+        date_times[:live] = self.date_times[self.head:self.tail]
+        values_x[:live] = self.values_x[self.head:self.tail]
+        values_y[:live] = self.values_y[self.head:self.tail]
+        self.date_times, self.values_x, self.values_y = date_times, values_x, values_y
+        self.capacity, self.head, self.tail = capacity, 0, live
+        if live:
+            self.shift_x = float(values_x[:live].mean())
+            self.shift_y = float(values_y[:live].mean())
+        self.prefix = np.zeros((4, capacity + 1))
+        self._accumulate(0, live)
+
+    def _accumulate(self, start: int, stop: int):
+        """
+        计算 [start, stop) 的前缀和, 接在 prefix[:, start] 之后。
+        """
+        if stop <= start:
+            return
+        x = self.values_x[start:stop] - self.shift_x
+        y = self.values_y[start:stop] - self.shift_y
+        for row, values in enumerate((x, y, x * x, x * y)):
+            np.cumsum(values, out=self.prefix[row, start + 1:stop + 1])
+            self.prefix[row, start + 1:stop + 1] += self.prefix[row, start]
+
+    def push(self, date_time: int, x: float, y: float):
+        """
+        压入一个数据点 (时间不得早于上一个)。
+        :param x: 自变量 (symbol2)
+        :param y: 因变量 (symbol1)
+        """
+        tail = self.tail
+        if tail == self.head:
+            # 窗口为空: 从数组开头重新累计, 平移量取新数据点
+            self.head = tail = 0
+            self.shift_x, self.shift_y = x, y
+        elif tail == self.capacity:
+            self._reserve(1)
+            tail = self.tail
+        self.date_times[tail] = date_time
+        self.values_x[tail] = x
+        self.values_y[tail] = y
+        dx = x - self.shift_x
+        dy = y - self.shift_y
+        prefix = self.prefix
+        prefix[0, tail + 1] = prefix[0, tail] + dx
+        prefix[1, tail + 1] = prefix[1, tail] + dy
+        prefix[2, tail + 1] = prefix[2, tail] + dx * dx
+        prefix[3, tail + 1] = prefix[3, tail] + dx * dy
+        self.tail = tail + 1
+        if self.first_date_time is None:
+            self.first_date_time = date_time
+
+    def extend(self, date_times, values_x, values_y, first_date_time: Optional[int] = None):
+        """
+        批量压入数据点 (例如用历史数据预热)。
+        :param first_date_time: 可选, 序列最早的时间 (早于 date_times[0] 时表示更早的历史已经移出窗口)
+        """
+        date_times = np.asarray(date_times, dtype=np.int64)
+        count = len(date_times)
+        if count == 0:
+            return
+        empty = self.tail == self.head
+        self._reserve(count)
+        if empty:
+            self.shift_x = float(np.mean(values_x))
+            self.shift_y = float(np.mean(values_y))
+            self.head = self.tail = 0
+        start, stop = self.tail, self.tail + count
+        self.date_times[start:stop] = date_times
+        self.values_x[start:stop] = values_x
+        self.values_y[start:stop] = values_y
+        self._accumulate(start, stop)
+        self.tail = stop
+        if self.first_date_time is None:
+            self.first_date_time = int(date_times[0]) if first_date_time is None else int(first_date_time)
+
+    def evict(self, date_time: int):
+        """
+        移出时间不晚于 date_time - duration 的数据点。
+        """
+        cutoff = date_time - self.duration
+        head = self.head
+        if head < self.tail and self.date_times[head] <= cutoff:
+            self.head = head + int(np.searchsorted(self.date_times[head:self.tail], cutoff, side='right'))
+
+    def ready(self, date_time: int) -> bool:
+        """
+        移出过期数据点后, 判断 date_time 之前的窗口是否完整且至少有两个数据点。
+        """
+        self.evict(date_time)
+        return (self.first_date_time is not None and self.first_date_time <= date_time - self.duration
+                and self.tail - self.head >= 2)
+
+    def regression(self):
+        """
+        对当前窗口 [head, tail) 做 OLS: y = slope * x + intercept。
+        :return: (slope, intercept)
+        """
+        sums = self.prefix[:, self.tail] - self.prefix[:, self.head]
+        return regression_from_sums(sums[0], sums[1], sums[2], sums[3], self.tail - self.head,
+                                    self.shift_x, self.shift_y)
+
+    def regress_chunk(self, date_times, values_x, values_y):
+        """
+        对一段新数据逐点回归, 然后把它们全部压入窗口, 结果与逐点调用 ready() + regression() + push() 相同。
+        :return: (slope, intercept) arrays; NaN where the window is incomplete or holds fewer than two points
+        """
+        date_times = np.asarray(date_times, dtype=np.int64)
+        values_x = np.asarray(values_x, dtype=np.float64)
+        values_y = np.asarray(values_y, dtype=np.float64)
+        m = len(date_times)
+        slope = np.full(m, np.nan)
+        intercept = np.full(m, np.nan)
+        if m == 0:
+            return slope, intercept
+        self.extend(date_times, values_x, values_y)
+        # extend 可能移动了有效区, 新数据点总是最后 m 个
+        positions = np.arange(self.tail - m, self.tail)
+        start = self.head + np.searchsorted(self.date_times[self.head:self.tail], date_times - self.duration,
+                                            side='right')
+        count = positions - start
+        valid = (date_times - self.duration >= self.first_date_time) & (count >= 2)
+        if valid.any():
+            sums = self.prefix[:, positions[valid]] - self.prefix[:, start[valid]]
+            slope[valid], intercept[valid] = ols_from_sums(*sums, count[valid], mean_x=self.shift_x,
+                                                           mean_y=self.shift_y)
+        self.head = int(start[-1])
+        return slope, intercept
+
+    def ordered(self):
+        """
+        :return: (date_times, values_x, values_y) of the live region, oldest first
+        """
+        return (self.date_times[self.head:self.tail].copy(), self.values_x[self.head:self.tail].copy(),
+                self.values_y[self.head:self.tail].copy())
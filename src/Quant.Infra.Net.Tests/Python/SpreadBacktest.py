@@ -0,0 +1,226 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence, Union
+import numpy as np
+from pandas import DataFrame
+from BatchSpreadEngine import SharedPanel, attach_worker_panel, worker_panel_values
+from SpreadCalculator import SpreadCalculator
+from SpreadSignals import rolling_zscore
+
+# 每个参数组合的统计量; sharpe 与 total_pnl 越高越好
+METRICS = ["total_pnl", "sharpe", "max_drawdown", "trades", "exposure", "costs"]
+SELECTION_METRICS = ["total_pnl", "sharpe"]
+
+
+def _hold(enter: np.ndarray, leave: np.ndarray) -> np.ndarray:
+    """
+    沿最后一个轴的持仓状态: 由最近一次 enter 或 leave 决定 (enter 优先), 之前为 0。
+    """
+    enter, leave = np.broadcast_arrays(enter, leave)
+    index = np.arange(enter.shape[-1])
+    last = np.maximum.accumulate(np.where(enter | leave, index, -1), axis=-1)
+    held = np.take_along_axis(enter, np.maximum(last, 0), axis=-1)
+    return (held & (last >= 0)).astype(np.float64)
+
+
+def grid_positions(zscore, entries, exits) -> np.ndarray:
+    """
+    与 band_signal 相同的入场/出场状态机, 对所有 (entry, exit) 组合一次广播计算; zscore 为 NaN 的行保持原持仓。
+    :param zscore: shape (..., T)
+    :param entries: 入场阈值, shape (E,)
+    :param exits: 出场阈值, shape (X,)
+    :return: 持仓 (-1, 0, +1), shape (..., E, X, T)
+    """
+    zscore = np.asarray(zscore, dtype=np.float64)[..., None, None, :]
+    entry = np.asarray(entries, dtype=np.float64)[:, None, None]
+    exit = np.asarray(exits, dtype=np.float64)[None, :, None]
+    is_short = _hold(zscore >= entry, zscore <= exit)
+    is_long = _hold(zscore <= -entry, zscore >= -exit)
+    return is_long - is_short
+
+
+def position_metrics(positions: np.ndarray, prices_a: np.ndarray, prices_b: np.ndarray, slope: np.ndarray,
+                     cost: float = 0.0, periods_per_year: float = 252.0) -> np.ndarray:
+    """
+    按对冲比例加权的持仓回测: 持仓 p 表示 p 单位 A 与 -p * slope 单位 B, slope 固定为开仓 bar 的值。
+    Positions are decided on the close of bar t and earn the price change to bar t + 1. Every change of the
+    holdings costs `cost` times the traded notional; a trade on the last bar earns nothing and is not charged.
+    :param positions: shape (..., T)
+    :param prices_a: symbol1 价格, shape (T,)
+    :param prices_b: symbol2 价格, shape (T,)
+    :param slope: 每个 bar 的对冲比例, shape (T,)
+    :param cost: 交易成本占成交金额的比例, 例如 0.0005 表示 5bp
+    :param periods_per_year: 年化 sharpe 使用的每年 bar 数
+    :return: METRICS 顺序的统计量, shape (len(METRICS), ...)
+    """
+    length = positions.shape[-1]
+    changed = np.diff(positions, axis=-1, prepend=0.0) != 0
+    entry_row = np.maximum.accumulate(np.where(changed, np.arange(length), 0), axis=-1)
+    hedge = np.where(positions != 0, np.nan_to_num(slope)[entry_row], 0.0)
+    units_b = -positions * hedge
+
+    pnl = positions[..., :-1] * np.diff(prices_a) + units_b[..., :-1] * np.diff(prices_b)
+    traded = (np.abs(np.diff(positions, axis=-1, prepend=0.0)) * prices_a
+              + np.abs(np.diff(units_b, axis=-1, prepend=0.0)) * prices_b)
+    charged = cost * traded[..., :-1]
+    returns = pnl - charged
+
+    equity = np.cumsum(returns, axis=-1)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0), axis=-1) - equity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = returns.std(axis=-1, ddof=1)
+        sharpe = np.where(std > 0, returns.mean(axis=-1) / std * np.sqrt(periods_per_year), 0.0)
+    return np.stack([returns.sum(axis=-1), sharpe, drawdown.max(axis=-1, initial=0.0),
+                     (changed & (positions != 0)).sum(axis=-1), (positions != 0).mean(axis=-1),
+                     charged.sum(axis=-1)])
+
+
+def _zscore(spread: np.ndarray, window: int) -> np.ndarray:
+    valid = ~np.isnan(spread)
+    zscore = np.full(len(spread), np.nan)
+    zscore[valid] = rolling_zscore(spread[valid], window)
+    return zscore
+
+
+def _run_fold(backtest, start: int, split: int, stop: int, metric: str, values: Optional[np.ndarray] = None):
+    """
+    在 [start, split) 上评估参数网格, 选出 metric 最好的组合, 再在 [split, stop) 上评估该组合。
+    :return: (start, best (window, entry, exit) indices, train metrics of the best, test metrics)
+    """
+    if values is None:
+        values = worker_panel_values()
+    train = backtest.evaluate(values, start, split)
+    scores = train[METRICS.index(metric)]
+    if np.isnan(scores).all():
+        return start, None, np.full(len(METRICS), np.nan), np.full(len(METRICS), np.nan)
+    best = np.unravel_index(np.nanargmax(scores), scores.shape)
+    window, entry, exit = (backtest.windows[best[0]],), (backtest.entries[best[1]],), (backtest.exits[best[2]],)
+    test = backtest.evaluate(values, split, stop, window, entry, exit)
+    return start, tuple(int(k) for k in best), train[(slice(None),) + best], test[:, 0, 0, 0]
+
+
+class SpreadBacktest:
+    """
+    基于 SpreadCalculator 输出 (symbol1, symbol2, slope, spread 列) 的向量化回测。
+    For every z-score window the positions of all (entry, exit) pairs are computed in one broadcast over the
+    time axis (grid_positions), then PnL, costs and drawdowns per combination (position_metrics); windows are
+    processed in blocks so that no intermediate array exceeds max_cells elements. Combinations with
+    exit >= entry are invalid and get NaN. walk_forward picks the best combination on each training fold and
+    evaluates it on the following test fold, with the folds spread over a process pool that attaches the
+    price panel from shared memory. The spread itself comes from the calculator, so sweeping the regression
+    window means running one calculator per window.
+    """
+
+    def __init__(self, windows: Sequence[int], entries: Sequence[float] = (2.0,), exits: Sequence[float] = (0.5,),
+                 cost: float = 0.0, periods_per_year: float = 252.0, max_workers: Optional[int] = None,
+                 max_cells: int = 1 << 24):
+        """
+        :param windows: z-score 窗口长度 (bar 数)
+        :param entries: 入场阈值 (|z|)
+        :param exits: 出场阈值 (|z|)
+        :param cost: 交易成本占成交金额的比例
+        :param periods_per_year: 年化 sharpe 使用的每年 bar 数, 例如日线 252, 加密货币小时线 24 * 365
+        :param max_workers: walk_forward 的进程数; 0 或 1 表示在当前进程中计算
+        :param max_cells: 每块中间数组的最大元素数
+        """
+        self.windows = [int(window) for window in windows]
+        if not self.windows or min(self.windows) < 2:
+            raise ValueError("windows must contain at least one window of two or more bars.")
+        self.entries = [float(entry) for entry in entries]
+        self.exits = [float(exit) for exit in exits]
+        if not self.entries or not self.exits:
+            raise ValueError("entries and exits must not be empty.")
+        self.cost = cost
+        self.periods_per_year = periods_per_year
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+        self.max_cells = max_cells
+
+    @staticmethod
+    def panel(source: Union[SpreadCalculator, DataFrame], symbol1: Optional[str] = None,
+              symbol2: Optional[str] = None) -> np.ndarray:
+        """
+        :param source: 已执行 upsert_spread_and_equation 的 calculator, 或包含相同列的 DataFrame
+        :return: (T, 4) float64 数组, 列为 symbol1, symbol2, slope, spread
+        """
+        if isinstance(source, SpreadCalculator):
+            symbol1, symbol2, source = source.symbol1, source.symbol2, source.df
+        if 'spread' not in source.columns or 'slope' not in source.columns:
+            raise ValueError("The spread and slope columns are missing; run upsert_spread_and_equation first.")
+        return np.ascontiguousarray(source[[symbol1, symbol2, 'slope', 'spread']].to_numpy(dtype=np.float64))
+
+    def evaluate(self, values: np.ndarray, start: int = 0, stop: Optional[int] = None, windows=None, entries=None,
+                 exits=None) -> np.ndarray:
+        """
+        在 [start, stop) 上评估参数网格, 从 start 开始空仓; z-score 使用 start 之前的数据预热。
+        :param values: panel 返回的 (T, 4) 数组
+        :return: shape (len(METRICS), windows, entries, exits)
+        """
+        windows = self.windows if windows is None else windows
+        entries = np.asarray(self.entries if entries is None else entries, dtype=np.float64)
+        exits = np.asarray(self.exits if exits is None else exits, dtype=np.float64)
+        stop = len(values) if stop is None else stop
+        prices_a, prices_b, slope, spread = values[:stop].T
+        results = np.full((len(METRICS), len(windows), len(entries), len(exits)), np.nan)
+        if stop - start < 2:
+            return results
+
+        zscores = np.stack([_zscore(spread, window)[start:] for window in windows])
+        block = max(1, self.max_cells // (len(entries) * len(exits) * (stop - start)))
+        for first in range(0, len(windows), block):
+            positions = grid_positions(zscores[first:first + block], entries, exits)
+            results[:, first:first + block] = position_metrics(
+                positions, prices_a[start:], prices_b[start:], slope[start:], self.cost, self.periods_per_year)
+        results[:, :, exits[None, :] >= entries[:, None]] = np.nan
+        return results
+
+    def run(self, source: Union[SpreadCalculator, DataFrame], symbol1: Optional[str] = None,
+            symbol2: Optional[str] = None) -> DataFrame:
+        """
+        在整个样本上评估参数网格。
+        :return: 每个组合一行, 列为 window, entry, exit 与 METRICS
+        """
+        results = self.evaluate(self.panel(source, symbol1, symbol2))
+        grid = np.meshgrid(self.windows, self.entries, self.exits, indexing='ij')
+        frame = DataFrame({name: axis.ravel() for name, axis in zip(['window', 'entry', 'exit'], grid)})
+        for name, values in zip(METRICS, results):
+            frame[name] = values.ravel()
+        return frame
+
+    def walk_forward(self, source: Union[SpreadCalculator, DataFrame], train_bars: int, test_bars: int,
+                     metric: str = "sharpe", symbol1: Optional[str] = None, symbol2: Optional[str] = None) -> DataFrame:
+        """
+        滚动样本外检验: 每个 fold 在 train_bars 个 bar 上选参数, 在之后的 test_bars 个 bar 上评估, 每次前移 test_bars。
+        :param metric: 选参数使用的统计量, SELECTION_METRICS 之一
+        :return: 每个 fold 一行: 时间范围, 选出的 window/entry/exit, train_<metric> 与 test_* 统计量
+        """
+        if metric not in SELECTION_METRICS:
+            raise ValueError(f"metric must be one of {SELECTION_METRICS}.")
+        if train_bars < 2 or test_bars < 2:
+            raise ValueError("train_bars and test_bars must be at least 2.")
+        frame = source.df if isinstance(source, SpreadCalculator) else source
+        values = self.panel(source, symbol1, symbol2)
+        folds = [(start, start + train_bars, min(start + train_bars + test_bars, len(values)))
+                 for start in range(0, len(values) - train_bars - 1, test_bars)]
+        if not folds:
+            raise ValueError("The data is shorter than one training and test fold.")
+
+        if self.max_workers is None or self.max_workers <= 1 or len(folds) <= 1:
+            results = [_run_fold(self, start, split, stop, metric, values) for start, split, stop in folds]
+        else:
+            with SharedPanel.create(values) as shared:
+                with ProcessPoolExecutor(max_workers=self.max_workers, initializer=attach_worker_panel,
+                                         initargs=(shared.name, shared.shape)) as executor:
+                    futures = [executor.submit(_run_fold, self, start, split, stop, metric)
+                               for start, split, stop in folds]
+                    results = [future.result() for future in futures]
+
+        rows = []
+        for (start, split, stop), (_, best, train, test) in zip(folds, results):
+            row = {"train_start": frame.index[start], "test_start": frame.index[split],
+                   "test_end": frame.index[stop - 1], "window": np.nan, "entry": np.nan, "exit": np.nan}
+            if best is not None:
+                row.update(window=self.windows[best[0]], entry=self.entries[best[1]], exit=self.exits[best[2]])
+            row[f"train_{metric}"] = train[METRICS.index(metric)]
+            row.update({f"test_{name}": value for name, value in zip(METRICS, test.tolist())})
+            rows.append(row)
+        return DataFrame(rows)
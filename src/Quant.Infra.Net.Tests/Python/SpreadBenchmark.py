@@ -0,0 +1,426 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from SpreadCalculator import ResolutionLevel, RegressionEngine, StorageMode, SpreadCalculator, \
+    SpreadCalculatorSP500, SpreadCalculatorCrypto
+from SyntheticData import generate_cointegrated_pair
+import MySamplePython
+
+BENCHMARK_SCHEMA = 1
+
+# 合成数据的 bar 间隔; 计算只依赖行数, 周线/月线用日线时间戳以免超出 datetime64[ns] 的范围
+RESOLUTION_FREQUENCIES = {
+    ResolutionLevel.Second: "s",
+    ResolutionLevel.Minute: "min",
+    ResolutionLevel.Hourly: "h",
+    ResolutionLevel.Daily: "D",
+    ResolutionLevel.Weekly: "D",
+    ResolutionLevel.Monthly: "D",
+}
+
+# 吞吐量越高越好, 延迟和内存越低越好
+HIGHER_IS_BETTER = {"bars_per_second": True, "p50_us": False, "p99_us": False, "peak_memory_bytes": False}
+
+
+def supported_resolutions(calculator_class) -> Dict[ResolutionLevel, int]:
+    """
+    :return: {ResolutionLevel: 窗口长度}, 只包含 calculator_class 支持的级别
+    """
+    calculator = calculator_class("A", "B", ResolutionLevel.Daily)
+    windows = {}
+    for resolution in ResolutionLevel:
+        try:
+            windows[resolution] = calculator.calculate_window_length(resolution)
+        except (NotImplementedError, ValueError):
+            continue
+    return windows
+
+
+def latency_percentiles(samples_ns: np.ndarray) -> dict:
+    """
+    :param samples_ns: 每次调用的耗时 (纳秒)
+    :return: {"p50_us", "p90_us", "p99_us", "max_us"}
+    """
+    p50, p90, p99 = np.percentile(samples_ns, [50, 90, 99]) / 1000.0
+    return {"p50_us": float(p50), "p90_us": float(p90), "p99_us": float(p99),
+            "max_us": float(samples_ns.max()) / 1000.0}
+
+
+def measure(setup: Callable, operation: Callable, repeat: int = 3, memory: bool = True) -> dict:
+    """
+    运行 setup() 准备状态 (不计时), 再对 operation(state) 计时, 取 repeat 次中最快的一次。
+    Peak memory is measured in a separate run under tracemalloc, so tracing does not distort the timings;
+    it counts only what operation allocates on top of the prepared state.
+    :return: {"seconds", "peak_memory_bytes", "result"}; result is the return value of the fastest run
+    """
+    best, best_result = None, None
+    for _ in range(max(repeat, 1)):
+        state = setup()
+        start = time.perf_counter()
+        result = operation(state)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best, best_result = elapsed, result
+    measured = {"seconds": best, "peak_memory_bytes": None, "result": best_result}
+    if memory:
+        state = setup()
+        tracemalloc.start()
+        try:
+            operation(state)
+            measured["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return measured
+
+
+class SpreadBenchmark:
+    """
+    SpreadCalculator 的基准测试: 对每个子类支持的每个 ResolutionLevel, 在合成的协整数据上测量
+    update_time_series, upsert_spread_and_equation (两种回归引擎), update_time_series_element
+    (流式与 DataFrame 实现) 以及单窗口 ols_regression 的吞吐量、单 bar 延迟分位数和峰值内存。
+    Every case uses window + bars rows, so the last `bars` rows are the ones whose spread is computed.
+    Paths whose cost grows with the window per bar (per-window regression, DataFrame updates, element lists)
+    only run when the window is at most slow_path_limit; skipped operations are recorded with a reason.
+    With bridge_requests > 0 the .NET bridge entry points of MySamplePython are also compared: one
+    ols_regression call per request against a single ols_regression_buffers call for all of them.
+    """
+
+    def __init__(self, calculator_classes=(SpreadCalculatorSP500, SpreadCalculatorCrypto), bars: int = 2000,
+                 repeat: int = 3, max_window: Optional[int] = None, slow_path_limit: int = 50_000,
+                 dataframe_element_bars: int = 200, memory: bool = True, seed: int = 7,
+                 storage_mode: StorageMode = StorageMode.Full, resolutions=None, bridge_requests: int = 0,
+                 bridge_window: int = 250):
+        """
+        :param calculator_classes: 参与测试的 SpreadCalculator 子类
+        :param bars: 每个用例在窗口之后计算 spread 的 bar 数
+        :param repeat: 批量操作的重复次数, 取最快的一次
+        :param max_window: 窗口超过该值的用例整体跳过, None 表示不限制
+        :param slow_path_limit: 慢路径只在窗口不超过该值时运行
+        :param dataframe_element_bars: DataFrame 实现逐 bar 更新的 bar 数
+        :param memory: 是否用 tracemalloc 测量峰值内存
+        :param seed: 合成数据的随机种子
+        :param storage_mode: 传给计算器的存储模式
+        :param resolutions: 可选, 只测试这些 ResolutionLevel
+        :param bridge_requests: 桥接入口测试的回归请求数, 0 表示不测试
+        :param bridge_window: 桥接入口测试中每个回归的数据点数
+        """
+        self.calculator_classes = list(calculator_classes)
+        self.bars = bars
+        self.repeat = repeat
+        self.max_window = max_window
+        self.slow_path_limit = slow_path_limit
+        self.dataframe_element_bars = dataframe_element_bars
+        self.memory = memory
+        self.seed = seed
+        self.storage_mode = storage_mode
+        self.resolutions = set(resolutions) if resolutions is not None else None
+        self.bridge_requests = bridge_requests
+        self.bridge_window = bridge_window
+
+    def settings(self) -> dict:
+        return {"calculators": [cls.__name__ for cls in self.calculator_classes], "bars": self.bars,
+                "repeat": self.repeat, "max_window": self.max_window, "slow_path_limit": self.slow_path_limit,
+                "dataframe_element_bars": self.dataframe_element_bars, "memory": self.memory, "seed": self.seed,
+                "storage_mode": self.storage_mode.value, "bridge_requests": self.bridge_requests,
+                "bridge_window": self.bridge_window}
+
+    def run(self, log: Callable[[str], None] = None) -> dict:
+        """
+        运行全部用例。
+        :param log: 可选, 每个操作完成后调用, 参数为一行摘要
+        :return: 可以直接保存为 JSON 的结果 {"schema", "created", "environment", "settings", "results"}
+        """
+        results = []
+        for calculator_class in self.calculator_classes:
+            for resolution, window in supported_resolutions(calculator_class).items():
+                if self.resolutions is not None and resolution not in self.resolutions:
+                    continue
+                for record in self.run_case(calculator_class, resolution, window):
+                    results.append(record)
+                    if log is not None:
+                        log(format_record(record))
+        if self.bridge_requests > 0:
+            for record in self.run_bridge():
+                results.append(record)
+                if log is not None:
+                    log(format_record(record))
+        return {"schema": BENCHMARK_SCHEMA, "created": datetime.now().isoformat(timespec="seconds"),
+                "environment": environment(), "settings": self.settings(), "results": results}
+
+    def run_case(self, calculator_class, resolution: ResolutionLevel, window: int) -> List[dict]:
+        """
+        一个 (子类, ResolutionLevel) 用例的全部操作。
+        """
+        base = {"calculator": calculator_class.__name__, "resolution": resolution.name, "window": window}
+        operations = ["update_time_series", "update_time_series_list", "upsert_vectorized", "upsert_per_window",
+                      "element_streaming", "element_dataframe", "ols_regression"]
+        if self.max_window is not None and window > self.max_window:
+            return [dict(base, operation=name, skipped=f"window > max_window ({self.max_window})")
+                    for name in operations]
+
+        length = window + self.bars
+        time_series_a, time_series_b = generate_cointegrated_pair(
+            length, seed=self.seed, freq=RESOLUTION_FREQUENCIES.get(resolution, "D"))
+        slow = window <= self.slow_path_limit
+        slow_skipped = f"window > slow_path_limit ({self.slow_path_limit})"
+
+        def create(**kwargs) -> SpreadCalculator:
+            return calculator_class("A", "B", resolution, storage_mode=self.storage_mode, **kwargs)
+
+        records = [dict(base, operation="update_time_series",
+                        **self._bulk(length, create, lambda c: c.update_time_series(time_series_a, time_series_b)))]
+        if slow:
+            elements_a, elements_b = list(time_series_a), list(time_series_b)
+            records.append(dict(base, operation="update_time_series_list",
+                                **self._bulk(length, create, lambda c: c.update_time_series(elements_a, elements_b))))
+            del elements_a, elements_b
+        else:
+            records.append(dict(base, operation="update_time_series_list", skipped=slow_skipped))
+
+        for engine, name, enabled in [(RegressionEngine.Vectorized, "upsert_vectorized", True),
+                                      (RegressionEngine.PerWindow, "upsert_per_window", slow)]:
+            if not enabled:
+                records.append(dict(base, operation=name, skipped=slow_skipped))
+                continue
+
+            def loaded(engine=engine):
+                calculator = create(regression_engine=engine)
+                calculator.update_time_series(time_series_a, time_series_b)
+                return calculator
+
+            records.append(dict(base, operation=name,
+                                **self._bulk(self.bars, loaded, lambda c: c.upsert_spread_and_equation())))
+
+        records.append(dict(base, operation="element_streaming",
+                            **self._per_bar(lambda: create(streaming=True, capacity=length), time_series_a,
+                                            time_series_b, window, self.bars)))
+        if slow:
+            records.append(dict(base, operation="element_dataframe",
+                                **self._per_bar(create, time_series_a, time_series_b, window,
+                                                min(self.dataframe_element_bars, self.bars))))
+        else:
+            records.append(dict(base, operation="element_dataframe", skipped=slow_skipped))
+
+        records.append(dict(base, operation="ols_regression", **self._ols(create(), time_series_a, time_series_b,
+                                                                          window)))
+        return records
+
+    def _bulk(self, bars: int, setup: Callable, operation: Callable) -> dict:
+        measured = measure(setup, operation, self.repeat, self.memory)
+        return {"bars": bars, "seconds": measured["seconds"], "bars_per_second": bars / measured["seconds"],
+                "peak_memory_bytes": measured["peak_memory_bytes"]}
+
+    def _per_bar(self, create: Callable, time_series_a, time_series_b, window: int, bars: int) -> dict:
+        """
+        用前 window 个 bar 初始化, 再逐个调用 update_time_series_element, 记录每次调用的耗时。
+        The first call pays the one-off cost of building the streaming state from the history; it is reported
+        as first_call_us and excluded from the throughput and the percentiles.
+        """
+        history_a, history_b = time_series_a[:window], time_series_b[:window]
+        elements_a = list(time_series_a[window:window + bars])
+        elements_b = list(time_series_b[window:window + bars])
+
+        def setup():
+            calculator = create()
+            calculator.update_time_series(history_a, history_b)
+            return calculator
+
+        def operation(calculator):
+            samples = np.empty(bars, dtype=np.int64)
+            for i in range(bars):
+                start = time.perf_counter_ns()
+                calculator.update_time_series_element(elements_a[i], elements_b[i])
+                samples[i] = time.perf_counter_ns() - start
+            return samples
+
+        measured = measure(setup, operation, 1, self.memory)
+        samples = measured["result"][1:] if bars > 1 else measured["result"]
+        seconds = samples.sum() / 1e9
+        return dict({"bars": len(samples), "seconds": seconds, "bars_per_second": len(samples) / seconds,
+                     "first_call_us": measured["result"][0] / 1000.0,
+                     "peak_memory_bytes": measured["peak_memory_bytes"]}, **latency_percentiles(samples))
+
+    def _ols(self, calculator: SpreadCalculator, time_series_a, time_series_b, window: int) -> dict:
+        """
+        单窗口 ols_regression 的延迟; 大窗口时减少调用次数, 使总计算量大致相同。
+        """
+        calls = int(min(200, max(3, 20_000_000 // max(window, 1))))
+        series_a, series_b = time_series_a.values[:window], time_series_b.values[:window]
+
+        def operation(_):
+            samples = np.empty(calls, dtype=np.int64)
+            for i in range(calls):
+                start = time.perf_counter_ns()
+                calculator.ols_regression(series_a, series_b)
+                samples[i] = time.perf_counter_ns() - start
+            return samples
+
+        measured = measure(lambda: None, operation, 1, self.memory)
+        seconds = measured["result"].sum() / 1e9
+        return dict({"bars": window * calls, "calls": calls, "seconds": seconds,
+                     "bars_per_second": window * calls / seconds, "peak_memory_bytes": measured["peak_memory_bytes"]},
+                    **latency_percentiles(measured["result"]))
+
+    def run_bridge(self) -> List[dict]:
+        """
+        .NET 桥接入口: 逐个调用 ols_regression (每次把 SeriesA/SeriesB 列表逐元素转换成数组并返回 dict),
+        与一次调用 ols_regression_buffers (连续 float64 buffer + offsets, 结果写入输出 buffer) 对比。
+        The per-call data objects hold Python lists, as pythonnet presents a List<double>; building them is not
+        timed, converting them is.
+        """
+        requests, window = self.bridge_requests, self.bridge_window
+        time_series_a, time_series_b = generate_cointegrated_pair(window + requests, seed=self.seed)
+        series_a, series_b = time_series_a.values, time_series_b.values
+        base = {"calculator": "MySamplePython", "resolution": f"window_{window}", "window": window}
+
+        def per_call_setup():
+            return [SimpleNamespace(SeriesA=series_a[i:i + window].tolist(), SeriesB=series_b[i:i + window].tolist())
+                    for i in range(requests)]
+
+        def per_call(data):
+            results = np.empty((requests, 2))
+            for i, item in enumerate(data):
+                response = MySamplePython.ols_regression(item)
+                results[i] = response["a"], response["constant"]
+            return results
+
+        def batched_setup():
+            rows = np.arange(requests)[:, None] + np.arange(window)
+            return (series_a[rows].ravel(), series_b[rows].ravel(), np.arange(requests + 1, dtype=np.int64) * window,
+                    np.empty(2 * requests))
+
+        def batched(buffers):
+            MySamplePython.ols_regression_buffers(*buffers)
+            return buffers[3].reshape(requests, 2)
+
+        records = []
+        for name, setup, operation in [("bridge_per_call", per_call_setup, per_call),
+                                       ("bridge_batched", batched_setup, batched)]:
+            measured = measure(setup, operation, self.repeat, self.memory)
+            records.append(dict(base, operation=name, calls=requests if name == "bridge_per_call" else 1,
+                                regressions=requests, regressions_per_second=requests / measured["seconds"],
+                                bars=requests * window, seconds=measured["seconds"],
+                                bars_per_second=requests * window / measured["seconds"],
+                                peak_memory_bytes=measured["peak_memory_bytes"]))
+        return records
+
+
+def environment() -> dict:
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "processor": platform.processor(), "cpu_count": os.cpu_count()}
+
+
+def record_key(record: dict) -> tuple:
+    return record["calculator"], record["resolution"], record["operation"]
+
+
+def format_record(record: dict) -> str:
+    name = f"{record['calculator']:<22} {record['resolution']:<8} {record['operation']:<24}"
+    if "skipped" in record:
+        return f"{name} skipped: {record['skipped']}"
+    text = f"{name} {record['bars_per_second']:>14,.0f} bars/s"
+    if "p50_us" in record:
+        text += f"  p50 {record['p50_us']:.1f}us  p99 {record['p99_us']:.1f}us"
+    if record.get("peak_memory_bytes") is not None:
+        text += f"  peak {record['peak_memory_bytes'] / 2 ** 20:.1f} MiB"
+    return text
+
+
+def save_results(document: dict, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(document, file, indent=1)
+
+
+def load_results(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as file:
+        document = json.load(file)
+    if document.get("schema") != BENCHMARK_SCHEMA:
+        raise ValueError(f"Unsupported benchmark schema {document.get('schema')} in {path}.")
+    return document
+
+
+def compare_results(current: dict, baseline: dict, threshold: float = 0.1) -> List[dict]:
+    """
+    按 (calculator, resolution, operation) 对比两次结果。
+    :param threshold: 相对变差超过该比例时记为回归, 例如 0.1 表示吞吐量下降或延迟/内存增加超过 10%
+    :return: [{"calculator", "resolution", "operation", "metric", "baseline", "current", "change", "regression"}],
+             change 为 current / baseline - 1
+    """
+    baseline_records = {record_key(record): record for record in baseline["results"] if "skipped" not in record}
+    rows = []
+    for record in current["results"]:
+        previous = baseline_records.get(record_key(record))
+        if previous is None or "skipped" in record:
+            continue
+        for metric, higher_is_better in HIGHER_IS_BETTER.items():
+            old, new = previous.get(metric), record.get(metric)
+            if not old or new is None:
+                continue
+            change = new / old - 1.0
+            regression = change < -threshold if higher_is_better else change > threshold
+            rows.append({"calculator": record["calculator"], "resolution": record["resolution"],
+                         "operation": record["operation"], "metric": metric, "baseline": old, "current": new,
+                         "change": change, "regression": regression})
+    return rows
+
+
+def format_comparison(rows: List[dict]) -> str:
+    lines = []
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        lines.append(f"{row['calculator']:<22} {row['resolution']:<8} {row['operation']:<24} {row['metric']:<18}"
+                     f" {row['baseline']:>14.6g} -> {row['current']:>14.6g} ({row['change']:+.1%}) {flag}".rstrip())
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark SpreadCalculator across resolutions and window sizes.")
+    parser.add_argument("--output", help="保存结果的 JSON 文件, 默认 benchmarks/spread_benchmark_<时间>.json")
+    parser.add_argument("--baseline", help="与该 JSON 基线对比, 出现回归时返回 1")
+    parser.add_argument("--threshold", type=float, default=0.1, help="回归阈值 (相对变化)")
+    parser.add_argument("--bars", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-window", type=int, default=None)
+    parser.add_argument("--slow-path-limit", type=int, default=50_000)
+    parser.add_argument("--resolution", action="append", choices=[level.name for level in ResolutionLevel])
+    parser.add_argument("--storage-mode", choices=[mode.value for mode in StorageMode], default="full")
+    parser.add_argument("--no-memory", action="store_true", help="不测量峰值内存")
+    parser.add_argument("--bridge-requests", type=int, default=0,
+                        help="对比 .NET 桥接入口逐个调用与批量调用的回归请求数, 0 表示不测试")
+    parser.add_argument("--bridge-window", type=int, default=250)
+    args = parser.parse_args(argv)
+
+    benchmark = SpreadBenchmark(bars=args.bars, repeat=args.repeat, max_window=args.max_window,
+                                slow_path_limit=args.slow_path_limit, memory=not args.no_memory,
+                                storage_mode=StorageMode(args.storage_mode),
+                                resolutions=[ResolutionLevel[name] for name in args.resolution]
+                                if args.resolution else None, bridge_requests=args.bridge_requests,
+                                bridge_window=args.bridge_window)
+    document = benchmark.run(log=print)
+    output = args.output or os.path.join(
+        "benchmarks", f"spread_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    save_results(document, output)
+    print(f"Results saved to {output}")
+
+    if args.baseline:
+        rows = compare_results(document, load_results(args.baseline), args.threshold)
+        print(format_comparison(rows))
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,16 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
 from enum import Enum
-from typing import List
+from typing import Callable, List, Optional, Union
 import pandas as pd
-import statsmodels.api as sm
 import numpy as np
 from pandas import DataFrame
+from RollingOls import (rolling_ols, rolling_ols_time, time_window_starts, ols_regression_batch, RollingOlsWindow,
+                        TimeWindowOls)
+from ColumnarStore import ColumnarStore
+from Alignment import AlignmentPolicy, AlignmentReport, align_arrays
+from SpreadSignals import SignalEvent, SignalSettings, SpreadSignalState, compute_signals, signal_events
+from PipelineStats import NULL_STAGE, PipelineStats
 
 
 class ResolutionLevel(Enum):
@@ -18,7 +23,23 @@ class ResolutionLevel(Enum):
     Monthly = "mo"
     Other = "other"
 
+class RegressionEngine(Enum):
+    PerWindow = "per_window"  # 逐行切片, 每个窗口单独调用 ols_regression
+    Vectorized = "vectorized"  # 前缀和一次遍历计算全部窗口
+    StatsModels = "per_window"  # PerWindow 的旧名称, 保留以兼容已有代码
+
+    @classmethod
+    def _missing_(cls, value):
+        # 旧名称对应的值
+        return cls.PerWindow if value == "statsmodels" else None
+
+class StorageMode(Enum):
+    Full = "full"  # 每行保存 equation 字符串
+    Compact = "compact"  # 只保存 slope/intercept 数组, equation 按需生成
+
 class TimeSeriesElement:
+    __slots__ = ("date_time", "value")
+
     def __init__(self, date_time: datetime, value: float):
         self.date_time = date_time
         self.value = value
@@ -35,94 +56,259 @@ class TimeSeriesElement:
         return hash((self.date_time, self.value))
 
 class TimeSeries:
-    def __init__(self):
-        self.series = []
+    """
+    列式时间序列: 时间和数值分别保存在连续的 datetime64[ns] 与 float64 数组中, 不再为每个 bar 保存一个对象。
+    Elements are created on demand as TimeSeriesElement views, so code written against the list-based
+    series keeps working, while update_time_series reads the arrays directly.
+    """
+
+    def __init__(self, date_times=None, values=None, tz=None):
+        """
+        :param date_times: 可选, 时间数组 (任何可转换为 datetime64[ns] 的序列)
+        :param values: 可选, 与 date_times 等长的数值数组
+        :param tz: 可选, naive 的 date_times 为 UTC 时间时所属的时区; 带时区的 date_times 使用自身的时区
+        """
+        self.tz = tz
+        if date_times is None and values is None:
+            self._date_times = np.empty(0, dtype='datetime64[ns]')
+            self._values = np.empty(0, dtype=np.float64)
+        else:
+            date_index = pd.DatetimeIndex(date_times)
+            if date_index.tz is not None:
+                self.tz = date_index.tz
+            # 带时区的时间以 UTC 保存在数组中
+            self._date_times = date_index.as_unit('ns').values
+            self._values = np.ascontiguousarray(values, dtype=np.float64)
+            if len(self._date_times) != len(self._values):
+                raise ValueError("date_times and values must have the same length.")
+        self._length = len(self._values)
+
+    @classmethod
+    def from_elements(cls, elements):
+        """
+        由 TimeSeriesElement 列表构建。
+        :param elements: Iterable of TimeSeriesElement
+        :return: TimeSeries
+        """
+        elements = list(elements)
+        return cls([element.date_time for element in elements], [element.value for element in elements])
+
+    @property
+    def date_times(self) -> np.ndarray:
+        """
+        :return: datetime64[ns] array view (no copy); UTC times when tz is set
+        """
+        return self._date_times[:self._length]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        """
+        :return: date_times 的 DatetimeIndex, 设置了 tz 时转换回该时区
+        """
+        index = pd.DatetimeIndex(self.date_times, copy=False)
+        return index.tz_localize('UTC').tz_convert(self.tz) if self.tz is not None else index
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        :return: float64 array view (no copy)
+        """
+        return self._values[:self._length]
+
+    @property
+    def series(self) -> List[TimeSeriesElement]:
+        """
+        兼容旧接口: 生成 TimeSeriesElement 列表 (会创建对象, 大数据量时请直接使用 date_times / values)。
+        """
+        return list(self)
 
     def __str__(self):
-        return f"TimeSeries with {len(self.series)} elements: [{', '.join(str(elm) for elm in self.series)}]"
+        return f"TimeSeries with {len(self)} elements: [{', '.join(str(elm) for elm in self)}]"
 
     def __eq__(self, other):
         if not isinstance(other, TimeSeries):
             return False
-        return self.series == other.series
+        return (str(self.tz) == str(other.tz) and np.array_equal(self.date_times, other.date_times)
+                and np.array_equal(self.values, other.values))
 
     def __hash__(self):
-        return hash(tuple(self.series))
+        return hash((self.date_times.tobytes(), self.values.tobytes()))
 
     def add_element(self, element):
         """
         Add a TimeSeriesElement to the series.
         :param element: TimeSeriesElement object
         """
-        self.series.append(element)
+        if self._length == len(self._values):
+            capacity = max(16, 2 * self._length)
+            date_times = np.empty(capacity, dtype='datetime64[ns]')
+            values = np.empty(capacity, dtype=np.float64)
+            date_times[:self._length] = self.date_times
+            values[:self._length] = self.values
+            self._date_times, self._values = date_times, values
+        date_time = pd.Timestamp(element.date_time)
+        if date_time.tzinfo is not None:
+            if self._length == 0:
+                self.tz = date_time.tz
+            date_time = date_time.tz_convert('UTC').tz_localize(None)
+        self._date_times[self._length] = date_time.as_unit('ns').to_datetime64()
+        self._values[self._length] = element.value
+        self._length += 1
 
     def __len__(self):
         """
         Return the number of elements in the TimeSeries.
         :return: int
         """
-        return len(self.series)
+        return self._length
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield self[i]
 
     def __getitem__(self, index):
         """
-        Get a TimeSeriesElement by index.
-        :param index: int
-        :return: TimeSeriesElement
+        Get a TimeSeriesElement by index, or a TimeSeries view for a slice.
+        :param index: int or slice
+        :return: TimeSeriesElement or TimeSeries
         """
-        return self.series[index]
+        if isinstance(index, slice):
+            view = TimeSeries(tz=self.tz)
+            view._date_times = self.date_times[index]
+            view._values = self.values[index]
+            view._length = len(view._values)
+            return view
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("TimeSeries index out of range")
+        date_time = pd.Timestamp(self._date_times[index])
+        if self.tz is not None:
+            date_time = date_time.tz_localize('UTC').tz_convert(self.tz)
+        return TimeSeriesElement(date_time, float(self._values[index]))
 
 class SpreadCalculator(ABC):
-    def __init__(self, symbol1: str, symbol2: str, resolution: ResolutionLevel = ResolutionLevel.Daily):
+    def __init__(self, symbol1: str, symbol2: str, resolution: ResolutionLevel = ResolutionLevel.Daily,
+                 regression_engine: RegressionEngine = RegressionEngine.PerWindow,
+                 streaming: bool = False, capacity: int = 0, storage_mode: StorageMode = StorageMode.Full,
+                 price_dtype=np.float64, signal_settings: Optional[SignalSettings] = None,
+                 on_signal_event: Optional[Callable[[SignalEvent], None]] = None, window_duration=None,
+                 stats: Optional[PipelineStats] = None):
+        """
+        :param regression_engine: upsert_spread_and_equation 使用的回归实现
+        :param streaming: True 时 update_time_series_element 使用环形缓冲区 + 运行和, 每个 bar O(1)
+        :param capacity: 流式模式下列式存储预分配的行数
+        :param storage_mode: Compact 时不保存每行的 equation 字符串, 通过 print_equation 按需生成
+        :param price_dtype: 价格列和 spread 列的存储类型, 例如 np.float32; slope/intercept 始终为 float64
+        :param signal_settings: 设置后在 spread 之外维护 zscore, half_life 和 signal 列
+        :param on_signal_event: 可选, 每个入场/出场事件 (SignalEvent) 调用一次
+        :param window_duration: 可选, 事件时间窗口 (例如 '6h'); 设置后回归使用之前 window_duration 内的全部数据点,
+                                而不是 FixedWindowLength 个 bar。Tick 级别默认使用 calculate_window_duration
+        :param stats: 可选, PipelineStats; 设置后记录各阶段耗时、处理行数、回归次数和 DataFrame 重新分配次数
+        """
         self.symbol1 = symbol1
         self.symbol2 = symbol2
         self.resolution = resolution
+        self.regression_engine = regression_engine
+        self.streaming = streaming
+        self.capacity = capacity
+        self.storage_mode = storage_mode
+        self.price_dtype = np.dtype(price_dtype)
+        self.signal_settings = signal_settings
+        self.on_signal_event = on_signal_event
+        self.signal_events: List[SignalEvent] = []
+        self.stats = stats
         self.FixedWindowLength = 0
+        self.FixedWindowDuration = pd.Timedelta(window_duration) if window_duration is not None else None
+        self._store = None
+        self._window = None
+        self._signal_state = None
+        self._store_dirty = False
         self.df = DataFrame()
 
-    def update_time_series(self, time_series1: List[TimeSeriesElement], time_series2: List[TimeSeriesElement]):
-        if len(time_series1) != len(time_series2):
-            raise ValueError("time_series1 and time_series2 must have the same number of elements.")
-
-        for i in range(len(time_series1)):
-            if time_series1[i].date_time != time_series2[i].date_time:
-                raise ValueError(f"Element {i} of time_series1 and time_series2 have different DateTime values.")
-
-        # update self.df using self.symbol1 , self.symbol2, and the given parameters
-        df1 = pd.DataFrame({
-            "date_time": [element.date_time for element in time_series1],
-            self.symbol1: [element.value for element in time_series1]
-        })
-
-        # Convert time_series2 to DataFrame
-        df2 = pd.DataFrame({
-            "date_time": [element.date_time for element in time_series2],
-            self.symbol2: [element.value for element in time_series2]
-        })
-
-        # Merge the DataFrames on date_time
-        self.df = pd.merge(df1, df2, on="date_time")
-
-        # Convert the date_time column to datetime from Timestamp
-        self.df["date_time"] = pd.to_datetime(self.df["date_time"], errors='coerce')
-
-        # Drop rows with NaN values in any of the columns
-        self.df = self.df.dropna()
-
-        # Convert the relevant columns to numeric values and find non-numeric rows
-        for symbol in [self.symbol1, self.symbol2]:
-            self.df[symbol] = pd.to_numeric(self.df[symbol], errors='coerce')
-
-        # Find and print rows with NaN values in self.symbol1 or self.symbol2
-        non_numeric_rows = self.df[self.df[[self.symbol1, self.symbol2]].isna().any(axis=1)]
-        if not non_numeric_rows.empty:
-            print("Rows with non-numeric values:")
-            print(non_numeric_rows)
+    @property
+    def df(self) -> DataFrame:
+        """
+        流式模式下数据保存在列式存储中, 访问 df 时才(按需)复制成 DataFrame。
+        In streaming mode the columnar store is authoritative; assign df to reload it.
+        """
+        if self._store is not None and self._store_dirty:
+            with self._stage('store.materialize', self._store.length):
+                self._df = self._store.to_dataframe()
+            self._count('frame_reallocations')
+            self._store_dirty = False
+        return self._df
+
+    @df.setter
+    def df(self, value: DataFrame):
+        self._df = value
+        self._reset_stream()
+
+    def _reset_stream(self):
+        self._store = None
+        self._window = None
+        self._signal_state = None
+        self._store_dirty = False
+
+    def _stage(self, name: str, rows: int = 0):
+        """
+        :return: 计时 context manager; 未设置 stats 时为共享的空 context manager
+        """
+        return NULL_STAGE if self.stats is None else self.stats.stage(name, rows)
 
-        # Drop rows where self.symbol1 or self.symbol2 contains NaN values
-        self.df = self.df.dropna(subset=[self.symbol1, self.symbol2])
+    def _count(self, name: str, value: int = 1):
+        if self.stats is not None:
+            self.stats.count(name, value)
 
-        # Set the 'date_time' column as the index
-        self.df.set_index('date_time', inplace=True)
+    def update_time_series(self, time_series1: Union[TimeSeries, List[TimeSeriesElement]],
+                           time_series2: Union[TimeSeries, List[TimeSeriesElement]],
+                           alignment: AlignmentPolicy = AlignmentPolicy.Strict, tolerance=None) -> AlignmentReport:
+        """
+        用两条时间序列重建 self.df。对齐直接在时间数组上完成 (align_arrays), 不逐元素比较, 也不合并 DataFrame;
+        两者都是 TimeSeries 且无需调整时, 价格列与 TimeSeries 共享内存 (zero-copy)。
+        Rows with NaN or non-numeric prices, or unparsable date_time values, are dropped and counted in the
+        returned report instead of being printed.
+        :param time_series1: symbol1 的时间序列
+        :param time_series2: symbol2 的时间序列
+        :param alignment: 对齐方式, 默认 Strict (两条序列的时间必须逐个相同)
+        :param tolerance: AsOf/OuterForwardFill 时允许使用的最旧数据, 例如 pd.Timedelta('5min')
+        :return: AlignmentReport
+        """
+        with self._stage('update_time_series.convert', len(time_series1) + len(time_series2)):
+            date_index1, values1 = self._series_arrays(time_series1)
+            date_index2, values2 = self._series_arrays(time_series2)
+        if (date_index1.tz is None) != (date_index2.tz is None):
+            raise ValueError("time_series1 and time_series2 must both be timezone-aware or both be naive.")
+
+        with self._stage('update_time_series.align', len(values1) + len(values2)):
+            date_times, values1, values2, report = align_arrays(
+                date_index1.asi8, values1, date_index2.asi8, values2, alignment, tolerance)
+        with self._stage('update_time_series.frame', len(date_times)):
+            index = pd.DatetimeIndex(date_times.view('datetime64[ns]'), name='date_time', copy=False)
+            if date_index1.tz is not None:
+                index = index.tz_localize('UTC').tz_convert(date_index1.tz)
+            self.df = DataFrame({self.symbol1: values1, self.symbol2: values2}, index=index, copy=False)
+            self._apply_price_dtype()
+        self._count('rows_processed', len(date_times))
+        return report
+
+    @staticmethod
+    def _series_arrays(time_series: Union[TimeSeries, List[TimeSeriesElement]]):
+        """
+        :return: (DatetimeIndex in ns, 带时区的序列保留时区, float64 values); TimeSeries 的数组不复制
+        """
+        if isinstance(time_series, TimeSeries):
+            return time_series.index, time_series.values
+        date_index = pd.DatetimeIndex(pd.to_datetime([element.date_time for element in time_series],
+                                                     errors='coerce')).as_unit('ns')
+        values = pd.to_numeric(pd.Series([element.value for element in time_series], dtype=object),
+                               errors='coerce').to_numpy(dtype=np.float64)
+        return date_index, values
+
+    def _apply_price_dtype(self):
+        if self.price_dtype != np.float64:
+            self._df = self._df.astype({self.symbol1: self.price_dtype, self.symbol2: self.price_dtype})
+            self._count('frame_reallocations')
 
     def update_time_series_element(self, time_series_elm1: TimeSeriesElement, time_series_elm2: TimeSeriesElement):
         """
@@ -136,60 +322,100 @@ class SpreadCalculator(ABC):
         if time_series_elm1.date_time != time_series_elm2.date_time:
             raise ValueError(f"DateTime mismatch: {time_series_elm1.date_time} vs {time_series_elm2.date_time}")
 
-        # 根据输入值插入或者更新self.df
-        # Create a DataFrame for the new element
-        new_row = pd.DataFrame({
-            "date_time": [time_series_elm1.date_time],
-            self.symbol1: [time_series_elm1.value],
-            self.symbol2: [time_series_elm2.value]
-        })
-
-        #  date_time is index,  If date_time already exists in self.df, update the existing row
-        # Set 'date_time' as the index for the new row
-        new_row.set_index('date_time', inplace=True)
-
-        # Check if the date_time already exists in self.df
-        if time_series_elm1.date_time in self.df.index:
-            # Update the existing row
-            self.df.loc[time_series_elm1.date_time, [self.symbol1, self.symbol2]] = new_row.loc[
-                time_series_elm1.date_time, [self.symbol1, self.symbol2]]
-        else:
-            # Append the new row to the DataFrame
-            self.df = pd.concat([self.df, new_row])
-
-        # Drop rows with NaN values if any
-        self.df = self.df.dropna()
+        self._count('rows_processed')
+        if self.streaming:
+            with self._stage('element.streaming', 1):
+                handled = self._update_time_series_element_streaming(time_series_elm1, time_series_elm2)
+            if handled:
+                return
+
+        with self._stage('element.frame_update', 1):
+            # 根据输入值插入或者更新self.df
+            # Create a DataFrame for the new element
+            new_row = pd.DataFrame({
+                "date_time": [time_series_elm1.date_time],
+                self.symbol1: [time_series_elm1.value],
+                self.symbol2: [time_series_elm2.value]
+            })
+
+            #  date_time is index,  If date_time already exists in self.df, update the existing row
+            # Set 'date_time' as the index for the new row
+            new_row.set_index('date_time', inplace=True)
+
+            # Check if the date_time already exists in self.df
+            if time_series_elm1.date_time in self.df.index:
+                # Update the existing row
+                self.df.loc[time_series_elm1.date_time, [self.symbol1, self.symbol2]] = new_row.loc[
+                    time_series_elm1.date_time, [self.symbol1, self.symbol2]]
+            else:
+                # Append the new row to the DataFrame
+                self._df = pd.concat([self.df, new_row])
+                self._count('frame_reallocations')
+
+            # Drop rows with NaN prices if any; slope/spread are NaN until a full window exists
+            self._df = self.df.dropna(subset=[self.symbol1, self.symbol2])
+            self._count('frame_reallocations')
 
         # 如果self.df中time_series_elm1.date_time之前的记录数 >= self.FixedWindowLength，计算并更新spread和equation列;
         # 如果self.df.at[time_series_elm1.date_time, 'spread']和self.df.at[time_series_elm1.date_time, 'equation']是None，再更新
+        keep_equation = self.storage_mode == StorageMode.Full
         if ('spread' not in self.df.columns
-                or 'equation' not in self.df.columns
+                or (keep_equation and 'equation' not in self.df.columns)
                 or time_series_elm1.date_time not in self.df.index
                 or pd.isna(self.df.at[time_series_elm1.date_time, 'spread'])
-                or pd.isna(self.df.at[time_series_elm1.date_time, 'equation'])):
-            if len(self.df[self.df.index < time_series_elm1.date_time]) >= self.FixedWindowLength:
+                or (keep_equation and pd.isna(self.df.at[time_series_elm1.date_time, 'equation']))):
+            with self._stage('element.window', 1):
+                window_df = self._preceding_window(time_series_elm1.date_time)
+            if window_df is not None:
                 # Extract the relevant series for the calculation
-                relevant_df = self.df[self.df.index < time_series_elm1.date_time]
-                series_a = relevant_df[self.symbol1].iloc[-self.FixedWindowLength:]
-                series_b = relevant_df[self.symbol2].iloc[-self.FixedWindowLength:]
+                series_a = window_df[self.symbol1]
+                series_b = window_df[self.symbol2]
 
                 # Perform OLS regression and update spread and equation
                 ols_result = self.ols_regression(series_a.values, series_b.values)
                 slope = ols_result["slope"]
                 intercept = ols_result["intercept"]
 
-                self.df.at[time_series_elm1, 'slope'] = slope
-                self.df.at[time_series_elm1, 'intercept'] = intercept
-
-                # Calculate the spread for the current date_time
-                last_value_a = time_series_elm1.value
-                last_value_b = time_series_elm2.value
-                calculated_spread = last_value_a - (slope * last_value_b + intercept)
-
-                # Update spread and equation columns
-                self.df.at[time_series_elm1.date_time, 'spread'] = calculated_spread
-                self.df.at[
-                    time_series_elm1.date_time, 'equation'] = f"spread = {self.symbol1} - ({slope:.4f} * {self.symbol2} + {intercept:.4f})"
+                with self._stage('element.write', 1):
+                    self.df.at[time_series_elm1.date_time, 'slope'] = slope
+                    self.df.at[time_series_elm1.date_time, 'intercept'] = intercept
+
+                    # Calculate the spread for the current date_time
+                    last_value_a = time_series_elm1.value
+                    last_value_b = time_series_elm2.value
+                    calculated_spread = last_value_a - (slope * last_value_b + intercept)
+
+                    # Update spread and equation columns
+                    self.df.at[time_series_elm1.date_time, 'spread'] = calculated_spread
+                    if keep_equation:
+                        self.df.at[
+                            time_series_elm1.date_time, 'equation'] = f"spread = {self.symbol1} - ({slope:.4f} * {self.symbol2} + {intercept:.4f})"
+
+                    if self.signal_settings is not None:
+                        date_time = pd.Timestamp(time_series_elm1.date_time).value
+                        zscore, half_life, signal = self._next_signals(
+                            date_time, calculated_spread, time_series_elm1.date_time,
+                            lambda: self._signal_history(self.df[self.df.index < time_series_elm1.date_time]))
+                        self.df.at[time_series_elm1.date_time, 'zscore'] = zscore
+                        self.df.at[time_series_elm1.date_time, 'half_life'] = half_life
+                        self.df.at[time_series_elm1.date_time, 'signal'] = signal
+
+    def _preceding_window(self, date_time) -> Optional[DataFrame]:
+        """
+        date_time 之前的回归窗口: 最后 FixedWindowLength 行; 设置了 FixedWindowDuration 时为晚于
+        date_time - FixedWindowDuration 的行, 且数据需要早到 date_time - FixedWindowDuration。
+        :return: None 表示窗口尚不完整
+        """
+        relevant_df = self.df[self.df.index < date_time]
+        if self.FixedWindowDuration is None:
+            if len(relevant_df) < self.FixedWindowLength:
+                return None
+            return relevant_df.iloc[-self.FixedWindowLength:]
+        cutoff = pd.Timestamp(date_time) - self.FixedWindowDuration
+        if len(relevant_df) == 0 or relevant_df.index[0] > cutoff:
+            return None
+        window_df = relevant_df[relevant_df.index > cutoff]
+        return window_df if len(window_df) >= 2 else None
 
     def upsert_spread_and_equation(self):
         """
@@ -199,40 +425,330 @@ class SpreadCalculator(ABC):
         if self.symbol1 not in self.df.columns or self.symbol2 not in self.df.columns:
             raise ValueError(f"DataFrame must contain columns for {self.symbol1} and {self.symbol2}.")
 
-        # 跳过self.FixedWindowLength行
-        for i in range(1, len(self.df)):
-            if i < self.FixedWindowLength:
-                continue
-            current_datetime = self.df.index[i]
-            prev_datetime = self.df.index[i - 1]
-
-            # self.spread中，当前日期(current_datetime)向前取self.FixedWindowLength个数据点，得到seriesA，seriesB
-            window_end = i
-            window_start = i - self.FixedWindowLength
-            series_a = self.df.iloc[window_start:window_end][self.symbol1].values
-            series_b = self.df.iloc[window_start:window_end][self.symbol2].values
+        # 就地修改 self.df 之后, 流式状态需要重新从 self.df 构建
+        self._reset_stream()
+        if self.regression_engine == RegressionEngine.Vectorized:
+            self._upsert_spread_and_equation_vectorized()
+            return
+
+        # 逐窗口计算, 结果先写入数组, 最后一次性写回 self.df
+        window = self.FixedWindowLength
+        if self.FixedWindowDuration is None and len(self.df) <= window:
+            return
+        series_a_all = self.df[self.symbol1].to_numpy(dtype=np.float64)
+        series_b_all = self.df[self.symbol2].to_numpy(dtype=np.float64)
+        slope = np.full(len(self.df), np.nan)
+        intercept = np.full(len(self.df), np.nan)
+
+        if self.FixedWindowDuration is None:
+            # 跳过self.FixedWindowLength行, 当前行向前取self.FixedWindowLength个数据点
+            windows = ((i - window, i) for i in range(max(window, 1), len(self.df)))
+        else:
+            start, complete = time_window_starts(self._index_nanoseconds(), self.FixedWindowDuration.value)
+            rows = np.flatnonzero(complete & (np.arange(len(self.df)) - start >= 2))
+            windows = zip(start[rows].tolist(), rows.tolist())
+        with self._stage('upsert.regression', len(self.df)):
+            for begin, i in windows:
+                series_a = series_a_all[begin:i]
+                series_b = series_b_all[begin:i]
+
+                # 调用ols_regression(seriesA，seriesB)，得到ols_result
+                ols_result = self.ols_regression(series_a, series_b)
+                slope[i] = ols_result["slope"]
+                intercept[i] = ols_result["intercept"]
+
+        self._write_spread_columns(series_a_all, series_b_all, slope, intercept)
+
+    def _write_spread_columns(self, series_a, series_b, slope, intercept):
+        """
+        根据公式: spread = A - (slope * B + intercept) 写入 slope, intercept, spread 列;
+        StorageMode.Full 时同时写入 equation 列。
+        """
+        with self._stage('upsert.write', len(slope)):
+            spread = series_a - (slope * series_b + intercept)
+            self.df['slope'] = slope
+            self.df['intercept'] = intercept
+            self.df['spread'] = spread.astype(self.price_dtype, copy=False)
+            if self.storage_mode == StorageMode.Full:
+                self.df['equation'] = [
+                    f"spread = {self.symbol1} - ({s} * {self.symbol2} + {c})" if s == s else np.nan
+                    for s, c in zip(slope.tolist(), intercept.tolist())]
+        if self.signal_settings is not None:
+            with self._stage('upsert.signals', len(spread)):
+                zscore, half_life, signal = compute_signals(spread, self.signal_settings, self._signal_window())
+                self.df['zscore'] = zscore
+                self.df['half_life'] = half_life
+                self.df['signal'] = signal
+                self.signal_events = []
+                self._emit_signal_events(signal_events(self.df.index, signal, zscore, spread))
+
+    def _index_nanoseconds(self) -> np.ndarray:
+        return pd.DatetimeIndex(self.df.index).as_unit('ns').asi8
+
+    def _signal_window(self) -> int:
+        return self.signal_settings.resolve_window(self.FixedWindowLength)
+
+    @staticmethod
+    def _signal_history(df: DataFrame):
+        """
+        :return: (date_times int64 ns, spread, signal) of df, NaN for missing columns
+        """
+        missing = np.full(len(df), np.nan)
+        return (pd.DatetimeIndex(df.index).asi8, df['spread'].to_numpy(dtype=np.float64) if 'spread' in df else missing,
+                df['signal'].to_numpy(dtype=np.float64) if 'signal' in df else missing)
 
-            # 调用ols_regression(seriesA，seriesB)，得到ols_result
-            ols_result = self.ols_regression(series_a, series_b)
-            slope = ols_result["slope"]
-            intercept = ols_result["intercept"]
+    def _next_signals(self, date_time: int, spread: float, event_date_time, history: Callable):
+        """
+        用 SpreadSignalState O(1) 计算新 spread 的 zscore, half_life, signal 并发出事件。
+        The state is (re)built from history() when it does not exist yet or the new row is not after the
+        last row it has seen, e.g. after an out-of-order bar.
+        :param date_time: 新行的时间 (int64 ns)
+        :param event_date_time: 写入 SignalEvent 的时间
+        :param history: 返回此前各行 (date_times int64 ns, spread, signal) 的函数
+        :return: (zscore, half_life, signal)
+        """
+        state = self._signal_state
+        if state is None or state.last_date_time is None or date_time <= state.last_date_time:
+            state = self._signal_state = SpreadSignalState.from_history(
+                self.signal_settings, self._signal_window(), *history())
+        zscore, half_life, signal, previous_signal = state.update(date_time, spread)
+        self._emit_signal_events(state.events(event_date_time, zscore, spread, previous_signal))
+        return zscore, half_life, signal
+
+    def _emit_signal_events(self, events: List[SignalEvent]):
+        self.signal_events.extend(events)
+        if self.on_signal_event is not None:
+            for event in events:
+                self.on_signal_event(event)
+
+    def print_equation(self, end_date_time=None) -> Optional[str]:
+        """
+        生成 end_date_time (含) 之前最后一个已计算行的 equation; Compact 模式下由 slope/intercept 按需生成。
+        :param end_date_time: None 表示最新的一行
+        :return: equation 字符串, 没有已计算的行时返回 None
+        """
+        df = self.df
+        if 'spread' not in df.columns:
+            return None
+        computed = df['spread'].notna().to_numpy()
+        if end_date_time is not None:
+            computed = computed & (df.index <= pd.Timestamp(end_date_time))
+        rows = np.flatnonzero(computed)
+        if rows.size == 0:
+            return None
+        row = rows[-1]
+        if 'equation' in df.columns and isinstance(df['equation'].iat[row], str):
+            return df['equation'].iat[row]
+        return f"spread = {self.symbol1} - ({df['slope'].iat[row]} * {self.symbol2} + {df['intercept'].iat[row]})"
+
+    def bytes_per_row(self) -> float:
+        """
+        self.df 每行占用的字节数 (包括索引和 equation 字符串)。
+        """
+        df = self.df
+        if len(df) == 0:
+            return 0.0
+        return float(df.memory_usage(index=True, deep=True).sum()) / len(df)
 
-            self.df.at[current_datetime, 'slope'] = slope
-            self.df.at[current_datetime, 'intercept'] = intercept
+    def _seed_stream(self):
+        """
+        用当前 self.df 初始化列式存储和环形缓冲区: 缓冲区保存最后一行之前的 FixedWindowLength 行。
+        """
+        df = self._df
+        if len(df) and (self.symbol1 not in df.columns or self.symbol2 not in df.columns):
+            raise ValueError(f"DataFrame must contain columns for {self.symbol1} and {self.symbol2}.")
+        float_columns = [self.symbol1, self.symbol2, 'slope', 'intercept', 'spread']
+        if self.signal_settings is not None:
+            float_columns += ['zscore', 'half_life', 'signal']
+        self._store = ColumnarStore.from_dataframe(
+            df, float_columns,
+            ['equation'] if self.storage_mode == StorageMode.Full else [], capacity=self.capacity,
+            dtypes={self.symbol1: self.price_dtype, self.symbol2: self.price_dtype, 'spread': self.price_dtype})
+        if self.FixedWindowDuration is not None:
+            # 窗口只会向后移动, 预热时保留最后一行之前、晚于 (最后一行 - FixedWindowDuration) 的行
+            self._window = TimeWindowOls(self.FixedWindowDuration.value)
+            if len(df) > 1:
+                date_times = pd.DatetimeIndex(df.index).as_unit('ns').asi8
+                begin = np.searchsorted(date_times[:-1], date_times[-1] - self.FixedWindowDuration.value, side='right')
+                history = df.iloc[begin:-1]
+                self._window.extend(date_times[begin:-1], history[self.symbol2].to_numpy(dtype=np.float64),
+                                    history[self.symbol1].to_numpy(dtype=np.float64), first_date_time=date_times[0])
+            return
+        self._window = RollingOlsWindow(self.FixedWindowLength)
+        if len(df) > 1:
+            history = df.iloc[-self.FixedWindowLength - 1:-1]
+            self._window.extend(history[self.symbol2].to_numpy(dtype=np.float64),
+                                history[self.symbol1].to_numpy(dtype=np.float64))
+
+    def _adopt_store_timezone(self, tz):
+        """
+        从空的 df 开始流式更新时, 列式存储使用第一批数据的时区, 物化的 df 保留时区。
+        """
+        if tz is not None and self._store.length == 0:
+            self._store.tz = tz
 
-            # 根据ols_result，循环计算: spread = y(the last) - (slope * x(the last) + intercept)
-            last_value_a = self.df.at[current_datetime, self.symbol1]
-            last_value_b = self.df.at[current_datetime, self.symbol2]
+    def _update_time_series_element_streaming(self, time_series_elm1: TimeSeriesElement,
+                                              time_series_elm2: TimeSeriesElement) -> bool:
+        """
+        流式更新: 追加到预分配的列式存储, 用环形缓冲区的运行和计算 slope, intercept, spread, 每个 bar O(1)。
+        :return: False 表示 date_time 早于最后一行, 需要退回到 DataFrame 实现
+        """
+        if self._store is None:
+            self._seed_stream()
+        store = self._store
+        value1 = float(time_series_elm1.value)
+        value2 = float(time_series_elm2.value)
+        if value1 != value1 or value2 != value2:
+            # 与 DataFrame 实现一致, 价格为 NaN 的 bar 被丢弃
+            return True
+
+        date_time = pd.Timestamp(time_series_elm1.date_time)
+        self._adopt_store_timezone(date_time.tz)
+        date_time = date_time.value
+        last_date_time = store.last_date_time()
+        columns = store.columns
+        if last_date_time is not None and date_time < last_date_time:
+            # 乱序数据: 物化后交给 DataFrame 实现
+            self.df = self.df
+            return False
 
-            # Calculate spread
-            calculated_spread = last_value_a - (slope * last_value_b + intercept)
+        if last_date_time is None or date_time > last_date_time:
+            if last_date_time is not None:
+                # 上一行成为下一次回归窗口的最新数据点
+                self._push_window(store.length - 1)
+            row = store.append(date_time)
+        else:
+            row = store.length - 1
+        columns[self.symbol1][row] = value1
+        columns[self.symbol2][row] = value2
+        self._store_dirty = True
+
+        # 与 DataFrame 实现一致: 已经计算过的 spread 不再重新计算
+        if columns['spread'][row] == columns['spread'][row] or not self._window_ready(date_time):
+            return True
+
+        slope, intercept = self._window.regression()
+        self._count('regressions')
+        columns['slope'][row] = slope
+        columns['intercept'][row] = intercept
+        spread = value1 - (slope * value2 + intercept)
+        columns['spread'][row] = spread
+        if self.storage_mode == StorageMode.Full:
+            columns['equation'][row] = f"spread = {self.symbol1} - ({slope:.4f} * {self.symbol2} + {intercept:.4f})"
+        if self.signal_settings is not None:
+            columns['zscore'][row], columns['half_life'][row], columns['signal'][row] = self._next_signals(
+                date_time, spread, pd.Timestamp(time_series_elm1.date_time),
+                lambda: (store.index[:row], columns['spread'][:row], columns['signal'][:row]))
+        return True
+
+    def update_time_series_arrays(self, date_times, values1, values2) -> int:
+        """
+        流式模式下批量追加已对齐的 bar 或 tick: 整批的 slope, intercept, spread 一次向量化计算,
+        结果与逐个调用 update_time_series_element 相同。
+        Rows must be in increasing time order and later than the last stored row; rows with NaN prices are
+        dropped, as in update_time_series_element.
+        :param date_times: 时间 (datetime64 数组, DatetimeIndex 或 int64 ns)
+        :param values1: symbol1 的价格
+        :param values2: symbol2 的价格
+        :return: 追加的行数
+        """
+        if not self.streaming:
+            raise ValueError("update_time_series_arrays requires streaming=True.")
+        date_times = np.asarray(date_times) if not isinstance(date_times, pd.DatetimeIndex) else date_times
+        tz = None
+        if isinstance(date_times, np.ndarray) and np.issubdtype(date_times.dtype, np.integer):
+            date_times = date_times.astype(np.int64, copy=False)
+        else:
+            date_index = pd.DatetimeIndex(date_times)
+            tz = date_index.tz
+            date_times = date_index.as_unit('ns').asi8
+        values1 = np.asarray(values1, dtype=np.float64)
+        values2 = np.asarray(values2, dtype=np.float64)
+        if not len(date_times) == len(values1) == len(values2):
+            raise ValueError("date_times, values1 and values2 must have the same length.")
+        valid = ~(np.isnan(values1) | np.isnan(values2))
+        if not valid.all():
+            date_times, values1, values2 = date_times[valid], values1[valid], values2[valid]
+        count = len(date_times)
+        if count == 0:
+            return 0
+
+        if self._store is None:
+            self._seed_stream()
+        self._adopt_store_timezone(tz)
+        store = self._store
+        last_date_time = store.last_date_time()
+        if (np.diff(date_times) <= 0).any() or (last_date_time is not None and date_times[0] <= last_date_time):
+            raise ValueError("date_times must be increasing and later than the last stored row.")
+        if last_date_time is not None:
+            self._push_window(store.length - 1)
+
+        # 除最后一行外逐点回归并压入窗口; 最后一行与 update_time_series_element 一样, 下一次更新时才压入
+        with self._stage('arrays.regression', count):
+            slope = np.full(count, np.nan)
+            intercept = np.full(count, np.nan)
+            if self.FixedWindowDuration is None:
+                slope[:-1], intercept[:-1] = self._window.regress_chunk(values2[:-1], values1[:-1])
+            else:
+                slope[:-1], intercept[:-1] = self._window.regress_chunk(date_times[:-1], values2[:-1], values1[:-1])
+            if self._window_ready(int(date_times[-1])):
+                slope[-1], intercept[-1] = self._window.regression()
+            spread = values1 - (slope * values2 + intercept)
+
+        with self._stage('arrays.write', count):
+            first = store.length
+            store.extend(date_times, {self.symbol1: values1, self.symbol2: values2, 'slope': slope,
+                                      'intercept': intercept, 'spread': spread})
+            self._store_dirty = True
+            computed = np.flatnonzero(~np.isnan(slope))
+            columns = store.columns
+            if self.storage_mode == StorageMode.Full and computed.size:
+                columns['equation'][first + computed] = [
+                    f"spread = {self.symbol1} - ({s:.4f} * {self.symbol2} + {c:.4f})"
+                    for s, c in zip(slope[computed].tolist(), intercept[computed].tolist())]
+        if self.signal_settings is not None:
+            with self._stage('arrays.signals', computed.size):
+                for row in (first + computed).tolist():
+                    columns['zscore'][row], columns['half_life'][row], columns['signal'][row] = self._next_signals(
+                        int(store.index[row]), float(spread[row - first]), pd.Timestamp(int(store.index[row])),
+                        lambda row=row: (store.index[:row], columns['spread'][:row], columns['signal'][:row]))
+        self._count('rows_processed', count)
+        self._count('regressions', computed.size)
+        return count
+
+    def _push_window(self, row: int):
+        """
+        把列式存储的第 row 行压入回归窗口。
+        """
+        columns = self._store.columns
+        if self.FixedWindowDuration is None:
+            self._window.push(columns[self.symbol2][row], columns[self.symbol1][row])
+        else:
+            self._window.push(int(self._store.index[row]), columns[self.symbol2][row], columns[self.symbol1][row])
 
-            # 根据spread,更新对应行的spread值，并根据公式
-            self.df.at[current_datetime, 'spread'] = calculated_spread
+    def _window_ready(self, date_time: int) -> bool:
+        if self.FixedWindowDuration is None:
+            return self._window.is_full()
+        return self._window.ready(date_time)
 
-            # 根据公式: spread = A - (slope * B + intercept) 更新equation列;
-            equation = f"spread = {self.symbol1} - ({slope} * {self.symbol2} + {intercept})"
-            self.df.at[current_datetime, 'equation'] = equation
+    def _upsert_spread_and_equation_vectorized(self):
+        """
+        与逐窗口拟合结果一致的向量化实现: 一次遍历得到全部窗口的 slope, intercept, spread。
+        """
+        window = self.FixedWindowLength
+        if self.FixedWindowDuration is None and len(self.df) <= window:
+            return
+
+        series_a = self.df[self.symbol1].to_numpy(dtype=np.float64)
+        series_b = self.df[self.symbol2].to_numpy(dtype=np.float64)
+        with self._stage('upsert.regression', len(series_a)):
+            if self.FixedWindowDuration is None:
+                slope, intercept = rolling_ols(series_a, series_b, window)
+            else:
+                slope, intercept = rolling_ols_time(self._index_nanoseconds(), series_a, series_b,
+                                                    self.FixedWindowDuration.value)
+        self._count('regressions', int(np.count_nonzero(~np.isnan(slope))))
+        self._write_spread_columns(series_a, series_b, slope, intercept)
 
     @abstractmethod
     def calculate_window_length(self, resolution_level: ResolutionLevel) -> int:
@@ -243,57 +759,36 @@ class SpreadCalculator(ABC):
         """
         pass
 
-    def ols_regression(self, seriesA, seriesB):
-        # Convert series to numpy arrays if they are not already
-        series_a = np.array(seriesA)
-        series_b = np.array(seriesB)
-
-        # Verify that series_a and series_b are not empty
-        if series_a.size == 0 or series_b.size == 0:
-            raise ValueError("seriesA and seriesB must not be empty.")
-
-        # Verify that series_a and series_b have the same length
-        if len(series_a) != len(series_b):
-            raise ValueError("seriesA and seriesB must have the same length.")
-
-        # Check for non-numeric elements
-        non_numeric_A = [x for x in series_a if not isinstance(x, (int, float))]
-        if non_numeric_A:
-            print(f"Non-numeric elements in seriesA: {non_numeric_A}")
-
-        non_numeric_B = [x for x in series_b if not isinstance(x, (int, float))]
-        if non_numeric_B:
-            print(f"Non-numeric elements in seriesB: {non_numeric_B}")
-
-        # Validate that all elements are numeric
-        if not np.issubdtype(series_a.dtype, np.number):
-            raise ValueError("seriesA must contain only numeric values.")
-        if not np.issubdtype(series_b.dtype, np.number):
-            raise ValueError("seriesB must contain only numeric values.")
-
-        # Verify seriesA and seriesB contain at least two data points
-        if len(series_a) < 2 or len(series_b) < 2:
-            raise ValueError("seriesA and seriesB must contain at least two data points for OLS regression.")
-
-        # Add a constant term for the intercept
-        series_b = sm.add_constant(series_b)
+    def calculate_window_duration(self, resolution_level: ResolutionLevel) -> Optional[pd.Timedelta]:
+        """
+        事件时间窗口的长度; 只有 Tick 级别使用, 其余级别返回 None (使用 FixedWindowLength 个 bar)。
+        """
+        return None
 
-        # Fit the OLS model
-        model = sm.OLS(series_a, series_b)
-        results = model.fit()
+    def ols_regression(self, seriesA, seriesB):
+        """
+        单窗口 OLS: seriesA = slope * seriesB + intercept, 通过 ols_regression_batch 计算。
+        :return: {"slope": ..., "intercept": ...}
+        """
+        with self._stage('ols_regression', len(seriesA)):
+            slope, intercept = ols_regression_batch(seriesA, seriesB)
+        self._count('regressions')
 
         # Return the regression coefficients and intercept
         return {
-            "slope": results.params[1],  # Slope
-            "intercept": results.params[0]  # Intercept
+            "slope": slope,  # Slope
+            "intercept": intercept  # Intercept
         }
 
 
 class SpreadCalculatorSP500(SpreadCalculator):
 
-    def __init__(self, symbol1: str, symbol2: str, resolution: ResolutionLevel = ResolutionLevel.Daily):
-        super().__init__(symbol1, symbol2, resolution)
-        self.FixedWindowLength = self.calculate_window_length(resolution)
+    def __init__(self, symbol1: str, symbol2: str, resolution: ResolutionLevel = ResolutionLevel.Daily, **kwargs):
+        super().__init__(symbol1, symbol2, resolution, **kwargs)
+        if self.FixedWindowDuration is None:
+            self.FixedWindowDuration = self.calculate_window_duration(resolution)
+        if resolution != ResolutionLevel.Tick:
+            self.FixedWindowLength = self.calculate_window_length(resolution)
 
     def calculate_window_length(self, resolution_level: ResolutionLevel) -> int:
         """
@@ -319,16 +814,30 @@ class SpreadCalculatorSP500(SpreadCalculator):
             # 每天6.5小时 * 3600秒
             return int(fixed_window_length * 6.5 * 3600)
         elif resolution_level == ResolutionLevel.Tick:
-            # 每次交易的窗口长度取决于实际的实现需求，这里没有具体实现
-            raise NotImplementedError("Tick resolution is not implemented.")
+            # tick 之间的间隔不固定, 没有按 bar 数的窗口, 使用 calculate_window_duration
+            raise NotImplementedError("Tick resolution uses a time-based window, see calculate_window_duration.")
         else:
             raise ValueError(f"Unsupported resolution level: {resolution_level}")
 
+    def calculate_window_duration(self, resolution_level: ResolutionLevel) -> Optional[pd.Timedelta]:
+        """
+        Tick 级别的事件时间窗口。
+        :param resolution_level: 分辨率级别
+        :return: 窗口时长, 其余级别返回 None
+        """
+        if resolution_level == ResolutionLevel.Tick:
+            # 一个交易日, 6.5小时
+            return pd.Timedelta(hours=6.5)
+        return None
+
 
 class SpreadCalculatorCrypto(SpreadCalculator):
-    def __init__(self, symbol1: str, symbol2: str, resolution: ResolutionLevel = ResolutionLevel.Daily):
-        super().__init__(symbol1, symbol2, resolution)
-        self.FixedWindowLength = self.calculate_window_length(resolution)
+    def __init__(self, symbol1: str, symbol2: str, resolution: ResolutionLevel = ResolutionLevel.Daily, **kwargs):
+        super().__init__(symbol1, symbol2, resolution, **kwargs)
+        if self.FixedWindowDuration is None:
+            self.FixedWindowDuration = self.calculate_window_duration(resolution)
+        if resolution != ResolutionLevel.Tick:
+            self.FixedWindowLength = self.calculate_window_length(resolution)
 
     def calculate_window_length(self, resolution_level: ResolutionLevel) -> int:
         """
@@ -354,7 +863,18 @@ class SpreadCalculatorCrypto(SpreadCalculator):
             # 每天24小时 * 3600秒
             return fixed_window_length * 24 * 3600
         elif resolution_level == ResolutionLevel.Tick:
-            # 每次交易的窗口长度取决于实际的实现需求，这里没有具体实现
-            raise NotImplementedError("Tick resolution is not implemented.")
+            # tick 之间的间隔不固定, 没有按 bar 数的窗口, 使用 calculate_window_duration
+            raise NotImplementedError("Tick resolution uses a time-based window, see calculate_window_duration.")
         else:
             raise ValueError(f"Unsupported resolution level: {resolution_level}")
+
+    def calculate_window_duration(self, resolution_level: ResolutionLevel) -> Optional[pd.Timedelta]:
+        """
+        Tick 级别的事件时间窗口。
+        :param resolution_level: 分辨率级别
+        :return: 窗口时长, 其余级别返回 None
+        """
+        if resolution_level == ResolutionLevel.Tick:
+            # 加密货币市场每天24小时交易
+            return pd.Timedelta(hours=24)
+        return None
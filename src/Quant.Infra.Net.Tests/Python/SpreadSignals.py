@@ -0,0 +1,343 @@
+from enum import Enum
+from typing import List, Optional
+import numpy as np
+from RollingOls import rolling_ols, RollingOlsWindow
+
+LOG2 = np.log(2.0)
+
+
+class SignalSettings:
+    """
+    z-score / 半衰期的滚动窗口和入场、出场阈值。
+    The spread is short (signal -1) from z >= entry until z <= exit, and long (signal +1) from z <= -entry
+    until z >= -exit; otherwise it is flat (signal 0).
+    """
+
+    def __init__(self, window: Optional[int] = None, entry: float = 2.0, exit: float = 0.5):
+        """
+        :param window: z-score 与半衰期的窗口长度 (bar 数), None 表示使用 SpreadCalculator.FixedWindowLength
+        :param entry: 入场阈值 (|z|)
+        :param exit: 出场阈值 (|z|), 必须满足 0 <= exit < entry
+        """
+        if window is not None and window < 2:
+            raise ValueError("window must contain at least two data points.")
+        if not 0 <= exit < entry:
+            raise ValueError("Band thresholds must satisfy 0 <= exit < entry.")
+        self.window = window
+        self.entry = float(entry)
+        self.exit = float(exit)
+
+    def resolve_window(self, default: int) -> int:
+        window = self.window if self.window is not None else default
+        if window < 2:
+            raise ValueError("window must contain at least two data points.")
+        return window
+
+
+class SignalEventType(Enum):
+    EnterLong = "enter_long"  # z 向下穿过 -entry, 做多 spread
+    ExitLong = "exit_long"  # 多头持仓时 z 回到 -exit 之上
+    EnterShort = "enter_short"  # z 向上穿过 entry, 做空 spread
+    ExitShort = "exit_short"  # 空头持仓时 z 回到 exit 之下
+
+
+class SignalEvent:
+    """
+    一次入场/出场带穿越。
+    """
+
+    __slots__ = ("date_time", "event_type", "zscore", "spread")
+
+    def __init__(self, date_time, event_type: SignalEventType, zscore: float, spread: float):
+        self.date_time = date_time
+        self.event_type = event_type
+        self.zscore = zscore
+        self.spread = spread
+
+    def __str__(self):
+        return f"{self.date_time}: {self.event_type.name}, z={self.zscore:.3f}, spread={self.spread:.4f}"
+
+    def __eq__(self, other):
+        if not isinstance(other, SignalEvent):
+            return False
+        return self.date_time == other.date_time and self.event_type == other.event_type
+
+    def __hash__(self):
+        return hash((self.date_time, self.event_type))
+
+
+def signal_transitions(previous: int, current: int) -> List[SignalEventType]:
+    """
+    信号从 previous 变为 current 时产生的事件; 从 -1 直接变为 +1 时先出场再入场。
+    """
+    events = []
+    if previous == -1 and current != -1:
+        events.append(SignalEventType.ExitShort)
+    elif previous == 1 and current != 1:
+        events.append(SignalEventType.ExitLong)
+    if current == -1 and previous != -1:
+        events.append(SignalEventType.EnterShort)
+    elif current == 1 and previous != 1:
+        events.append(SignalEventType.EnterLong)
+    return events
+
+
+def _half_life(slope):
+    """
+    Δs = intercept + slope * s_prev 的半衰期; slope 不在 (-1, 0) 内时 spread 不均值回复, 返回 inf。
+    """
+    slope = np.asarray(slope, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        half_life = np.where((slope < 0) & (slope > -1), -LOG2 / np.log1p(slope), np.inf)
+    half_life = np.where(np.isnan(slope), np.nan, half_life)
+    return float(half_life) if half_life.ndim == 0 else half_life
+
+
+def rolling_zscore(spread, window: int):
+    """
+    z = (s - mean) / std, mean 与 std (ddof=1) 取自包括当前 bar 在内的最后 window 个 spread,
+    与 pandas 的 spread.rolling(window) 一致。窗口内 spread 为常数时为 NaN。
+    :param spread: 不含 NaN 的 spread 数组
+    """
+    spread = np.asarray(spread, dtype=np.float64)
+    n = len(spread)
+    zscore = np.full(n, np.nan)
+    if n < window:
+        return zscore
+    shift = spread.mean()
+    centered = spread - shift
+    prefix = np.zeros((2, n + 1))
+    np.cumsum(centered, out=prefix[0, 1:])
+    np.cumsum(centered * centered, out=prefix[1, 1:])
+    # 第 i 行的窗口为 (i - window, i]
+    sum_s = prefix[0, window:] - prefix[0, :n - window + 1]
+    sum_ss = prefix[1, window:] - prefix[1, :n - window + 1]
+    zscore[window - 1:] = _zscore_from_sums(centered[window - 1:], sum_s, sum_ss, window, shift)
+    return zscore
+
+
+def _zscore_from_sums(centered_value, sum_s, sum_ss, window, shift):
+    """
+    由平移后的窗口和 Σs, Σs² 计算 z-score; 方差只剩舍入误差时返回 NaN。
+    """
+    squares = sum_ss - sum_s * sum_s / window
+    raw_squares = sum_ss + 2.0 * shift * sum_s + window * shift * shift
+    degenerate = squares <= 1e-13 * raw_squares
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(np.where(degenerate, np.nan, squares) / (window - 1))
+        return (centered_value - sum_s / window) / std
+
+
+def rolling_half_life(spread, window: int):
+    """
+    在包括当前 bar 在内的最后 window 对 (s_prev, Δs) 上拟合 Δs = intercept + slope * s_prev, 计算半衰期。
+    The first `window` rows have fewer than `window` pairs and are NaN.
+    :param spread: 不含 NaN 的 spread 数组
+    """
+    spread = np.asarray(spread, dtype=np.float64)
+    n = len(spread)
+    if n <= window:
+        return np.full(n, np.nan)
+    # 第 k 对属于第 k + 1 行; 末尾补一个占位点, 使 rolling_ols 的第 i 行恰好使用前 i 行对应的窗口
+    previous = np.append(spread[:-1], spread[-1])
+    change = np.append(np.diff(spread), 0.0)
+    slope, _ = rolling_ols(change, previous, window)
+    return _half_life(slope)
+
+
+def band_signal(zscore, settings: SignalSettings, initial: int = 0):
+    """
+    向量化的入场/出场状态机: 空头与多头状态分别由最近一次触发的阈值决定 (前向填充), 两者不会同时成立。
+    :param zscore: z-score 数组, NaN 不改变状态
+    :param initial: 第一行之前的信号 (-1, 0, +1)
+    :return: 信号数组 (float64), zscore 为 NaN 的行为 NaN
+    """
+    zscore = np.asarray(zscore, dtype=np.float64)
+
+    def hold(enter, leave, start):
+        marks = np.where(enter, 1.0, np.where(leave, 0.0, np.nan))
+        defined = ~np.isnan(marks)
+        last = np.maximum.accumulate(np.where(defined, np.arange(len(marks)), -1))
+        return np.where(last >= 0, marks[np.maximum(last, 0)], float(start))
+
+    is_short = hold(zscore >= settings.entry, zscore <= settings.exit, initial == -1)
+    is_long = hold(zscore <= -settings.entry, zscore >= -settings.exit, initial == 1)
+    signal = is_long - is_short
+    signal[np.isnan(zscore)] = np.nan
+    return signal
+
+
+def compute_signals(spread, settings: SignalSettings, window: int):
+    """
+    一次计算整列 spread 的 zscore, half_life 和 signal; spread 为 NaN 的行被跳过, 结果为 NaN。
+    :return: (zscore, half_life, signal) arrays with the length of spread
+    """
+    spread = np.asarray(spread, dtype=np.float64)
+    valid = ~np.isnan(spread)
+    values = spread[valid]
+    zscore = np.full(len(spread), np.nan)
+    half_life = np.full(len(spread), np.nan)
+    zscore[valid] = rolling_zscore(values, window)
+    half_life[valid] = rolling_half_life(values, window)
+    return zscore, half_life, band_signal(zscore, settings)
+
+
+def signal_events(date_times, signal, zscore, spread, previous: int = 0) -> List[SignalEvent]:
+    """
+    根据信号列的变化生成事件, 只访问信号发生变化的行。
+    :param date_times: 与 signal 等长的时间 (例如 DataFrame 的 index)
+    :param previous: 第一行之前的信号
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    rows = np.flatnonzero(~np.isnan(signal))
+    values = signal[rows]
+    before = np.concatenate(([previous], values[:-1]))
+    events = []
+    for k in np.flatnonzero(values != before):
+        row = rows[k]
+        for event_type in signal_transitions(int(before[k]), int(values[k])):
+            events.append(SignalEvent(date_times[row], event_type, float(zscore[row]), float(spread[row])))
+    return events
+
+
+class RollingMomentsWindow:
+    """
+    固定长度的环形缓冲区, 维护窗口内的运行和 (Σs, Σs²), 与 RollingOlsWindow 一样每 window 次 push 重新计算一次。
+    """
+
+    def __init__(self, window: int):
+        if window < 2:
+            raise ValueError("window must contain at least two data points.")
+        self.window = window
+        self.values = np.zeros(window)
+        self.position = 0
+        self.count = 0
+        self.shift = 0.0
+        self.sum_s = 0.0
+        self.sum_ss = 0.0
+        self.pushes_since_refresh = 0
+
+    def __len__(self):
+        return self.count
+
+    def is_full(self) -> bool:
+        return self.count == self.window
+
+    def push(self, value: float):
+        if self.count == 0:
+            self.shift = value
+        position = self.position
+        if self.count == self.window:
+            old = self.values[position] - self.shift
+            self.sum_s -= old
+            self.sum_ss -= old * old
+        else:
+            self.count += 1
+        self.values[position] = value
+        new = value - self.shift
+        self.sum_s += new
+        self.sum_ss += new * new
+
+        position += 1
+        self.position = 0 if position == self.window else position
+        self.pushes_since_refresh += 1
+        if self.pushes_since_refresh >= self.window:
+            self.refresh()
+
+    def extend(self, values):
+        """
+        用历史数据预热, 只保留最后 window 个。
+        """
+        for value in np.asarray(values, dtype=np.float64)[-self.window:].tolist():
+            self.push(value)
+        self.refresh()
+
+    def refresh(self):
+        self.pushes_since_refresh = 0
+        if self.count == 0:
+            return
+        values = self.values[:self.count]
+        self.shift = float(values.mean())
+        centered = values - self.shift
+        self.sum_s = float(centered.sum())
+        self.sum_ss = float(centered @ centered)
+
+    def zscore(self, value: float) -> float:
+        """
+        value (已经 push 过的最新值) 相对于当前窗口的 z-score; 窗口未满时为 NaN。
+        """
+        if self.count < self.window:
+            return np.nan
+        return float(_zscore_from_sums(value - self.shift, self.sum_s, self.sum_ss, self.window, self.shift))
+
+
+class SpreadSignalState:
+    """
+    流式计算 zscore, half_life 和 signal 所需的全部状态, 每个新 spread O(1)。
+    """
+
+    def __init__(self, settings: SignalSettings, window: int):
+        self.settings = settings
+        self.moments = RollingMomentsWindow(window)
+        self.pairs = RollingOlsWindow(window)  # (s_prev, Δs)
+        self.previous_spread = np.nan
+        self.signal = 0
+        self.last_date_time = None
+
+    @classmethod
+    def from_history(cls, settings: SignalSettings, window: int, date_times, spreads, signals):
+        """
+        用已经计算的行预热: 最后 window + 1 个有效 spread 和最后一个有效信号。
+        :param date_times: int64 ns
+        """
+        state = cls(settings, window)
+        spreads = np.asarray(spreads, dtype=np.float64)
+        valid = ~np.isnan(spreads)
+        history = spreads[valid][-(window + 1):]
+        if len(history) == 0:
+            return state
+        state.moments.extend(history)
+        if len(history) > 1:
+            state.pairs.extend(history[:-1], np.diff(history))
+        state.previous_spread = float(history[-1])
+        state.last_date_time = int(np.asarray(date_times)[valid][-1])
+        signals = np.asarray(signals, dtype=np.float64)[valid]
+        signals = signals[~np.isnan(signals)]
+        state.signal = int(signals[-1]) if len(signals) else 0
+        return state
+
+    def update(self, date_time: int, spread: float):
+        """
+        :param date_time: 新 spread 的时间 (int64 ns), 必须晚于上一次
+        :return: (zscore, half_life, signal, previous_signal); 窗口未满时 zscore/signal 为 NaN
+        """
+        if self.previous_spread == self.previous_spread:
+            self.pairs.push(self.previous_spread, spread - self.previous_spread)
+        self.moments.push(spread)
+        self.previous_spread = spread
+        self.last_date_time = date_time
+
+        half_life = _half_life(self.pairs.regression()[0]) if self.pairs.is_full() else np.nan
+        zscore = self.moments.zscore(spread)
+        previous_signal = self.signal
+        if zscore != zscore:
+            return zscore, half_life, np.nan, previous_signal
+
+        settings = self.settings
+        is_short, is_long = self.signal == -1, self.signal == 1
+        if zscore >= settings.entry:
+            is_short = True
+        elif zscore <= settings.exit:
+            is_short = False
+        if zscore <= -settings.entry:
+            is_long = True
+        elif zscore >= -settings.exit:
+            is_long = False
+        self.signal = int(is_long) - int(is_short)
+        return zscore, half_life, float(self.signal), previous_signal
+
+    def events(self, date_time, zscore: float, spread: float, previous_signal: int) -> List[SignalEvent]:
+        if self.signal == previous_signal:
+            return []
+        return [SignalEvent(date_time, event_type, zscore, spread)
+                for event_type in signal_transitions(previous_signal, self.signal)]
@@ -0,0 +1,221 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import AsyncIterable, Dict, List, Optional, Tuple
+import numpy as np
+from SpreadCalculator import SpreadCalculator, TimeSeriesElement
+
+_CLOSE = object()
+
+
+class HubMetrics:
+    """
+    StreamingHub 的运行统计: 收到的 bar、完成的更新、批次数、丢弃的单边 bar、队列最高水位和端到端延迟。
+    Latency runs from the publish of the later of the two legs to the end of the calculator update; the last
+    `latency_samples` values are kept for the percentiles.
+    """
+
+    def __init__(self, latency_samples: int = 10000):
+        self.started_at = time.perf_counter()
+        self.bars_received = 0
+        self.updates_applied = 0
+        self.batches = 0
+        self.dropped_legs = 0
+        self.errors = 0
+        self.last_error: Optional[BaseException] = None
+        self.queue_high_water = 0
+        self.latencies = deque(maxlen=latency_samples)
+
+    @property
+    def throughput(self) -> float:
+        """
+        每秒完成的更新数。
+        """
+        elapsed = time.perf_counter() - self.started_at
+        return self.updates_applied / elapsed if elapsed > 0 else 0.0
+
+    def latency_percentiles(self, percentiles=(50, 95, 99)) -> Dict[int, float]:
+        """
+        :return: {percentile: latency in seconds}, 没有样本时为空
+        """
+        if not self.latencies:
+            return {}
+        values = np.percentile(np.fromiter(self.latencies, dtype=np.float64), percentiles)
+        return dict(zip(percentiles, values.tolist()))
+
+    def __str__(self):
+        latency = ", ".join(f"p{p}={value * 1e3:.3f}ms" for p, value in self.latency_percentiles().items())
+        return (f"HubMetrics: {self.bars_received} bars, {self.updates_applied} updates in {self.batches} batches "
+                f"({self.throughput:.0f}/s), {self.dropped_legs} dropped legs, {self.errors} errors, "
+                f"queue high water {self.queue_high_water}, latency [{latency}]")
+
+
+class _Subscription:
+    """
+    一个 pair calculator 的订阅状态: 等待另一边的 bar, 以及待提交的更新。
+    """
+
+    def __init__(self, calculator: SpreadCalculator):
+        self.calculator = calculator
+        self.pending: Dict[object, list] = {}  # date_time -> [element1, element2, received_at]
+        self.last_date_time = None
+        self.updates: List[Tuple[TimeSeriesElement, TimeSeriesElement, float]] = []
+
+
+class StreamingHub:
+    """
+    asyncio 行情分发中心: 接收各个 symbol 交错到达的 bar, 等到同一时间的两边都到达后, 按批次交给订阅的 calculator。
+    publish awaits when the input queue is full, which pushes back on the producers. Each drain cycle takes up to
+    batch_size bars from the queue and runs every calculator's batch of update_time_series_element calls on the
+    executor; a calculator never has two batches in flight, so calculators need no locking. A leg whose partner
+    has not arrived when a later timestamp of the same pair completes is dropped (and counted), so the
+    calculators only ever see bars in time order.
+    """
+
+    def __init__(self, executor: Optional[Executor] = None, max_queue: int = 10000, batch_size: int = 1024,
+                 max_pending: int = 1000, latency_samples: int = 10000):
+        """
+        :param executor: 执行 calculator 更新的线程池, None 表示创建一个 ThreadPoolExecutor
+        :param max_queue: 输入队列长度, 队列满时 publish 等待 (背压)
+        :param batch_size: 每个批次最多处理的 bar 数
+        :param max_pending: 每个 pair 最多等待配对的时间点数, 超出时丢弃最旧的
+        :param latency_samples: 用于计算延迟分位数的样本数
+        """
+        self.executor = executor
+        self.max_queue = max_queue
+        self.batch_size = max(int(batch_size), 1)
+        self.max_pending = max(int(max_pending), 1)
+        self.metrics = HubMetrics(latency_samples)
+        self._subscriptions: Dict[str, List[_Subscription]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._owns_executor = False
+
+    def subscribe(self, calculator: SpreadCalculator):
+        """
+        订阅 calculator.symbol1 与 calculator.symbol2 的 bar。
+        """
+        subscription = _Subscription(calculator)
+        for symbol in (calculator.symbol1, calculator.symbol2):
+            self._subscriptions.setdefault(symbol, []).append(subscription)
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_queue)
+        return self._queue
+
+    async def publish(self, symbol: str, element: TimeSeriesElement):
+        """
+        发布一个 bar; 队列满时等待。
+        """
+        await self.queue.put((symbol, element, time.perf_counter()))
+        self.metrics.queue_high_water = max(self.metrics.queue_high_water, self.queue.qsize())
+
+    async def ingest(self, symbol: str, stream: AsyncIterable[TimeSeriesElement]):
+        """
+        把一个 symbol 的异步 bar 流全部发布到 hub。
+        """
+        async for element in stream:
+            await self.publish(symbol, element)
+
+    async def close(self):
+        """
+        发布结束标记; run 处理完之前的全部 bar 后返回。
+        """
+        await self.queue.put(_CLOSE)
+
+    async def run(self) -> HubMetrics:
+        """
+        消费输入队列直到 close, 返回统计。
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor()
+            self._owns_executor = True
+        loop = asyncio.get_running_loop()
+        queue = self.queue
+        closed = False
+        try:
+            while not closed:
+                items = [await queue.get()]
+                while len(items) < self.batch_size and not queue.empty():
+                    items.append(queue.get_nowait())
+                ready = []
+                for item in items:
+                    if item is _CLOSE:
+                        closed = True
+                        continue
+                    ready.extend(self._route(*item))
+                if ready:
+                    results = await asyncio.gather(*(loop.run_in_executor(self.executor, self._apply, subscription)
+                                                     for subscription in ready))
+                    self._record(results)
+        finally:
+            if self._owns_executor:
+                self.executor.shutdown(wait=True)
+                self.executor, self._owns_executor = None, False
+        return self.metrics
+
+    def _route(self, symbol: str, element: TimeSeriesElement, received_at: float) -> List[_Subscription]:
+        """
+        把一个 bar 放入所有相关 pair 的等待区, 两边都到达时加入该 pair 的更新批次。
+        :return: 本次新加入更新的订阅 (每个订阅在一个批次中最多出现一次)
+        """
+        self.metrics.bars_received += 1
+        ready = []
+        date_time = element.date_time
+        for subscription in self._subscriptions.get(symbol, ()):
+            if subscription.last_date_time is not None and date_time <= subscription.last_date_time:
+                self.metrics.dropped_legs += 1
+                continue
+            side = 0 if symbol == subscription.calculator.symbol1 else 1
+            legs = subscription.pending.setdefault(date_time, [None, None, received_at])
+            legs[side] = element
+            legs[2] = max(legs[2], received_at)
+            if legs[0] is None or legs[1] is None:
+                if len(subscription.pending) > self.max_pending:
+                    self._drop_before(subscription, min(subscription.pending))
+                continue
+
+            # 早于本时间点且仍未配对的 bar 不会再被使用
+            del subscription.pending[date_time]
+            self._drop_before(subscription, date_time)
+            subscription.last_date_time = date_time
+            if not subscription.updates:
+                ready.append(subscription)
+            subscription.updates.append((legs[0], legs[1], legs[2]))
+        return ready
+
+    def _drop_before(self, subscription: _Subscription, date_time):
+        stale = [key for key in subscription.pending if key <= date_time]
+        for key in stale:
+            legs = subscription.pending.pop(key)
+            self.metrics.dropped_legs += (legs[0] is not None) + (legs[1] is not None)
+
+    @staticmethod
+    def _apply(subscription: _Subscription):
+        """
+        在 executor 中执行一个 pair 的整批更新; 统计在事件循环线程中汇总, 工作线程之间不共享可变状态。
+        :return: (latencies, errors)
+        """
+        updates, subscription.updates = subscription.updates, []
+        calculator = subscription.calculator
+        latencies, errors = [], []
+        for element1, element2, received_at in updates:
+            try:
+                calculator.update_time_series_element(element1, element2)
+            except Exception as error:
+                errors.append(error)
+                continue
+            latencies.append(time.perf_counter() - received_at)
+        return latencies, errors
+
+    def _record(self, results):
+        metrics = self.metrics
+        metrics.batches += 1
+        for latencies, errors in results:
+            metrics.updates_applied += len(latencies)
+            metrics.latencies.extend(latencies)
+            if errors:
+                metrics.errors += len(errors)
+                metrics.last_error = errors[-1]
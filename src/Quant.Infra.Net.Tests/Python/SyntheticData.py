@@ -0,0 +1,31 @@
+from typing import Tuple
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from SpreadCalculator import TimeSeries
+
+
+def generate_cointegrated_pair(length: int, slope: float = 1.5, intercept: float = 10.0, half_life: float = 20.0,
+                               spread_volatility: float = 1.0, seed: int = None, start="2000-01-01",
+                               freq: str = "D") -> Tuple[TimeSeries, TimeSeries]:
+    """
+    生成一对协整的价格序列: B 为随机游走, A = slope * B + intercept + spread, spread 为均值回复的 AR(1) 过程。
+    :param length: bar 数量
+    :param slope: 真实的对冲比例
+    :param intercept: 真实的截距
+    :param half_life: spread 的半衰期 (bar 数)
+    :param spread_volatility: spread 每个 bar 的噪声标准差
+    :param seed: 随机种子, 相同的种子生成相同的数据
+    :param start: 第一个 bar 的时间
+    :param freq: bar 间隔, 例如 'D', 'h', 'min', 's'
+    :return: (time_series_a, time_series_b)
+    """
+    rng = np.random.default_rng(seed)
+    series_b = 100.0 + np.cumsum(rng.normal(0.0, 1.0, length))
+    # spread_t = phi * spread_{t-1} + noise_t, phi 由半衰期决定
+    phi = 0.5 ** (1.0 / half_life)
+    spread = lfilter([1.0], [1.0, -phi], rng.normal(0.0, spread_volatility, length))
+    series_a = slope * series_b + intercept + spread
+
+    date_times = pd.date_range(start, periods=length, freq=freq).as_unit("ns").to_numpy()
+    return TimeSeries(date_times, series_a), TimeSeries(date_times, series_b)
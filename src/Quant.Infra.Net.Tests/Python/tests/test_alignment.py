@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+import pandas as pd
+from Alignment import AlignmentPolicy, align_arrays
+from SpreadCalculator import TimeSeries, TimeSeriesElement, SpreadCalculatorSP500, ResolutionLevel
+
+
+class TestAlignment(unittest.TestCase):
+
+    def build_frames(self, seed=2):
+        rng = np.random.default_rng(seed)
+        minutes = pd.date_range("2024-01-01", periods=600, freq="min", unit="ns")
+        first = pd.DataFrame({"a": rng.normal(100, 1, 600)}, index=minutes).sample(frac=0.8, random_state=1)
+        second = pd.DataFrame({"b": rng.normal(50, 1, 600)}, index=minutes).sample(frac=0.7, random_state=2)
+        # 乱序, 带 NaN 价格
+        first.iloc[::50, 0] = np.nan
+        return first, second
+
+    def align(self, first, second, policy, tolerance=None):
+        return align_arrays(first.index.asi8, first["a"].to_numpy(), second.index.asi8, second["b"].to_numpy(),
+                            policy, tolerance)
+
+    def test_inner_outer_and_asof_match_pandas(self):
+        first, second = self.build_frames()
+        clean_first = first.dropna().sort_index()
+        clean_second = second.sort_index()
+
+        date_times, values1, values2, report = self.align(first, second, AlignmentPolicy.Inner)
+        expected = clean_first.join(clean_second, how="inner")
+        np.testing.assert_array_equal(expected.index.asi8, date_times)
+        np.testing.assert_array_equal(expected["a"].to_numpy(), values1)
+        np.testing.assert_array_equal(expected["b"].to_numpy(), values2)
+        self.assertEqual(len(expected), report.matched)
+        self.assertEqual(len(clean_first) - len(expected), report.only_in_first)
+        self.assertEqual(len(first) - len(clean_first), report.invalid_rows1)
+
+        date_times, values1, values2, report = self.align(first, second, AlignmentPolicy.OuterForwardFill)
+        expected = clean_first.join(clean_second, how="outer").ffill().dropna()
+        np.testing.assert_array_equal(expected.index.asi8, date_times)
+        np.testing.assert_array_equal(expected["a"].to_numpy(), values1)
+        np.testing.assert_array_equal(expected["b"].to_numpy(), values2)
+        self.assertEqual(len(expected), report.rows)
+        self.assertEqual(report.rows - report.matched, report.filled_rows1 + report.filled_rows2)
+
+        tolerance = pd.Timedelta("2min")
+        date_times, values1, values2, report = self.align(first, second, AlignmentPolicy.AsOf, tolerance)
+        expected = pd.merge_asof(clean_first, clean_second, left_index=True, right_index=True,
+                                 tolerance=tolerance).dropna()
+        np.testing.assert_array_equal(expected.index.asi8, date_times)
+        np.testing.assert_array_equal(expected["b"].to_numpy(), values2)
+        self.assertEqual(report.rows - report.matched, report.filled_rows2)
+
+    def test_duplicates_keep_last_value(self):
+        date_times = pd.to_datetime(["2024-01-02", "2024-01-01", "2024-01-02"]).as_unit("ns").asi8
+        aligned, values1, values2, report = align_arrays(date_times, [1.0, 2.0, 3.0], date_times, [4.0, 5.0, 6.0])
+        np.testing.assert_array_equal([2.0, 3.0], values1)
+        np.testing.assert_array_equal([5.0, 6.0], values2)
+        self.assertEqual(1, report.duplicate_rows1)
+
+    def test_update_time_series_reports_instead_of_printing(self):
+        date_times = pd.date_range("2024-01-01", periods=5, freq="D")
+        time_series1 = [TimeSeriesElement(dt, value) for dt, value in zip(date_times, [1.0, "bad", 3.0, 4.0, 5.0])]
+        time_series2 = [TimeSeriesElement(dt, float(value)) for dt, value in zip(date_times, range(5))]
+        calculator = SpreadCalculatorSP500("A", "B", ResolutionLevel.Daily)
+        report = calculator.update_time_series(time_series1, time_series2)
+        self.assertEqual(4, report.rows)
+        self.assertEqual(1, report.invalid_rows1)
+        self.assertEqual(4, len(calculator.df))
+
+        with self.assertRaises(ValueError):
+            calculator.update_time_series(time_series1, time_series2[1:])
+        report = calculator.update_time_series(TimeSeries(date_times[:4], [1.0, 2.0, 3.0, 4.0]),
+                                               TimeSeries(date_times[1:], [5.0, 6.0, 7.0, 8.0]),
+                                               alignment=AlignmentPolicy.OuterForwardFill)
+        self.assertEqual(list(date_times[1:]), list(calculator.df.index))
+        self.assertEqual([2.0, 3.0, 4.0, 4.0], calculator.df["A"].tolist())
+        self.assertEqual((1, 1), (report.only_in_first, report.only_in_second))
+
+
+if __name__ == '__main__':
+    unittest.main()
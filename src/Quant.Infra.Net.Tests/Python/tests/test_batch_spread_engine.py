@@ -0,0 +1,63 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from SpreadCalculator import ResolutionLevel, RegressionEngine, SpreadCalculatorSP500, TimeSeries
+from BatchSpreadEngine import BatchSpreadEngine
+
+
+class TestBatchSpreadEngine(unittest.TestCase):
+
+    def build_panel(self, length=300, symbols=("AAA", "BBB", "CCC", "DDD"), seed=11):
+        rng = np.random.default_rng(seed)
+        common = 100 + np.cumsum(rng.normal(0, 1, length))
+        data = {symbol: (i + 1) * common + rng.normal(0, 2, length) for i, symbol in enumerate(symbols)}
+        return pd.DataFrame(data, index=pd.date_range("2024-01-01", periods=length, freq="D", name="date_time"))
+
+    def expected_frame(self, panel, symbol1, symbol2):
+        calculator = SpreadCalculatorSP500(symbol1, symbol2, ResolutionLevel.Daily,
+                                           regression_engine=RegressionEngine.Vectorized)
+        calculator.update_time_series(TimeSeries(panel.index, panel[symbol1]), TimeSeries(panel.index, panel[symbol2]))
+        calculator.upsert_spread_and_equation()
+        return calculator.df
+
+    def test_all_pairs_match_single_pair_calculator(self):
+        panel = self.build_panel()
+        engine = BatchSpreadEngine.from_calculator(SpreadCalculatorSP500, ResolutionLevel.Daily, max_workers=2,
+                                                   block_size=2, store_series=True, dtype=np.float64)
+        store = engine.run(panel)
+
+        self.assertEqual(6, len(store))
+        self.assertEqual(("AAA", "BBB"), store.pairs()[0])
+        for symbol1, symbol2 in store.pairs():
+            expected = self.expected_frame(panel, symbol1, symbol2)
+            actual = store.to_dataframe(symbol1, symbol2)
+            for column in ["slope", "intercept", "spread"]:
+                np.testing.assert_allclose(actual[column].to_numpy(), expected[column].to_numpy(),
+                                           rtol=1e-9, atol=1e-9, equal_nan=True)
+
+        summary = store.summary()
+        expected = self.expected_frame(panel, "BBB", "DDD")
+        row = summary[(summary.symbol1 == "BBB") & (summary.symbol2 == "DDD")].iloc[0]
+        self.assertAlmostEqual(expected["spread"].iloc[-1], row["spread"], places=9)
+
+    def test_series_written_to_memory_mapped_files(self):
+        panel = self.build_panel()
+        with tempfile.TemporaryDirectory() as output_dir:
+            engine = BatchSpreadEngine(126, max_workers=0, store_series=True, output_dir=output_dir)
+            store = engine.run(panel, pairs=[("CCC", "AAA")])
+            self.assertEqual(np.float32, store.spread.dtype)
+            expected = self.expected_frame(panel, "CCC", "AAA")
+            np.testing.assert_allclose(store.to_dataframe("CCC", "AAA")["spread"].to_numpy(),
+                                       expected["spread"].to_numpy(), rtol=1e-4, atol=1e-3, equal_nan=True)
+            del store
+
+    def test_panel_with_missing_values_is_rejected(self):
+        panel = self.build_panel()
+        panel.iloc[5, 1] = np.nan
+        with self.assertRaises(ValueError):
+            BatchSpreadEngine(126, max_workers=0).run(panel)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from PriceStore import PriceStore
+from SpreadCalculator import ResolutionLevel, RegressionEngine, SpreadCalculatorCrypto, TimeSeries
+from ChunkedSpreadEngine import ChunkedSpreadEngine, iter_array_chunks, align_chunks
+from SyntheticData import generate_cointegrated_pair
+
+
+class TestChunkedSpreadEngine(unittest.TestCase):
+
+    def expected_frame(self, time_series_a, time_series_b, window):
+        calculator = SpreadCalculatorCrypto("A", "B", ResolutionLevel.Daily,
+                                            regression_engine=RegressionEngine.Vectorized)
+        calculator.FixedWindowLength = window
+        calculator.update_time_series(time_series_a, time_series_b)
+        calculator.upsert_spread_and_equation()
+        return calculator.df.dropna(subset=["spread"])
+
+    def test_price_store_chunks_match_in_memory_calculator(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(2000, seed=4, start="2024-03-01 09:30", freq="s")
+        index = pd.DatetimeIndex(time_series_a.date_times).tz_localize("America/New_York")
+        bars_a = pd.DataFrame({"Close": time_series_a.values}, index=index)
+        # symbol2 缺少一部分 bar, 且有一个 NaN 价格
+        bars_b = pd.DataFrame({"Close": time_series_b.values}, index=index).drop(index[500:520])
+        bars_b.iloc[900, 0] = np.nan
+
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root, chunk_rows=300)
+            store.append("AAA", "1s", bars_a.iloc[:1200])
+            store.append("AAA", "1s", bars_a.iloc[1200:])
+            PriceStore(root, chunk_rows=170).append("BBB", "1s", bars_b)
+
+            output = PriceStore(root, chunk_rows=256)
+            engine = ChunkedSpreadEngine(window=150, chunk_rows=64)
+            written = engine.run_price_store(store, "AAA", "BBB", "1s", output)
+            actual = output.load("AAA-BBB", "1s")
+
+        joined = bars_a.join(bars_b, lsuffix="_a", rsuffix="_b", how="inner").dropna()
+        expected = self.expected_frame(TimeSeries(joined.index.tz_localize(None), joined["Close_a"]),
+                                       TimeSeries(joined.index.tz_localize(None), joined["Close_b"]), 150)
+        self.assertEqual(len(expected), written)
+        self.assertEqual(str(index.tz), str(actual.index.tz))
+        self.assertTrue((expected.index == actual.index.tz_localize(None)).all())
+        for column in ["slope", "intercept", "spread"]:
+            np.testing.assert_allclose(actual[column].to_numpy(), expected[column].to_numpy(), rtol=1e-9, atol=1e-9)
+
+    def test_memory_mapped_arrays_and_alignment(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(500, seed=8)
+        date_times = time_series_a.date_times
+        collected = []
+        engine = ChunkedSpreadEngine(window=60, chunk_rows=1000)
+        written = engine.run(iter_array_chunks(date_times, time_series_a.values, time_series_b.values, 37),
+                             lambda *columns: collected.append(columns))
+        self.assertEqual(440, written)
+        self.assertEqual(1, len(collected))
+        expected = self.expected_frame(time_series_a, time_series_b, 60)
+        np.testing.assert_allclose(collected[0][3], expected["spread"].to_numpy(), rtol=1e-9)
+
+        ns = date_times.view(np.int64)
+        aligned = list(align_chunks([(ns[:10], np.arange(10.0)), (ns[10:20], np.arange(10.0, 20.0))],
+                                    [(ns[5:8], np.ones(3)), (ns[8:30:2], np.ones(11))]))
+        joined = np.concatenate([chunk[0] for chunk in aligned])
+        np.testing.assert_array_equal(np.concatenate((ns[5:8], ns[8:20:2])), joined)
+
+
+if __name__ == '__main__':
+    unittest.main()
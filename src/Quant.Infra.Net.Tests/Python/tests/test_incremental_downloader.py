@@ -0,0 +1,111 @@
+import tempfile
+import unittest
+import pandas as pd
+from PriceStore import PriceStore
+from IncrementalDownloader import IncrementalDownloader, FakeDataProvider, split_range
+
+
+class TestIncrementalDownloader(unittest.TestCase):
+
+    def test_only_missing_ranges_are_fetched_in_interval_chunks(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root)
+            provider = FakeDataProvider()
+            downloader = IncrementalDownloader(store, provider, max_workers=3, rate_limit=0)
+
+            report = downloader.download(["AAPL", "MSFT"], "2024-01-01", "2024-01-20", "1m")
+            # 19 天的 1m 数据按 7 天一段切成 3 段
+            self.assertEqual(6, report.requests)
+            self.assertEqual(19 * 24 * 60, report.rows_written["AAPL"])
+
+            provider.calls.clear()
+            report = downloader.download(["AAPL", "MSFT"], "2023-12-30", "2024-01-21", "1m")
+            fetched = sorted((start, end) for symbol, _, start, end in provider.calls if symbol == "AAPL")
+            self.assertEqual([(pd.Timestamp("2023-12-30"), pd.Timestamp("2024-01-01")),
+                              (pd.Timestamp("2024-01-20"), pd.Timestamp("2024-01-21"))], fetched)
+            self.assertEqual(3 * 24 * 60, report.rows_written["MSFT"])
+
+            report = downloader.download(["AAPL"], "2024-01-02", "2024-01-10", "1m")
+            self.assertEqual(0, report.requests)
+
+            loaded = store.load("AAPL", "1m")
+            self.assertTrue(loaded.index.is_monotonic_increasing)
+            self.assertEqual(22 * 24 * 60, len(loaded))
+
+    def test_failed_requests_are_retried(self):
+        with tempfile.TemporaryDirectory() as root:
+            downloader = IncrementalDownloader(PriceStore(root), FakeDataProvider(failures=2), rate_limit=0,
+                                               max_retries=2, backoff=0)
+            report = downloader.download(["AAPL"], "2024-01-01", "2024-02-01", "1d")
+            self.assertEqual(3, report.requests)
+            self.assertEqual([], report.failures)
+            self.assertEqual(31, report.rows_written["AAPL"])
+
+    def test_failed_middle_chunk_is_fetched_again(self):
+        class MiddleChunkFails(FakeDataProvider):
+            failing_start = pd.Timestamp("2024-01-08")
+
+            def fetch(self, symbol, interval, start, end):
+                if start == self.failing_start:
+                    with self._lock:
+                        self.calls.append((symbol, interval, start, end))
+                    raise ConnectionError("Simulated provider failure.")
+                return super().fetch(symbol, interval, start, end)
+
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root)
+            provider = MiddleChunkFails()
+            downloader = IncrementalDownloader(store, provider, rate_limit=0, max_retries=0, backoff=0)
+            report = downloader.download(["AAPL"], "2024-01-01", "2024-01-20", "1m")
+            self.assertEqual(1, len(report.failures))
+            # 失败块之后的数据不写入, 只记录连续的开头部分
+            self.assertEqual(7 * 24 * 60, report.rows_written["AAPL"])
+            self.assertEqual([(pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-08"))],
+                             store.covered_ranges("AAPL", "1m"))
+
+            provider.failing_start = None
+            provider.calls.clear()
+            report = downloader.download(["AAPL"], "2024-01-01", "2024-01-20", "1m")
+            self.assertEqual([], report.failures)
+            self.assertEqual([(pd.Timestamp("2024-01-08"), pd.Timestamp("2024-01-15")),
+                              (pd.Timestamp("2024-01-15"), pd.Timestamp("2024-01-20"))],
+                             sorted((start, end) for _, _, start, end in provider.calls))
+            loaded = store.load("AAPL", "1m")
+            self.assertEqual(19 * 24 * 60, len(loaded))
+            self.assertTrue((loaded.index.to_series().diff().dropna() == pd.Timedelta(minutes=1)).all())
+
+            # 记录的区间之间的空洞也会被补齐
+            store.mark_covered("AAPL", "1m", "2024-02-01", "2024-02-03")
+            self.assertEqual([(pd.Timestamp("2024-01-20"), pd.Timestamp("2024-02-01"))],
+                             downloader.missing_ranges("AAPL", "1m", "2024-01-01", "2024-02-03"))
+
+    def test_interior_gap_is_backfilled(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root)
+            provider = FakeDataProvider()
+            downloader = IncrementalDownloader(store, provider, rate_limit=0)
+            downloader.download(["AAPL"], "2024-01-01", "2024-02-01", "1h")
+            downloader.download(["AAPL"], "2024-04-01", "2024-05-01", "1h")
+
+            provider.calls.clear()
+            report = downloader.download(["AAPL"], "2024-01-01", "2024-06-01", "1h")
+            self.assertEqual([(pd.Timestamp("2024-02-01"), pd.Timestamp("2024-04-01")),
+                              (pd.Timestamp("2024-05-01"), pd.Timestamp("2024-06-01"))],
+                             sorted((start, end) for _, _, start, end in provider.calls))
+            self.assertEqual((60 + 31) * 24, report.rows_written["AAPL"])
+
+            loaded = store.load("AAPL", "1h")
+            expected = pd.date_range("2024-01-01", "2024-06-01", freq="h", inclusive="left")
+            self.assertTrue(loaded.index.equals(expected.as_unit("ns").rename(loaded.index.name)))
+            self.assertEqual([], downloader.missing_ranges("AAPL", "1h", "2024-01-01", "2024-06-01"))
+
+    def test_split_range_respects_interval_limits(self):
+        start, end = pd.Timestamp("2024-01-01"), pd.Timestamp("2024-06-01")
+        self.assertEqual([(start, end)], split_range(start, end, "1d"))
+        chunks = split_range(start, end, "5m")
+        self.assertEqual(3, len(chunks))
+        self.assertEqual(end, chunks[-1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import numpy as np
+import pandas as pd
+from MultiTimeframeSpread import MultiTimeframeSpreadCalculator, bucket_starts
+from SpreadCalculator import ResolutionLevel, RegressionEngine, SpreadCalculatorCrypto, TimeSeries
+from SyntheticData import generate_cointegrated_pair
+
+
+class TestMultiTimeframeSpread(unittest.TestCase):
+
+    def build_multi(self):
+        multi = MultiTimeframeSpreadCalculator("A", "B", ResolutionLevel.Minute,
+                                               [ResolutionLevel.Hourly, ResolutionLevel.Minute])
+        multi[ResolutionLevel.Minute].FixedWindowLength = 120
+        multi[ResolutionLevel.Hourly].FixedWindowLength = 10
+        return multi
+
+    def bulk_spread(self, date_times, values_a, values_b, window):
+        calculator = SpreadCalculatorCrypto("A", "B", ResolutionLevel.Daily,
+                                            regression_engine=RegressionEngine.Vectorized)
+        calculator.FixedWindowLength = window
+        calculator.update_time_series(TimeSeries(date_times, values_a), TimeSeries(date_times, values_b))
+        calculator.upsert_spread_and_equation()
+        return calculator.df
+
+    def test_single_pass_matches_resampled_calculators(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(3000, seed=4, freq="min", start="2024-01-01 00:17")
+        multi = self.build_multi()
+        # 分批和逐个 bar 混合输入, 覆盖 bar 跨批次的情况
+        for begin, end in [(0, 7), (7, 700), (700, 1333), (1333, 2990)]:
+            multi.update_time_series(time_series_a[begin:end], time_series_b[begin:end])
+        for element_a, element_b in zip(time_series_a[2990:], time_series_b[2990:]):
+            multi.update_time_series_element(element_a, element_b)
+
+        open_bar = multi.open_bar(ResolutionLevel.Hourly)
+        last_hour = pd.Series(time_series_a.values, index=time_series_a.date_times)["2024-01-03 02:00":]
+        self.assertEqual([last_hour.iloc[0], last_hour.max(), last_hour.min(), last_hour.iloc[-1]],
+                         open_bar.loc["A"].tolist())
+        multi.flush()
+        self.assertIsNone(multi.open_bar(ResolutionLevel.Hourly))
+
+        frame = pd.DataFrame({"A": time_series_a.values, "B": time_series_b.values}, index=time_series_a.date_times)
+        hourly = frame.resample("h").last()
+        expected_hourly = self.bulk_spread(hourly.index, hourly["A"].to_numpy(), hourly["B"].to_numpy(), 10)
+        expected_minute = self.bulk_spread(frame.index, frame["A"].to_numpy(), frame["B"].to_numpy(), 120)
+        for resolution, expected in ((ResolutionLevel.Hourly, expected_hourly),
+                                     (ResolutionLevel.Minute, expected_minute)):
+            actual = multi.df(resolution)
+            np.testing.assert_array_equal(expected.index.to_numpy(), actual.index.to_numpy())
+            for column in ["A", "B", "slope", "intercept", "spread"]:
+                np.testing.assert_allclose(expected[column].to_numpy(), actual[column].to_numpy(),
+                                           rtol=1e-7, atol=1e-9, equal_nan=True)
+        self.assertEqual(51, len(multi.df(ResolutionLevel.Hourly)))
+
+    def test_bucket_starts_match_pandas(self):
+        date_times = pd.date_range("2023-12-20", periods=500, freq="37h").as_unit("ns")
+        cases = {ResolutionLevel.Hourly: date_times.floor("h"), ResolutionLevel.Daily: date_times.floor("D"),
+                 ResolutionLevel.Weekly: date_times.to_period("W-SUN").start_time,
+                 ResolutionLevel.Monthly: date_times.to_period("M").start_time}
+        for resolution, expected in cases.items():
+            np.testing.assert_array_equal(expected.as_unit("ns").asi8, bucket_starts(date_times.asi8, resolution))
+
+    def test_rejects_finer_resolution_and_out_of_order_rows(self):
+        with self.assertRaises(ValueError):
+            MultiTimeframeSpreadCalculator("A", "B", ResolutionLevel.Hourly, [ResolutionLevel.Minute])
+        multi = self.build_multi()
+        time_series_a, time_series_b = generate_cointegrated_pair(10, seed=1, freq="min")
+        multi.update_time_series(time_series_a, time_series_b)
+        with self.assertRaises(ValueError):
+            multi.update_time_series(time_series_a[5:], time_series_b[5:])
+
+    def test_bars_follow_the_input_timezone(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(24 * 12, seed=6, freq="h", start="2024-03-04")
+        date_times = pd.date_range("2024-03-04 05:00", periods=24 * 12, freq="h", tz="UTC").tz_convert(
+            "America/New_York").as_unit("ns")
+        time_series_a = TimeSeries(date_times, time_series_a.values)
+        time_series_b = TimeSeries(date_times, time_series_b.values)
+        multi = MultiTimeframeSpreadCalculator("A", "B", ResolutionLevel.Hourly, [ResolutionLevel.Daily])
+        multi[ResolutionLevel.Daily].FixedWindowLength = 3
+        multi.update_time_series(time_series_a, time_series_b)
+        multi.flush()
+
+        # 包含夏令时切换 (2024-03-10), 每天仍从纽约时间零点开始
+        frame = pd.DataFrame({"A": time_series_a.values, "B": time_series_b.values}, index=date_times)
+        daily = frame.resample("D").last()
+        actual = multi.df(ResolutionLevel.Daily)
+        self.assertEqual("America/New_York", str(actual.index.tz))
+        self.assertTrue((daily.index == actual.index).all())
+        np.testing.assert_array_equal(daily["A"].to_numpy(), actual["A"].to_numpy())
+
+        explicit = bucket_starts(date_times.asi8, ResolutionLevel.Daily, "America/New_York")
+        np.testing.assert_array_equal(date_times.floor("D", ambiguous=True, nonexistent="shift_forward").asi8,
+                                      explicit)
+
+    def test_rows_inside_flushed_bar_are_rejected_before_any_update(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(90, seed=2, freq="min")
+        multi = self.build_multi()
+        multi.update_time_series(time_series_a[:70], time_series_b[:70])
+        multi.flush()
+        base_rows = len(multi.df(ResolutionLevel.Minute))
+        with self.assertRaises(ValueError):
+            multi.update_time_series(time_series_a[70:], time_series_b[70:])
+        self.assertEqual(base_rows, len(multi.df(ResolutionLevel.Minute)))
+        self.assertEqual(2, len(multi.df(ResolutionLevel.Hourly)))
+
+
+if __name__ == '__main__':
+    unittest.main()
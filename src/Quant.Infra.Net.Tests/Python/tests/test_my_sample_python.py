@@ -0,0 +1,58 @@
+import unittest
+from types import SimpleNamespace
+import numpy as np
+import MySamplePython
+from RollingOls import ols_regression_batch, ols_regression_segments
+
+
+class TestMySamplePython(unittest.TestCase):
+
+    def build_requests(self, lengths, seed=11):
+        rng = np.random.default_rng(seed)
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        series_b = 100.0 + np.cumsum(rng.normal(0.0, 1.0, offsets[-1]))
+        series_a = 1.5 * series_b + 10.0 + rng.normal(0.0, 1.0, offsets[-1])
+        return series_a, series_b, offsets
+
+    def test_segments_match_per_window_regression(self):
+        lengths = [5, 250, 2, 1, 0, 40]
+        series_a, series_b, offsets = self.build_requests(lengths)
+        series_b[offsets[5]:offsets[6]] = 3.0  # x 为常数的窗口
+        slopes, intercepts = ols_regression_segments(series_a, series_b, offsets)
+        for i, length in enumerate(lengths):
+            if length < 2:
+                self.assertTrue(np.isnan(slopes[i]) and np.isnan(intercepts[i]))
+                continue
+            expected = ols_regression_batch(series_a[offsets[i]:offsets[i + 1]], series_b[offsets[i]:offsets[i + 1]])
+            np.testing.assert_allclose(expected, (slopes[i], intercepts[i]), rtol=1e-9, atol=1e-9)
+        with self.assertRaises(ValueError):
+            ols_regression_segments(series_a, series_b, offsets[::-1])
+
+    def test_buffers_match_per_call_entry_point(self):
+        series_a, series_b, offsets = self.build_requests([30, 60, 45])
+        output = bytearray(6 * 8)
+        count = MySamplePython.ols_regression_buffers(memoryview(series_a), series_b.tobytes(), offsets, output)
+        self.assertEqual(3, count)
+        result = np.frombuffer(output).reshape(3, 2)
+        for i in range(3):
+            data = SimpleNamespace(SeriesA=series_a[offsets[i]:offsets[i + 1]].tolist(),
+                                   SeriesB=series_b[offsets[i]:offsets[i + 1]].tolist())
+            response = MySamplePython.ols_regression(data)
+            np.testing.assert_allclose([response["a"], response["constant"]], result[i], rtol=1e-9)
+
+        # 以地址传入 (与 .NET 固定数组的 AddrOfPinnedObject 相同), 不复制
+        by_address = np.full(6, np.nan)
+        MySamplePython.ols_regression_buffers(series_a.ctypes.data, series_b.ctypes.data, offsets.ctypes.data,
+                                              by_address.ctypes.data, count=3)
+        np.testing.assert_array_equal(result.ravel(), by_address)
+
+    def test_rejects_read_only_or_short_output(self):
+        series_a, series_b, offsets = self.build_requests([10, 10])
+        with self.assertRaises(ValueError):
+            MySamplePython.ols_regression_buffers(series_a, series_b, offsets, bytes(32))
+        with self.assertRaises(ValueError):
+            MySamplePython.ols_regression_buffers(series_a, series_b, offsets, np.empty(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
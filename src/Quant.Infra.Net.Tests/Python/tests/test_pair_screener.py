@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.stattools import coint
+from PairScreener import PairScreener, correlation_candidates, engle_granger_block
+from SpreadCalculator import ResolutionLevel, RegressionEngine, SpreadCalculatorSP500
+
+
+class TestPairScreener(unittest.TestCase):
+
+    def build_panel(self, length=400, seed=5):
+        rng = np.random.default_rng(seed)
+        common = 100 + np.cumsum(rng.normal(0, 1, length))
+        data = {
+            "AAA": common + rng.normal(0, 1, length),
+            "BBB": 2 * common + 5 + rng.normal(0, 1, length),
+            "CCC": 0.5 * common + np.cumsum(rng.normal(0, 1, length)),
+            "DDD": 100 + np.cumsum(rng.normal(0, 1, length)),
+        }
+        return pd.DataFrame(data, index=pd.date_range("2023-01-01", periods=length, freq="D", name="date_time"))
+
+    def test_engle_granger_block_matches_statsmodels(self):
+        panel = self.build_panel()
+        values = panel.to_numpy()
+        pairs = np.array([[0, 1], [1, 0], [2, 0], [3, 1]])
+        for lags in (0, 2):
+            _, _, statistic, _ = engle_granger_block(values, pairs, lags)
+            expected = [coint(values[:, i], values[:, j], maxlag=lags, autolag=None)[0] for i, j in pairs]
+            np.testing.assert_allclose(statistic, expected, rtol=1e-9)
+
+    def test_negatively_correlated_pairs_are_candidates(self):
+        panel = self.build_panel()
+        panel["EEE"] = 500 - 1.5 * panel["AAA"] + np.random.default_rng(9).normal(0, 1, len(panel))
+        pair_index, correlations = correlation_candidates(panel.to_numpy(), 0.8)
+        symbols = list(panel.columns)
+        found = {(symbols[i], symbols[j]): correlation for (i, j), correlation in zip(pair_index, correlations)}
+        self.assertLess(found[("AAA", "EEE")], -0.8)
+
+        pairs = PairScreener(min_correlation=0.8, lags=1, max_workers=0).screen(panel)
+        hedged = [pair for pair in pairs if {pair.symbol1, pair.symbol2} == {"AAA", "EEE"}]
+        self.assertEqual(1, len(hedged))
+        self.assertLess(hedged[0].slope, 0)
+
+    def test_screen_ranks_cointegrated_pairs_and_creates_calculators(self):
+        panel = self.build_panel()
+        screener = PairScreener(min_correlation=0.5, max_pvalue=0.05, lags=1, max_workers=2, block_size=1)
+        pairs = screener.screen(panel)
+
+        self.assertEqual({"AAA", "BBB"}, {pairs[0].symbol1, pairs[0].symbol2})
+        self.assertTrue(all(pair.pvalue <= 0.05 for pair in pairs))
+        self.assertEqual(sorted(pair.pvalue for pair in pairs), [pair.pvalue for pair in pairs])
+        self.assertNotIn("DDD", {pair.symbol1 for pair in pairs} | {pair.symbol2 for pair in pairs})
+        expected = coint(panel[pairs[0].symbol1], panel[pairs[0].symbol2], maxlag=1, autolag=None)
+        self.assertAlmostEqual(expected[1], pairs[0].pvalue, places=9)
+
+        # 单进程结果相同
+        single = PairScreener(min_correlation=0.5, lags=1, max_workers=1).screen(panel)
+        self.assertEqual([(p.symbol1, p.symbol2) for p in pairs], [(p.symbol1, p.symbol2) for p in single])
+
+        frame = PairScreener.to_dataframe(pairs)
+        self.assertEqual(len(pairs), len(frame))
+        calculators = PairScreener.create_calculators(pairs, SpreadCalculatorSP500, ResolutionLevel.Daily,
+                                                      regression_engine=RegressionEngine.Vectorized)
+        self.assertEqual((pairs[0].symbol1, pairs[0].symbol2), (calculators[0].symbol1, calculators[0].symbol2))
+        self.assertEqual(RegressionEngine.Vectorized, calculators[0].regression_engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import numpy as np
+from PipelineStats import PipelineStats
+from SpreadCalculator import ResolutionLevel, RegressionEngine, SpreadCalculatorCrypto
+from SyntheticData import generate_cointegrated_pair
+
+
+class TestPipelineStats(unittest.TestCase):
+
+    def build_calculator(self, stats=None, **kwargs):
+        calculator = SpreadCalculatorCrypto("A", "B", ResolutionLevel.Daily, stats=stats, **kwargs)
+        calculator.FixedWindowLength = 30
+        return calculator
+
+    def test_bulk_path_stages_and_counters(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(200, seed=1)
+        calls = []
+        stats = PipelineStats(callback=lambda stage, seconds, rows: calls.append((stage, rows)))
+        calculator = self.build_calculator(stats)
+        calculator.update_time_series(time_series_a, time_series_b)
+        calculator.upsert_spread_and_equation()
+
+        for stage in ["update_time_series.convert", "update_time_series.align", "update_time_series.frame",
+                      "upsert.regression", "upsert.write", "ols_regression"]:
+            self.assertIn(stage, stats.stages)
+        self.assertEqual(170, stats.counters["regressions"])
+        self.assertEqual(170, stats.stages["ols_regression"].calls)
+        self.assertEqual(200, stats.counters["rows_processed"])
+        self.assertIn(("upsert.regression", 200), calls)
+        self.assertEqual(sum(stage.calls for stage in stats.stages.values()), len(calls))
+        self.assertIn("upsert.regression", str(stats))
+        self.assertEqual(170, stats.to_dict()["stages"]["ols_regression"]["calls"])
+
+        vectorized = PipelineStats()
+        calculator = self.build_calculator(vectorized, regression_engine=RegressionEngine.Vectorized)
+        calculator.update_time_series(time_series_a, time_series_b)
+        calculator.upsert_spread_and_equation()
+        self.assertEqual(170, vectorized.counters["regressions"])
+        self.assertNotIn("ols_regression", vectorized.stages)
+
+    def test_element_paths_count_reallocations(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(80, seed=2)
+        frame_stats, stream_stats = PipelineStats(), PipelineStats()
+        frame = self.build_calculator(frame_stats)
+        streaming = self.build_calculator(stream_stats, streaming=True)
+        for element_a, element_b in zip(time_series_a, time_series_b):
+            frame.update_time_series_element(element_a, element_b)
+            streaming.update_time_series_element(element_a, element_b)
+
+        # DataFrame 实现每个 bar 都要 concat + dropna, 流式实现只在访问 df 时物化一次
+        self.assertEqual(160, frame_stats.counters["frame_reallocations"])
+        self.assertEqual(50, frame_stats.counters["regressions"])
+        self.assertEqual(80, frame_stats.stages["element.frame_update"].calls)
+        self.assertEqual(50, stream_stats.counters["regressions"])
+        self.assertNotIn("frame_reallocations", stream_stats.counters)
+        np.testing.assert_allclose(frame.df["spread"].to_numpy(), streaming.df["spread"].to_numpy(),
+                                   rtol=1e-8, equal_nan=True)
+        self.assertEqual(1, stream_stats.counters["frame_reallocations"])
+        self.assertEqual(80, stream_stats.stages["element.streaming"].calls)
+
+        stream_stats.reset()
+        self.assertEqual({"stages": {}, "counters": {}}, stream_stats.to_dict())
+
+    def test_disabled_stats_leave_results_unchanged(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(120, seed=3)
+        plain = self.build_calculator()
+        profiled = self.build_calculator(PipelineStats())
+        for calculator in (plain, profiled):
+            calculator.update_time_series(time_series_a, time_series_b)
+            calculator.upsert_spread_and_equation()
+        self.assertIsNone(plain.stats)
+        np.testing.assert_array_equal(plain.df["spread"].to_numpy(), profiled.df["spread"].to_numpy())
+
+
+if __name__ == '__main__':
+    unittest.main()
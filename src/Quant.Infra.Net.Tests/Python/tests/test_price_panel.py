@@ -0,0 +1,88 @@
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from PricePanel import PricePanel, build_price_panel, read_symbol_csv
+from SpreadCalculator import ResolutionLevel, SpreadCalculatorSP500
+
+
+class TestPricePanel(unittest.TestCase):
+
+    def write_symbol(self, folder, symbol, date_times, close):
+        frame = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Adj Close": close,
+                              "Volume": 100}, index=pd.Index(date_times, name="Date"))
+        frame.to_csv(os.path.join(folder, f"{symbol}.csv"))
+
+    def build_folder(self, folder):
+        days = pd.date_range("2024-01-01", periods=10, freq="D").as_unit("ns")
+        self.write_symbol(folder, "AAA", days, np.arange(10.0))
+        self.write_symbol(folder, "BBB", days[2:], np.arange(8.0) + 100)
+        # 乱序、重复时间和无效价格
+        self.write_symbol(folder, "CCC", days[[9, 0, 1, 1, 5]], ["9", "0", "1", "1.5", "bad"])
+        return days
+
+    def test_outer_and_inner_panels(self):
+        with tempfile.TemporaryDirectory() as folder:
+            days = self.build_folder(folder)
+            panel = build_price_panel(folder, os.path.join(folder, "panel"), max_workers=0)
+            self.assertEqual(["AAA", "BBB", "CCC"], panel.symbols)
+            self.assertIsInstance(panel.values, np.memmap)
+            np.testing.assert_array_equal(days.asi8, panel.date_times)
+            np.testing.assert_array_equal(np.arange(10.0), panel.column("AAA"))
+            self.assertTrue(np.isnan(panel.column("BBB")[:2]).all())
+            np.testing.assert_array_equal([0.0, 1.5, 9.0], panel.column("CCC")[[0, 1, 9]])
+            self.assertEqual(3, np.count_nonzero(~np.isnan(panel.column("CCC"))))
+
+            filled = build_price_panel(folder, os.path.join(folder, "filled"), fill=True, max_workers=0)
+            np.testing.assert_array_equal([0.0, 1.5, 1.5, 1.5], filled.column("CCC")[:4])
+
+            inner = build_price_panel(folder, os.path.join(folder, "inner"), how="inner", max_workers=0)
+            np.testing.assert_array_equal(days[[9]].asi8, inner.date_times)
+            self.assertFalse(np.isnan(inner.to_dataframe().to_numpy()).any())
+
+    def test_process_pool_matches_and_panel_reattaches(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.build_folder(folder)
+            local = build_price_panel(folder, os.path.join(folder, "local"), max_workers=0)
+            pooled = build_price_panel(folder, os.path.join(folder, "pooled"), max_workers=2)
+            np.testing.assert_array_equal(local.values, pooled.values)
+
+            # 传给其它进程时按目录重新映射, 不携带数据
+            reopened = pickle.loads(pickle.dumps(pooled))
+            self.assertLess(len(pickle.dumps(pooled)), 500)
+            self.assertIsInstance(reopened.values, np.memmap)
+            pd.testing.assert_frame_equal(pooled.to_dataframe(["BBB", "AAA"]), reopened.to_dataframe(["BBB", "AAA"]))
+
+            calculator = SpreadCalculatorSP500("AAA", "BBB", ResolutionLevel.Daily)
+            calculator.update_time_series(pooled.time_series("AAA")[2:], pooled.time_series("BBB"))
+            self.assertEqual(8, len(calculator.df))
+
+    def test_rebuild_replaces_panel_without_touching_open_readers(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.build_folder(folder)
+            directory = os.path.join(folder, "panel")
+            old = build_price_panel(folder, directory, symbols=["AAA"], max_workers=0)
+            new = build_price_panel(folder, directory, symbols=["AAA", "BBB"], max_workers=0)
+            # 已打开的旧面板仍然可读, 新打开的是完整的新面板
+            np.testing.assert_array_equal(np.arange(10.0), old.column("AAA"))
+            self.assertEqual(["AAA", "BBB"], PricePanel.open(directory).symbols)
+            self.assertEqual((10, 2), new.values.shape)
+            self.assertEqual(3, len(os.listdir(directory)))
+
+    def test_utc_offsets_are_converted(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "AAA.csv")
+            with open(path, "w") as file:
+                file.write("Datetime,Close\n2024-01-02 09:30:00-05:00,1\n2024-07-02 09:30:00-04:00,2\n")
+            date_times, values, has_offset = read_symbol_csv(path)
+            self.assertTrue(has_offset)
+            np.testing.assert_array_equal(
+                pd.DatetimeIndex(["2024-01-02 14:30", "2024-07-02 13:30"]).as_unit("ns").asi8, date_times)
+            panel = build_price_panel(folder, os.path.join(folder, "panel"), max_workers=0)
+            self.assertEqual("UTC", str(panel.index.tz))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from PriceStore import PriceStore
+
+
+class TestPriceStore(unittest.TestCase):
+
+    def build_bars(self, start, periods, freq="h", tz=None):
+        date_times = pd.date_range(start, periods=periods, freq=freq, tz=tz)
+        close = np.arange(periods, dtype=float) + 100
+        return pd.DataFrame({"Open": close - 0.5, "Close": close, "Volume": np.full(periods, 10.0)},
+                            index=date_times)
+
+    def test_incremental_append_and_sliced_load(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root, chunk_rows=100)
+            bars = self.build_bars("2024-01-01", 250)
+
+            self.assertEqual(120, store.append("AAPL", "1h", bars.iloc[:120]))
+            # 重叠部分不会重复写入
+            self.assertEqual(130, store.append("AAPL", "1h", bars.iloc[100:]))
+            self.assertEqual(0, store.append("AAPL", "1h", bars.iloc[50:60]))
+            # 早于现有数据的 bar 写成新的 chunk
+            earlier = self.build_bars("2023-12-31", 5)
+            self.assertEqual(5, store.append("AAPL", "1h", earlier))
+
+            index = store.read_index("AAPL", "1h")
+            self.assertEqual([5, 100, 100, 50], [chunk["rows"] for chunk in index["chunks"]])
+            self.assertEqual((earlier.index[0], bars.index[-1]), store.date_range("AAPL", "1h"))
+
+            loaded = store.load("AAPL", "1h")
+            expected = pd.concat([earlier, bars])
+            np.testing.assert_array_equal(expected["Close"].to_numpy(), loaded["Close"].to_numpy())
+            self.assertTrue((expected.index == loaded.index).all())
+
+            # 只落在一个 chunk 内的切片直接返回内存映射, 不复制
+            date_times, values = store.load_arrays("AAPL", "1h", bars.index[110], bars.index[150], ["Close"])
+            self.assertEqual(41, len(date_times))
+            self.assertIsInstance(values["Close"].base, np.memmap)
+
+            time_series = store.load_time_series("AAPL", "1h", start=bars.index[180], end=bars.index[220])
+            self.assertEqual(41, len(time_series))
+            self.assertEqual(bars["Close"].iloc[180], time_series[0].value)
+
+    def test_interior_rows_are_inserted_between_and_merged_into_chunks(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root, chunk_rows=100)
+            bars = self.build_bars("2024-01-01", 300)
+            store.append("AAPL", "1h", bars.iloc[:100])
+            store.append("AAPL", "1h", bars.iloc[200:])
+            self.assertEqual([(bars.index[0], bars.index[99]), (bars.index[200], bars.index[-1])],
+                             store.bar_ranges("AAPL", "1h", pd.Timedelta(hours=1)))
+
+            # 两个 chunk 之间的行写成新的 chunk, chunk 内部缺失的行合并进该 chunk
+            self.assertEqual(80, store.append("AAPL", "1h", bars.iloc[110:190]))
+            gapped = bars.drop(bars.index[[250, 251]])
+            store.append("BBB", "1h", gapped)
+            self.assertEqual(2, store.append("BBB", "1h", bars.iloc[240:260]))
+            loaded = store.load("BBB", "1h")
+            np.testing.assert_array_equal(bars["Open"].to_numpy(), loaded["Open"].to_numpy())
+            self.assertTrue((bars.index == loaded.index).all())
+
+            self.assertEqual(20, store.append("AAPL", "1h", bars.iloc[95:205]))
+            self.assertEqual([(bars.index[0], bars.index[-1])], store.bar_ranges("AAPL", "1h", pd.Timedelta(hours=1)))
+            loaded = store.load("AAPL", "1h")
+            np.testing.assert_array_equal(bars["Close"].to_numpy(), loaded["Close"].to_numpy())
+            self.assertTrue((bars.index == loaded.index).all())
+
+    def test_timezone_aware_bars_round_trip(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root)
+            bars = self.build_bars("2024-03-01 09:30", 10, tz="America/New_York")
+            store.append("MSFT", "1h", bars)
+
+            loaded = store.load("MSFT", "1h", start=pd.Timestamp("2024-03-01 12:00"))
+            self.assertEqual(str(bars.index.tz), str(loaded.index.tz))
+            self.assertEqual(bars.index[3], loaded.index[0])
+
+    def test_failed_chunk_removal_is_raised_after_index_is_written(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = PriceStore(root, chunk_rows=100)
+            bars = self.build_bars("2024-01-01", 50)
+            store.append("AAPL", "1h", bars.iloc[:30])
+
+            # 例如 Windows 下仍被内存映射的 chunk
+            with mock.patch("os.rmdir", side_effect=PermissionError("in use")):
+                with self.assertRaises(OSError) as context:
+                    store.append("AAPL", "1h", bars.iloc[30:])
+            self.assertIn("000000", str(context.exception))
+            # 新 chunk 与索引已写入
+            loaded = store.load("AAPL", "1h")
+            np.testing.assert_array_equal(bars["Close"].to_numpy(), loaded["Close"].to_numpy())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import unittest
+import numpy as np
+import pandas as pd
+from SpreadCalculator import TimeSeriesElement, ResolutionLevel, RegressionEngine, SpreadCalculatorSP500
+import statsmodels.api as sm
+from RollingOls import rolling_ols, ols_regression_batch, RollingOlsWindow
+
+
+class TestRollingOls(unittest.TestCase):
+
+    def build_time_series(self, length, seed=7):
+        """
+        生成一对协整的价格序列。
+        :return: (time_series1, time_series2) as lists of TimeSeriesElement
+        """
+        rng = np.random.default_rng(seed)
+        series_b = 50 + np.cumsum(rng.normal(0, 0.5, length))
+        series_a = 3 + 1.7 * series_b + rng.normal(0, 0.8, length)
+        date_times = pd.date_range("2024-01-01", periods=length, freq="D")
+        time_series1 = [TimeSeriesElement(dt, v) for dt, v in zip(date_times, series_a)]
+        time_series2 = [TimeSeriesElement(dt, v) for dt, v in zip(date_times, series_b)]
+        return time_series1, time_series2
+
+    def test_vectorized_engine_matches_per_window_engine(self):
+        time_series1, time_series2 = self.build_time_series(400)
+
+        expected = SpreadCalculatorSP500("A", "B", ResolutionLevel.Daily)
+        expected.update_time_series(time_series1, time_series2)
+        expected.upsert_spread_and_equation()
+
+        actual = SpreadCalculatorSP500("A", "B", ResolutionLevel.Daily, regression_engine=RegressionEngine.Vectorized)
+        actual.update_time_series(time_series1, time_series2)
+        actual.upsert_spread_and_equation()
+
+        self.assertEqual(list(expected.df.columns), list(actual.df.columns))
+        for column in ["slope", "intercept", "spread"]:
+            np.testing.assert_allclose(actual.df[column].to_numpy(), expected.df[column].to_numpy(),
+                                       rtol=1e-9, atol=1e-9, equal_nan=True)
+        self.assertTrue(expected.df["equation"].isna().equals(actual.df["equation"].isna()))
+        # 旧名称仍指向逐窗口实现
+        self.assertIs(RegressionEngine.PerWindow, RegressionEngine.StatsModels)
+        self.assertIs(RegressionEngine.PerWindow, RegressionEngine("statsmodels"))
+
+    def test_rolling_ols_constant_window_uses_minimum_norm_solution(self):
+        series_b = np.full(10, 2.0)
+        series_a = np.arange(10, dtype=float)
+        slope, intercept = rolling_ols(series_a, series_b, 4)
+
+        self.assertTrue(np.isnan(slope[:4]).all())
+        # statsmodels 的 pinv 解: (1, c) * mean(y) / (1 + c²)
+        mean_a = series_a[2:6].mean()
+        self.assertAlmostEqual(slope[6], mean_a * 2.0 / 5.0)
+        self.assertAlmostEqual(intercept[6], mean_a / 5.0)
+
+    def test_rolling_ols_keeps_precision_on_long_drifting_series(self):
+        rng = np.random.default_rng(11)
+        series_b = 1000 + np.cumsum(rng.normal(0, 1, 200_000))
+        series_a = 2 * series_b + 5 + rng.normal(0, 1, 200_000)
+        slope, intercept = rolling_ols(np.column_stack((series_a, series_a)), np.column_stack((series_b, series_b)),
+                                       126)
+        np.testing.assert_array_equal(slope[:, 0], slope[:, 1])
+
+        # 序列末尾的窗口离全局均值最远
+        for row in [126, 1023 + 126, 1024 * 4 + 126, 199_999]:
+            expected_slope, expected_intercept = ols_regression_batch(series_a[row - 126:row],
+                                                                      series_b[row - 126:row])
+            self.assertAlmostEqual(1.0, slope[row, 0] / expected_slope, places=10)
+            self.assertAlmostEqual(1.0, intercept[row, 0] / expected_intercept, places=8)
+
+    def test_ols_regression_batch_matches_statsmodels(self):
+        rng = np.random.default_rng(5)
+        series_b = 20 + np.cumsum(rng.normal(0, 1, (8, 50)), axis=1)
+        series_a = 4 - 0.5 * series_b + rng.normal(0, 1, (8, 50))
+        slopes, intercepts = ols_regression_batch(series_a, series_b)
+
+        for i in range(8):
+            params = sm.OLS(series_a[i], sm.add_constant(series_b[i])).fit().params
+            self.assertAlmostEqual(params[1], slopes[i], places=10)
+            self.assertAlmostEqual(params[0], intercepts[i], places=9)
+
+        calculator = SpreadCalculatorSP500("A", "B")
+        self.assertEqual({"slope": slopes[3], "intercept": intercepts[3]},
+                         calculator.ols_regression(list(series_a[3]), list(series_b[3])))
+        with self.assertRaises(ValueError):
+            calculator.ols_regression(["1", "2"], [1.0, 2.0])
+
+    def test_rolling_ols_window_matches_rolling_ols(self):
+        rng = np.random.default_rng(3)
+        series_b = 100 + np.cumsum(rng.normal(0, 1, 300))
+        series_a = 2 * series_b + rng.normal(0, 1, 300)
+        expected_slope, expected_intercept = rolling_ols(series_a, series_b, 20)
+
+        window = RollingOlsWindow(20)
+        for i in range(299):
+            window.push(series_b[i], series_a[i])
+            if i + 1 >= 20:
+                slope, intercept = window.regression()
+                self.assertAlmostEqual(slope, expected_slope[i + 1], places=9)
+                self.assertAlmostEqual(intercept, expected_intercept[i + 1], places=7)
+
+    def test_regress_chunk_matches_rolling_ols_for_any_chunking(self):
+        rng = np.random.default_rng(5)
+        series_b = 100 + np.cumsum(rng.normal(0, 1, 1000))
+        series_a = 2 * series_b + rng.normal(0, 1, 1000)
+        expected_slope, expected_intercept = rolling_ols(series_a, series_b, 40)
+
+        window = RollingOlsWindow(40)
+        bounds = np.concatenate(([0], np.sort(rng.integers(0, 1000, 30)), [1000]))
+        results = [window.regress_chunk(series_b[start:stop], series_a[start:stop])
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        slope = np.concatenate([slope for slope, _ in results])
+        intercept = np.concatenate([intercept for _, intercept in results])
+        np.testing.assert_allclose(slope, expected_slope, rtol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(intercept, expected_intercept, rtol=1e-8, equal_nan=True)
+        # 之后仍可逐点更新
+        np.testing.assert_allclose(window.regression(), ols_regression_batch(series_a[-40:], series_b[-40:]))
+
+    def test_streaming_update_matches_dataframe_path(self):
+        time_series1, time_series2 = self.build_time_series(60)
+
+        expected = SpreadCalculatorSP500("A", "B", ResolutionLevel.Daily)
+        actual = SpreadCalculatorSP500("A", "B", ResolutionLevel.Daily, streaming=True, capacity=16)
+        for calculator in (expected, actual):
+            calculator.FixedWindowLength = 10
+            calculator.update_time_series(time_series1[:30], time_series2[:30])
+            for elm1, elm2 in zip(time_series1[30:], time_series2[30:]):
+                calculator.update_time_series_element(elm1, elm2)
+            # 同一时间戳的重复 bar 只更新价格
+            calculator.update_time_series_element(TimeSeriesElement(time_series1[-1].date_time, 1.0),
+                                                  TimeSeriesElement(time_series2[-1].date_time, 2.0))
+
+        self.assertEqual(len(expected.df), len(actual.df))
+        self.assertTrue((expected.df.index == actual.df.index).all())
+        for column in ["A", "B", "slope", "intercept", "spread"]:
+            np.testing.assert_allclose(actual.df[column].to_numpy(dtype=float),
+                                       expected.df[column].to_numpy(dtype=float),
+                                       rtol=1e-9, atol=1e-9, equal_nan=True)
+        self.assertEqual(expected.df["equation"].iloc[-1], actual.df["equation"].iloc[-1])
+
+    def test_streaming_update_keeps_timezone_and_accepts_out_of_order_bar(self):
+        time_series1, time_series2 = ([TimeSeriesElement(elm.date_time.tz_localize("America/New_York"), elm.value)
+                                       for elm in series] for series in self.build_time_series(40))
+        late1, late2 = time_series1.pop(25), time_series2.pop(25)
+
+        for seeded in (True, False):
+            calculator = SpreadCalculatorSP500("A", "B", ResolutionLevel.Daily, streaming=True)
+            calculator.FixedWindowLength = 10
+            begin = 20 if seeded else 0
+            if seeded:
+                calculator.update_time_series(time_series1[:begin], time_series2[:begin])
+            for elm1, elm2 in zip(time_series1[begin:], time_series2[begin:]):
+                calculator.update_time_series_element(elm1, elm2)
+            self.assertEqual("America/New_York", str(calculator.df.index.tz))
+
+            # 乱序的 bar 退回到 DataFrame 实现
+            calculator.update_time_series_element(late1, late2)
+            self.assertEqual(40, len(calculator.df))
+            self.assertEqual("America/New_York", str(calculator.df.index.tz))
+            self.assertEqual(late1.value, calculator.df.at[late1.date_time, "A"])
+
+
+if __name__ == '__main__':
+    unittest.main()
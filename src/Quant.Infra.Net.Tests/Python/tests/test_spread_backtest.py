@@ -0,0 +1,91 @@
+import unittest
+import numpy as np
+from SpreadBacktest import METRICS, SpreadBacktest, grid_positions
+from SpreadCalculator import ResolutionLevel, RegressionEngine, SpreadCalculatorCrypto
+from SpreadSignals import SignalSettings, band_signal, rolling_zscore
+from SyntheticData import generate_cointegrated_pair
+
+
+class TestSpreadBacktest(unittest.TestCase):
+
+    def build_calculator(self, length=600):
+        time_series_a, time_series_b = generate_cointegrated_pair(length, seed=8, half_life=6.0)
+        calculator = SpreadCalculatorCrypto("A", "B", ResolutionLevel.Daily,
+                                            regression_engine=RegressionEngine.Vectorized)
+        calculator.FixedWindowLength = 60
+        calculator.update_time_series(time_series_a, time_series_b)
+        calculator.upsert_spread_and_equation()
+        return calculator
+
+    def loop_backtest(self, df, window, entry, exit, cost):
+        """
+        逐行循环的参考实现。
+        """
+        spread = df["spread"].to_numpy()
+        zscore = np.full(len(spread), np.nan)
+        zscore[~np.isnan(spread)] = rolling_zscore(spread[~np.isnan(spread)], window)
+        signal = np.nan_to_num(band_signal(zscore, SignalSettings(entry=entry, exit=exit)))
+        prices_a, prices_b, slope = df["A"].to_numpy(), df["B"].to_numpy(), df["slope"].to_numpy()
+        units_a = units_b = hedge = 0.0
+        returns, costs, trades = [], 0.0, 0
+        for i in range(len(signal) - 1):
+            if signal[i] != units_a:
+                if signal[i] != 0:
+                    hedge, trades = slope[i], trades + 1
+                new_b = -signal[i] * hedge
+                trade_cost = cost * (abs(signal[i] - units_a) * prices_a[i] + abs(new_b - units_b) * prices_b[i])
+                units_a, units_b = signal[i], new_b
+            else:
+                trade_cost = 0.0
+            costs += trade_cost
+            returns.append(units_a * (prices_a[i + 1] - prices_a[i]) + units_b * (prices_b[i + 1] - prices_b[i])
+                           - trade_cost)
+        equity = np.cumsum(returns)
+        return {"total_pnl": equity[-1], "costs": costs, "trades": trades,
+                "max_drawdown": np.max(np.maximum.accumulate(np.maximum(equity, 0)) - equity),
+                "sharpe": np.mean(returns) / np.std(returns, ddof=1) * np.sqrt(252)}
+
+    def test_grid_matches_per_row_loop(self):
+        calculator = self.build_calculator()
+        backtest = SpreadBacktest([20, 40], entries=[1.5, 2.0], exits=[0.0, 0.5, 1.8], cost=0.0005, max_cells=900)
+        frame = backtest.run(calculator)
+        self.assertEqual(12, len(frame))
+        invalid = frame[frame["exit"] >= frame["entry"]]
+        self.assertEqual(2, len(invalid))
+        self.assertTrue(invalid[METRICS].isna().all().all())
+
+        for window, entry, exit in [(20, 1.5, 0.5), (40, 2.0, 0.0)]:
+            row = frame[(frame["window"] == window) & (frame["entry"] == entry) & (frame["exit"] == exit)].iloc[0]
+            expected = self.loop_backtest(calculator.df, window, entry, exit, 0.0005)
+            self.assertGreater(expected["trades"], 2)
+            for name, value in expected.items():
+                self.assertAlmostEqual(value, row[name], places=6, msg=name)
+
+    def test_grid_positions_match_band_signal(self):
+        zscore = np.random.default_rng(2).normal(0.0, 1.5, 300)
+        zscore[:10] = np.nan
+        positions = grid_positions(zscore, [1.0, 2.5], [0.2, 0.8])
+        for i, entry in enumerate([1.0, 2.5]):
+            for j, exit in enumerate([0.2, 0.8]):
+                expected = band_signal(zscore, SignalSettings(entry=entry, exit=exit))
+                np.testing.assert_array_equal(np.nan_to_num(expected), positions[i, j])
+
+    def test_walk_forward_in_process_and_process_pool_agree(self):
+        calculator = self.build_calculator(900)
+        grid = dict(windows=[15, 30], entries=[1.5, 2.0], exits=[0.25, 0.75], cost=0.0002)
+        local = SpreadBacktest(max_workers=0, **grid).walk_forward(calculator, 300, 150)
+        pooled = SpreadBacktest(max_workers=2, **grid).walk_forward(calculator, 300, 150)
+        self.assertEqual(4, len(local))
+        self.assertEqual(calculator.df.index[300], local["test_start"].iloc[0])
+        self.assertTrue(local.equals(pooled))
+        self.assertTrue(local["window"].isin([15, 30]).all())
+
+        # 第一个 fold 的 test 统计量与直接评估选出的组合一致
+        first = local.iloc[0]
+        direct = SpreadBacktest([int(first["window"])], [first["entry"]], [first["exit"]], cost=0.0002).evaluate(
+            SpreadBacktest.panel(calculator), 300, 450)
+        self.assertAlmostEqual(direct[METRICS.index("total_pnl"), 0, 0, 0], first["test_total_pnl"])
+
+
+if __name__ == '__main__':
+    unittest.main()
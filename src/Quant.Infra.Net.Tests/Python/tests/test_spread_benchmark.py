@@ -0,0 +1,67 @@
+import copy
+import os
+import tempfile
+import unittest
+import numpy as np
+from RollingOls import ols_regression_batch
+from SpreadCalculator import ResolutionLevel, SpreadCalculatorSP500, SpreadCalculatorCrypto
+from SpreadBenchmark import SpreadBenchmark, supported_resolutions, compare_results, save_results, load_results
+from SyntheticData import generate_cointegrated_pair
+
+
+class TestSpreadBenchmark(unittest.TestCase):
+
+    def test_generated_pair_is_cointegrated_with_given_hedge_ratio(self):
+        series_a, series_b = generate_cointegrated_pair(5000, slope=1.5, intercept=10.0, seed=3)
+        self.assertTrue(np.array_equal(series_a.date_times, series_b.date_times))
+        slope, _ = ols_regression_batch(series_a.values, series_b.values)
+        self.assertAlmostEqual(1.5, slope, delta=0.05)
+        again, _ = generate_cointegrated_pair(5000, slope=1.5, intercept=10.0, seed=3)
+        self.assertEqual(series_a, again)
+
+    def test_supported_resolutions_skip_tick(self):
+        windows = supported_resolutions(SpreadCalculatorCrypto)
+        self.assertNotIn(ResolutionLevel.Tick, windows)
+        self.assertEqual(183 * 24 * 3600, windows[ResolutionLevel.Second])
+
+    def test_run_save_and_compare(self):
+        benchmark = SpreadBenchmark(calculator_classes=[SpreadCalculatorSP500], bars=30, repeat=1,
+                                    dataframe_element_bars=5, resolutions=[ResolutionLevel.Daily,
+                                                                           ResolutionLevel.Second],
+                                    max_window=1000)
+        document = benchmark.run()
+        results = {(record["resolution"], record["operation"]): record for record in document["results"]}
+        self.assertEqual(14, len(results))
+        self.assertIn("skipped", results[("Second", "upsert_vectorized")])
+        streaming = results[("Daily", "element_streaming")]
+        self.assertEqual(29, streaming["bars"])
+        self.assertGreater(streaming["bars_per_second"], 0)
+        self.assertLessEqual(streaming["p50_us"], streaming["p99_us"])
+        self.assertGreater(results[("Daily", "upsert_vectorized")]["peak_memory_bytes"], 0)
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "baseline.json")
+            save_results(document, path)
+            baseline = load_results(path)
+
+        self.assertFalse(any(row["regression"] for row in compare_results(document, baseline)))
+        slower = copy.deepcopy(document)
+        for record in slower["results"]:
+            if record["operation"] == "upsert_vectorized" and "skipped" not in record:
+                record["bars_per_second"] /= 2
+        regressions = [row for row in compare_results(slower, baseline) if row["regression"]]
+        self.assertEqual([("Daily", "upsert_vectorized", "bars_per_second")],
+                         [(row["resolution"], row["operation"], row["metric"]) for row in regressions])
+
+    def test_bridge_per_call_and_batched(self):
+        benchmark = SpreadBenchmark(bridge_requests=50, bridge_window=20, repeat=1, memory=False)
+        records = {record["operation"]: record for record in benchmark.run_bridge()}
+        self.assertEqual(50, records["bridge_per_call"]["calls"])
+        self.assertEqual(1, records["bridge_batched"]["calls"])
+        for record in records.values():
+            self.assertEqual(1000, record["bars"])
+            self.assertGreater(record["regressions_per_second"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
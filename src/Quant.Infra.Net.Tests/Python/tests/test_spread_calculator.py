@@ -2,7 +2,9 @@
 import unittest
 from pathlib import Path
 import pandas as pd
-from SpreadCalculator import TimeSeriesElement, ResolutionLevel, SpreadCalculatorCrypto
+import numpy as np
+from SpreadCalculator import TimeSeriesElement, TimeSeries, ResolutionLevel, SpreadCalculatorCrypto, \
+    RegressionEngine, StorageMode
 
 
 # Assuming PairTradingDiffCalculatorFixLengthWindow and TimeSeriesElement are already defined
@@ -14,22 +16,17 @@ class TestSpreadCalculator(unittest.TestCase):
         Load time series data from CSV using pandas.
         The CSV file should have the format: DateTime,Open,High,Low,Close,Volume.
         :param full_path_filename: Path to the CSV file.
-        :return: List of TimeSeriesElement instances.
+        :return: TimeSeries built directly from the DateTime and Close columns.
         """
         # 检查文件是否存在
         if not os.path.exists(full_path_filename):
             raise FileNotFoundError(f"The file {full_path_filename} does not exist.")
 
         # Read the CSV file
-        df = pd.read_csv(full_path_filename, parse_dates=['DateTime'])
+        df = pd.read_csv(full_path_filename, parse_dates=['DateTime'], usecols=['DateTime', 'Close'])
 
-        # Convert the DataFrame to a list of TimeSeriesElement instances
-        time_series = [
-            TimeSeriesElement(row['DateTime'], row['Close'])
-            for _, row in df.iterrows()
-        ]
-
-        return time_series
+        # 直接使用列数组, 不逐行创建 TimeSeriesElement
+        return TimeSeries(df['DateTime'], df['Close'].to_numpy(dtype=np.float64))
         
     def test_calculate_diff(self):
         symbol1 = "DASHUSDT"
@@ -77,6 +74,68 @@ class TestSpreadCalculator(unittest.TestCase):
         self.assertIsNotNone(equation)
         print(equation)
 
+    def test_update_time_series_accepts_columnar_time_series_without_copy(self):
+        date_times = pd.date_range("2024-01-01", periods=5, freq="h")
+        time_series1 = TimeSeries(date_times, [1.0, 2.0, 3.0, 4.0, 5.0])
+        time_series2 = TimeSeries.from_elements(
+            TimeSeriesElement(dt, v) for dt, v in zip(date_times, [2.0, 4.0, 6.0, 8.0, 10.0]))
+        time_series2.add_element(TimeSeriesElement(pd.Timestamp("2024-01-01 05:00"), 12.0))
+
+        self.assertEqual(6, len(time_series2))
+        self.assertEqual(TimeSeriesElement(date_times[1], 4.0), time_series2[1])
+        self.assertEqual(time_series1, TimeSeries.from_elements(time_series1.series))
+
+        calculator = SpreadCalculatorCrypto("A", "B", resolution=ResolutionLevel.Hourly)
+        calculator.update_time_series(time_series1, time_series2[:5])
+        self.assertTrue(np.shares_memory(calculator.df["A"].to_numpy(), time_series1.values))
+
+        expected = SpreadCalculatorCrypto("A", "B", resolution=ResolutionLevel.Hourly)
+        expected.update_time_series(time_series1.series, time_series2.series[:5])
+        pd.testing.assert_frame_equal(expected.df, calculator.df, check_index_type=False, check_freq=False)
+
+    def test_timezone_aware_time_series_round_trip(self):
+        date_times = pd.date_range("2024-03-08 09:30", periods=4, freq="D", tz="America/New_York")
+        time_series1 = TimeSeries(date_times, [1.0, 2.0, 3.0, 4.0])
+        time_series2 = TimeSeries.from_elements(
+            TimeSeriesElement(dt, v) for dt, v in zip(date_times, [2.0, 4.0, 6.0, 8.0]))
+        self.assertEqual(time_series1[2].date_time, date_times[2])
+        self.assertEqual(str(date_times.tz), str(time_series1[1:].tz))
+
+        for series1, series2 in [(time_series1, time_series2), (time_series1.series, time_series2.series)]:
+            calculator = SpreadCalculatorCrypto("A", "B", resolution=ResolutionLevel.Daily)
+            calculator.update_time_series(series1, series2)
+            self.assertEqual("datetime64[ns, America/New_York]", str(calculator.df.index.dtype))
+            self.assertTrue((date_times == calculator.df.index).all())
+
+        naive = TimeSeries(date_times.tz_localize(None), [2.0, 4.0, 6.0, 8.0])
+        with self.assertRaises(ValueError):
+            SpreadCalculatorCrypto("A", "B").update_time_series(time_series1, naive)
+
+    def test_compact_storage_mode_renders_equation_lazily(self):
+        rng = np.random.default_rng(2)
+        date_times = pd.date_range("2024-01-01", periods=5000, freq="h")
+        series_b = 10 + np.cumsum(rng.normal(0, 0.05, len(date_times)))
+        series_a = 1 + 3 * series_b + rng.normal(0, 0.1, len(date_times))
+
+        full = SpreadCalculatorCrypto("A", "B", resolution=ResolutionLevel.Hourly,
+                                      regression_engine=RegressionEngine.Vectorized)
+        compact = SpreadCalculatorCrypto("A", "B", resolution=ResolutionLevel.Hourly,
+                                         regression_engine=RegressionEngine.Vectorized,
+                                         storage_mode=StorageMode.Compact, price_dtype=np.float32)
+        for calculator in (full, compact):
+            calculator.update_time_series(TimeSeries(date_times, series_a), TimeSeries(date_times, series_b))
+            calculator.upsert_spread_and_equation()
+
+        self.assertNotIn("equation", compact.df.columns)
+        self.assertEqual(np.float32, compact.df["spread"].dtype)
+        self.assertEqual(np.float64, compact.df["slope"].dtype)
+        np.testing.assert_allclose(compact.df["slope"].to_numpy(), full.df["slope"].to_numpy(),
+                                   rtol=1e-5, equal_nan=True)
+        self.assertEqual(full.df["equation"].iloc[-1], full.print_equation())
+        self.assertTrue(compact.print_equation().startswith("spread = A - ("))
+        self.assertIsNone(compact.print_equation(date_times[10]))
+        self.assertLess(compact.bytes_per_row(), full.bytes_per_row() / 2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from SpreadCalculator import ResolutionLevel, RegressionEngine, SpreadCalculatorCrypto, TimeSeries, TimeSeriesElement
+from SpreadCheckpoint import CheckpointScheduler, save_checkpoint, load_checkpoint
+from SpreadSignals import SignalSettings
+from SyntheticData import generate_cointegrated_pair
+
+
+class TestSpreadCheckpoint(unittest.TestCase):
+
+    def build_calculator(self, streaming):
+        calculator = SpreadCalculatorCrypto("A", "B", ResolutionLevel.Daily, streaming=streaming,
+                                            regression_engine=RegressionEngine.Vectorized,
+                                            signal_settings=SignalSettings(window=30))
+        calculator.FixedWindowLength = 50
+        return calculator
+
+    def test_restored_calculator_resumes_where_checkpoint_was_taken(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(400, seed=6)
+        expected = self.build_calculator(streaming=False)
+        expected.update_time_series(time_series_a, time_series_b)
+        expected.upsert_spread_and_equation()
+
+        for streaming in (False, True):
+            calculator = self.build_calculator(streaming)
+            calculator.update_time_series(time_series_a[:250], time_series_b[:250])
+            calculator.upsert_spread_and_equation()
+            if streaming:
+                for element_a, element_b in zip(time_series_a[250:300], time_series_b[250:300]):
+                    calculator.update_time_series_element(element_a, element_b)
+            split = 300 if streaming else 250
+
+            with tempfile.TemporaryDirectory() as root:
+                path = os.path.join(root, "A-B.ckpt")
+                save_checkpoint(calculator, path)
+                restored = load_checkpoint(path)
+                self.assertIsInstance(restored, SpreadCalculatorCrypto)
+                self.assertEqual(50, restored.FixedWindowLength)
+                self.assertEqual(1, len(restored.df))
+                self.assertIsInstance(restored._window.values_x, np.memmap)
+                for element_a, element_b in zip(time_series_a[split:], time_series_b[split:]):
+                    restored.update_time_series_element(element_a, element_b)
+                # 覆盖仍被映射的检查点
+                save_checkpoint(restored, path)
+                self.assertEqual(restored.df["spread"].iloc[-1], load_checkpoint(path).df["spread"].iloc[-1])
+
+            actual = restored.df
+            tail = expected.df.iloc[split - 1:]
+            self.assertTrue((tail.index == actual.index).all())
+            for column in ["slope", "intercept", "spread", "zscore", "half_life", "signal"]:
+                np.testing.assert_allclose(actual[column].to_numpy(), tail[column].to_numpy(), rtol=1e-7, atol=1e-9)
+
+    def test_timezone_is_restored_and_temporary_state_is_dropped(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(120, seed=3)
+        date_times = pd.DatetimeIndex(time_series_a.date_times).tz_localize("Asia/Shanghai")
+        calculator = self.build_calculator(streaming=False)
+        calculator.update_time_series(TimeSeries(date_times, time_series_a.values),
+                                      TimeSeries(date_times, time_series_b.values))
+        calculator.upsert_spread_and_equation()
+
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "A-B.ckpt")
+            save_checkpoint(calculator, path)
+            self.assertIsNone(calculator._signal_state)
+            self.assertIsNone(calculator._store)
+            restored = load_checkpoint(path)
+            self.assertEqual("Asia/Shanghai", str(restored.df.index.tz))
+            self.assertEqual(date_times[-1], restored.df.index[-1])
+            restored.update_time_series_element(TimeSeriesElement(date_times[-1] + pd.Timedelta(days=1), 10.0),
+                                                TimeSeriesElement(date_times[-1] + pd.Timedelta(days=1), 5.0))
+            self.assertEqual("Asia/Shanghai", str(restored.df.index.tz))
+            self.assertEqual(2, len(restored.df))
+
+    def test_scheduler_writes_periodically_and_restores_all(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(120, seed=2)
+        with tempfile.TemporaryDirectory() as root:
+            scheduler = CheckpointScheduler(root, every_bars=25)
+            calculators = [SpreadCalculatorCrypto(a, b, ResolutionLevel.Daily, streaming=True)
+                           for a, b in (("A", "B"), ("C", "D"))]
+            saves = 0
+            for calculator in calculators:
+                calculator.FixedWindowLength = 20
+                for element_a, element_b in zip(time_series_a, time_series_b):
+                    saves += scheduler.update_time_series_element(calculator, element_a, element_b)
+            self.assertEqual(8, saves)
+
+            restored = scheduler.restore_all()
+            self.assertEqual([("A", "B"), ("C", "D")], [(c.symbol1, c.symbol2) for c in restored])
+            self.assertEqual(time_series_a[99].date_time, restored[0].df.index[-1])
+            self.assertIsNone(restored[0].signal_settings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import numpy as np
+import pandas as pd
+from SpreadCalculator import ResolutionLevel, RegressionEngine, SpreadCalculatorCrypto
+from SpreadSignals import SignalSettings, SignalEventType, band_signal, compute_signals, signal_events
+from SyntheticData import generate_cointegrated_pair
+
+
+class TestSpreadSignals(unittest.TestCase):
+
+    def build_calculator(self, streaming=False, events=None):
+        calculator = SpreadCalculatorCrypto("A", "B", ResolutionLevel.Daily, streaming=streaming,
+                                            regression_engine=RegressionEngine.Vectorized,
+                                            signal_settings=SignalSettings(window=40, entry=1.5, exit=0.25),
+                                            on_signal_event=events.append if events is not None else None)
+        calculator.FixedWindowLength = 60
+        return calculator
+
+    def test_bulk_columns_match_pandas_rolling_statistics(self):
+        rng = np.random.default_rng(5)
+        spread = np.concatenate((np.full(30, np.nan), np.cumsum(rng.normal(0, 1, 500)) * 0.1 + 50))
+        zscore, half_life, signal = compute_signals(spread, SignalSettings(window=25), 25)
+
+        rolling = pd.Series(spread[30:]).rolling(25)
+        expected = (spread[30:] - rolling.mean()) / rolling.std()
+        np.testing.assert_allclose(zscore[30:], expected.to_numpy(), rtol=1e-8, atol=1e-10, equal_nan=True)
+        self.assertTrue(np.isnan(zscore[:30]).all())
+        self.assertTrue(np.isnan(half_life[:55]).all())
+        self.assertFalse(np.isnan(half_life[55:]).any())
+        self.assertTrue(set(np.unique(signal[~np.isnan(signal)])) <= {-1.0, 0.0, 1.0})
+
+        # 半衰期与 Δs 对 s_prev 的回归一致
+        values = spread[-26:]
+        slope = np.polyfit(values[:-1], np.diff(values), 1)[0]
+        expected_half_life = -np.log(2) / np.log1p(slope) if -1 < slope < 0 else np.inf
+        self.assertAlmostEqual(expected_half_life, half_life[-1], places=6)
+
+    def test_band_state_machine_and_events(self):
+        zscore = np.array([np.nan, 0.0, 2.5, 1.0, np.nan, 0.4, -2.1, -1.0, 3.0, 0.0])
+        spread = np.arange(len(zscore), dtype=float)
+        signal = band_signal(zscore, SignalSettings(entry=2.0, exit=0.5))
+        np.testing.assert_array_equal([np.nan, 0, -1, -1, np.nan, 0, 1, 1, -1, 0], signal)
+
+        events = signal_events(np.arange(len(zscore)), signal, zscore, spread)
+        self.assertEqual([(2, SignalEventType.EnterShort), (5, SignalEventType.ExitShort),
+                          (6, SignalEventType.EnterLong), (8, SignalEventType.ExitLong),
+                          (8, SignalEventType.EnterShort), (9, SignalEventType.ExitShort)],
+                         [(event.date_time, event.event_type) for event in events])
+
+    def test_streaming_and_dataframe_paths_match_bulk_path(self):
+        time_series_a, time_series_b = generate_cointegrated_pair(400, seed=3, half_life=8.0)
+        bulk_events, stream_events, frame_events = [], [], []
+        bulk = self.build_calculator(events=bulk_events)
+        bulk.update_time_series(time_series_a, time_series_b)
+        bulk.upsert_spread_and_equation()
+        self.assertGreater(len(bulk_events), 2)
+        self.assertEqual(bulk_events, bulk.signal_events)
+
+        streaming = self.build_calculator(streaming=True, events=stream_events)
+        frame = self.build_calculator(events=frame_events)
+        # 前 200 行批量计算, 之后逐 bar 更新, 状态从已有的列预热
+        for calculator in (streaming, frame):
+            calculator.update_time_series(time_series_a[:200], time_series_b[:200])
+            calculator.upsert_spread_and_equation()
+            for element_a, element_b in zip(time_series_a[200:], time_series_b[200:]):
+                calculator.update_time_series_element(element_a, element_b)
+
+        for calculator, events in ((streaming, stream_events), (frame, frame_events)):
+            for column in ["zscore", "half_life", "signal"]:
+                np.testing.assert_allclose(calculator.df[column].to_numpy(), bulk.df[column].to_numpy(),
+                                           rtol=1e-7, atol=1e-9, equal_nan=True)
+            self.assertEqual([(pd.Timestamp(event.date_time), event.event_type) for event in bulk_events],
+                             [(pd.Timestamp(event.date_time), event.event_type) for event in events])
+
+    def test_settings_are_validated(self):
+        with self.assertRaises(ValueError):
+            SignalSettings(entry=1.0, exit=1.0)
+        with self.assertRaises(ValueError):
+            SignalSettings(window=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+import numpy as np
+from Alignment import AlignmentPolicy
+from SpreadCalculator import ResolutionLevel, RegressionEngine, SpreadCalculatorCrypto
+from StreamingHub import StreamingHub
+from SyntheticData import generate_cointegrated_pair
+
+
+class TestStreamingHub(unittest.TestCase):
+
+    def build_calculator(self, symbol1, symbol2):
+        calculator = SpreadCalculatorCrypto(symbol1, symbol2, ResolutionLevel.Daily, streaming=True)
+        calculator.FixedWindowLength = 30
+        return calculator
+
+    def test_interleaved_bars_reach_every_pair_in_time_order(self):
+        series_a, series_b = generate_cointegrated_pair(200, seed=1)
+        series_c, _ = generate_cointegrated_pair(200, seed=2)
+        streams = {"A": list(series_a), "B": list(series_b), "C": list(series_c)}
+        # B 缺少第 50 个 bar: A/B 与 B/C 在该时间点没有更新
+        del streams["B"][50]
+        pairs = [("A", "B"), ("A", "C"), ("B", "C")]
+
+        async def source(elements):
+            for element in elements:
+                yield element
+                await asyncio.sleep(0)
+
+        async def main(hub):
+            runner = asyncio.create_task(hub.run())
+            await asyncio.gather(*(hub.ingest(symbol, source(elements)) for symbol, elements in streams.items()))
+            await hub.close()
+            return await runner
+
+        hub = StreamingHub(max_queue=16, batch_size=8)
+        calculators = [self.build_calculator(*pair) for pair in pairs]
+        for calculator in calculators:
+            hub.subscribe(calculator)
+        metrics = asyncio.run(main(hub))
+
+        self.assertEqual(599, metrics.bars_received)
+        self.assertEqual(199 + 200 + 199, metrics.updates_applied)
+        self.assertEqual(2, metrics.dropped_legs)
+        self.assertEqual(0, metrics.errors)
+        self.assertLessEqual(metrics.queue_high_water, 16)
+        self.assertEqual({50, 95, 99}, set(metrics.latency_percentiles()))
+
+        for calculator in calculators:
+            expected = self.build_calculator(calculator.symbol1, calculator.symbol2)
+            expected.regression_engine = RegressionEngine.Vectorized
+            expected.update_time_series(streams[calculator.symbol1], streams[calculator.symbol2],
+                                        alignment=AlignmentPolicy.Inner)
+            expected.upsert_spread_and_equation()
+            np.testing.assert_allclose(calculator.df["spread"].to_numpy(), expected.df["spread"].to_numpy(),
+                                       rtol=1e-8, atol=1e-10, equal_nan=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
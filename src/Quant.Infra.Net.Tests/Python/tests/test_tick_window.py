@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from RollingOls import TimeWindowOls, rolling_ols_time, time_window_starts, ols_regression_batch
+from SpreadCalculator import TimeSeries, ResolutionLevel, RegressionEngine, StorageMode, SpreadCalculatorSP500, \
+    SpreadCalculatorCrypto
+from SpreadCheckpoint import save_checkpoint, load_checkpoint
+
+
+class TestTickWindow(unittest.TestCase):
+
+    def build_ticks(self, length, seed=11):
+        """
+        生成不规则间隔的 tick: 间隔 1ms 到 2s。
+        """
+        rng = np.random.default_rng(seed)
+        gaps = rng.integers(1_000_000, 2_000_000_000, length)
+        date_times = pd.Timestamp("2024-01-02 09:30").value + np.cumsum(gaps)
+        series_b = 50 + np.cumsum(rng.normal(0, 0.01, length))
+        series_a = 5 + 2 * series_b + rng.normal(0, 0.02, length)
+        return date_times.astype(np.int64), series_a, series_b
+
+    def test_time_window_deque_matches_brute_force(self):
+        date_times, series_a, series_b = self.build_ticks(3000)
+        duration = pd.Timedelta("5min").value
+        start, complete = time_window_starts(date_times, duration)
+        expected = np.full(len(date_times), np.nan)
+        for i in np.flatnonzero(complete & (np.arange(len(date_times)) - start >= 2)):
+            expected[i] = ols_regression_batch(series_a[start[i]:i], series_b[start[i]:i])[0]
+
+        slope, _ = rolling_ols_time(date_times, series_a, series_b, duration)
+        np.testing.assert_allclose(slope, expected, rtol=1e-8, equal_nan=True)
+
+        window = TimeWindowOls(duration, capacity=8)
+        streamed = []
+        for t, a, b in zip(date_times.tolist(), series_a.tolist(), series_b.tolist()):
+            streamed.append(window.regression()[0] if window.ready(t) else np.nan)
+            window.push(t, b, a)
+        np.testing.assert_allclose(streamed, expected, rtol=1e-8, equal_nan=True)
+        self.assertLess(window.capacity, 3000)
+
+    def test_tick_calculator_paths_agree(self):
+        date_times, series_a, series_b = self.build_ticks(1500)
+        index = pd.DatetimeIndex(date_times.view("datetime64[ns]"))
+        self.assertEqual(pd.Timedelta(hours=6.5),
+                         SpreadCalculatorSP500("A", "B", ResolutionLevel.Tick).FixedWindowDuration)
+        with self.assertRaises(NotImplementedError):
+            SpreadCalculatorCrypto("A", "B").calculate_window_length(ResolutionLevel.Tick)
+
+        def build(**kwargs):
+            return SpreadCalculatorCrypto("A", "B", ResolutionLevel.Tick, window_duration="10min", **kwargs)
+
+        results = {}
+        for engine in RegressionEngine:
+            calculator = build(regression_engine=engine)
+            calculator.update_time_series(TimeSeries(index, series_a), TimeSeries(index, series_b))
+            calculator.upsert_spread_and_equation()
+            results[engine.value] = calculator.df
+
+        frame = build()
+        streaming = build(streaming=True)
+        ticks_a, ticks_b = TimeSeries(index[:900], series_a[:900]), TimeSeries(index[:900], series_b[:900])
+        for element_a, element_b in zip(ticks_a, ticks_b):
+            frame.update_time_series_element(element_a, element_b)
+            streaming.update_time_series_element(element_a, element_b)
+        batch = build(streaming=True, storage_mode=StorageMode.Compact)
+        self.assertEqual(700, batch.update_time_series_arrays(index[:700], series_a[:700], series_b[:700]))
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "A-B.ckpt")
+            save_checkpoint(batch, path)
+            restored = load_checkpoint(path)
+            self.assertEqual(800, restored.update_time_series_arrays(date_times[700:], series_a[700:], series_b[700:]))
+            self.assertEqual(pd.Timedelta("10min"), restored.FixedWindowDuration)
+
+        expected = results["vectorized"]
+        self.assertGreater(expected["spread"].notna().sum(), 800)
+        np.testing.assert_allclose(results["per_window"]["spread"], expected["spread"], rtol=1e-8, equal_nan=True)
+        for calculator in (frame, streaming):
+            np.testing.assert_allclose(calculator.df["spread"], expected["spread"].iloc[:900], rtol=1e-8,
+                                       equal_nan=True)
+        np.testing.assert_allclose(restored.df["spread"], expected["spread"].iloc[699:], rtol=1e-8, equal_nan=True)
+
+
+if __name__ == '__main__':
+    unittest.main()